@@ -1,136 +1,225 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context, url_for
 from flask_cors import CORS
 import os
+import sys
+import json
+import logging
+import math
+import re
+import time
+import hashlib
+import inspect
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 from PIL import Image
-import fitz  # PyMuPDF
-import torch
+
+# Load environment variables (logging and configuration below read them)
+load_dotenv()
+
+class StructuredFormatter(logging.Formatter):
+    """Render records as `time LEVEL message key=value ...`, or one JSON object per line.
+
+    Anything passed through `extra={...}` becomes a structured field.
+    """
+
+    _STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def __init__(self, json_output=False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record):
+        fields = {k: v for k, v in vars(record).items() if k not in self._STANDARD_ATTRS}
+        message = record.getMessage()
+        if self.json_output:
+            payload = {'time': self.formatTime(record), 'level': record.levelname,
+                       'logger': record.name, 'message': message}
+            payload.update(fields)
+            if record.exc_info:
+                payload['exc_info'] = self.formatException(record.exc_info)
+            return json.dumps(payload, default=str, ensure_ascii=False)
+
+        line = f"{self.formatTime(record)} {record.levelname:<7} {message}"
+        if fields:
+            line += "  " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+def _configure_logging():
+    """LOG_LEVEL=DEBUG shows per-page / per-image progress; the default INFO keeps the hot path quiet"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_output=os.getenv('LOG_FORMAT', 'text').lower() == 'json'))
+    logger = logging.getLogger('ocrweb')
+    logger.handlers[:] = [handler]
+    logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    logger.propagate = False
+    return logger
+
+log = _configure_logging()
 
 # CRITICAL FIX: Prevent flash attention imports before transformers loads
 # This must happen BEFORE importing transformers
 os.environ["TRANSFORMERS_NO_ADVISORY_WARNINGS"] = "1"
 os.environ["DISABLE_FLASH_ATTENTION"] = "1"
 
-# Force CPU mode if no CUDA available
-# This prevents the model from trying to use .cuda()
-if not torch.cuda.is_available():
-    os.environ["CUDA_VISIBLE_DEVICES"] = ""  # Hide CUDA devices
-    print("⚠️  No CUDA detected - forcing CPU-only mode")
-    
-    # Disable bfloat16 on CPU (not fully supported)
-    torch.backends.cpu.allow_tf32 = False
-    
-    # Monkey-patch torch.cuda.is_available() to always return False
-    original_is_available = torch.cuda.is_available
-    torch.cuda.is_available = lambda: False
-    
-    # Monkey-patch all .cuda() methods to redirect to CPU
-    _original_tensor_cuda = torch.Tensor.cuda
-    _original_module_cuda = torch.nn.Module.cuda
-    
-    def _fake_tensor_cuda(self, *args, **kwargs):
-        # Force float32 on CPU
-        return self.float().to(torch.device('cpu'))
-    
-    def _fake_module_cuda(self, *args, **kwargs):
-        # Force float32 on CPU
-        return self.float().to(torch.device('cpu'))
-    
-    torch.Tensor.cuda = _fake_tensor_cuda
-    torch.nn.Module.cuda = _fake_module_cuda
-    
-    # Also patch bfloat16 conversion to redirect to float32 on CPU
-    _original_tensor_bfloat16 = torch.Tensor.bfloat16
-    def _fake_bfloat16(self):
-        print("⚠️  bfloat16 requested on CPU, using float32 instead")
-        return self.float()
-    torch.Tensor.bfloat16 = _fake_bfloat16
-    
-    # Patch embedding layers to handle float indices (convert to long)
-    _original_embedding_forward = torch.nn.Embedding.forward
-    def _patched_embedding_forward(self, input):
-        # If input is float, convert to long for embedding lookup
-        if input.dtype in [torch.float32, torch.float16, torch.bfloat16]:
-            input = input.long()
-        return _original_embedding_forward(self, input)
-    torch.nn.Embedding.forward = _patched_embedding_forward
-    
-    # Patch masked_scatter_ to handle float masks (convert to bool)
-    _original_masked_scatter_ = torch.Tensor.masked_scatter_
-    def _patched_masked_scatter_(self, mask, source):
-        # If mask is float, convert to bool (assumes > 0.5 = True)
-        if mask.dtype in [torch.float32, torch.float16, torch.bfloat16]:
-            mask = mask.bool()
-        return _original_masked_scatter_(self, mask, source)
-    torch.Tensor.masked_scatter_ = _patched_masked_scatter_
-    
-    print("✓ CPU-only patches installed (all .cuda() and .bfloat16() calls redirected)")
-    print("✓ All operations will use float32 for CPU compatibility")
-    print("✓ Embedding layer patched to handle float→long conversion")
-    print("✓ masked_scatter_ patched to handle float→bool masks")
-
-# Use AutoModel for DeepSeek-OCR (it's a VLM, not pure causal LM)
-from transformers import AutoProcessor, AutoModel, AutoTokenizer
-
-# Fix DynamicCache compatibility issue with transformers 4.57.1+
-try:
-    from transformers.cache_utils import DynamicCache
-    print("⚙️  Patching DynamicCache for transformers 4.57.1+ compatibility...")
-    
-    # Patch __init__ to add _seen_tokens tracking
-    original_init = DynamicCache.__init__
-    def patched_init(self, *args, **kwargs):
-        original_init(self, *args, **kwargs)
-        self._seen_tokens = 0
-        self._max_length = None
-    
-    # Add seen_tokens property
-    def get_seen_tokens(self):
-        if hasattr(self, '_seen_tokens'):
-            return self._seen_tokens
-        # Fallback: calculate from cache
-        if hasattr(self, 'key_cache') and len(self.key_cache) > 0:
-            return self.key_cache[0].shape[-2] if self.key_cache[0] is not None else 0
-        return 0
+# torch, transformers and PyMuPDF are imported on first use rather than here:
+# the web server (index page, /api/health) starts in well under a second, and
+# EasyOCR-only deployments never import transformers. The CPU and
+# DynamicCache patches are applied right after the first import.
+_torch = None
+_transformers = None
+_lazy_import_lock = threading.RLock()
+
+def _import_torch():
+    """Import torch (and install the CPU-only patches) on first use"""
+    global _torch
+    if _torch is None:
+        with _lazy_import_lock:
+            if _torch is None:
+                with stage_timer('import_torch'):
+                    import torch
+                    _install_cpu_patches(torch)
+                _torch = torch
+    return _torch
+
+def _import_transformers():
+    """Import transformers (after torch, with the DynamicCache patches) on first use"""
+    global _transformers
+    if _transformers is None:
+        with _lazy_import_lock:
+            if _transformers is None:
+                _import_torch()
+                with stage_timer('import_transformers'):
+                    import transformers
+                    _patch_dynamic_cache()
+                _transformers = transformers
+    return _transformers
+
+def _install_cpu_patches(torch):
+    """Without a usable GPU, redirect .cuda()/.bfloat16() to float32 CPU (runs once, right after torch is imported)"""
+    # Force CPU mode if no CUDA available
+    # This prevents the model from trying to use .cuda()
+    if not torch.cuda.is_available():
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""  # Hide CUDA devices
+        log.warning("⚠️  No CUDA detected - forcing CPU-only mode")
     
-    def set_seen_tokens(self, value):
-        self._seen_tokens = value
+        # Disable bfloat16 on CPU (not fully supported)
+        torch.backends.cpu.allow_tf32 = False
     
-    # Add get_max_length method
-    def get_max_length(self):
-        if hasattr(self, '_max_length'):
-            return self._max_length
-        return None
+        # Monkey-patch torch.cuda.is_available() to always return False
+        original_is_available = torch.cuda.is_available
+        torch.cuda.is_available = lambda: False
     
-    # Add get_seq_length method (sometimes also needed)
-    def get_seq_length(self, layer_idx=None):
-        if layer_idx is not None and hasattr(self, 'key_cache') and len(self.key_cache) > layer_idx:
-            if self.key_cache[layer_idx] is not None:
-                return self.key_cache[layer_idx].shape[-2]
-        elif hasattr(self, 'key_cache') and len(self.key_cache) > 0:
-            if self.key_cache[0] is not None:
-                return self.key_cache[0].shape[-2]
-        return 0
+        # Monkey-patch all .cuda() methods to redirect to CPU
+        _original_tensor_cuda = torch.Tensor.cuda
+        _original_module_cuda = torch.nn.Module.cuda
     
-    # Apply patches
-    DynamicCache.__init__ = patched_init
-    if not hasattr(DynamicCache, 'seen_tokens'):
-        DynamicCache.seen_tokens = property(get_seen_tokens, set_seen_tokens)
-    if not hasattr(DynamicCache, 'get_max_length'):
-        DynamicCache.get_max_length = get_max_length
-    if not hasattr(DynamicCache, 'get_seq_length'):
-        DynamicCache.get_seq_length = get_seq_length
-    
-    print("✓ DynamicCache compatibility patches applied")
-    print("  - seen_tokens property")
-    print("  - get_max_length() method")
-    print("  - get_seq_length() method")
-except Exception as e:
-    print(f"⚠️  Could not patch DynamicCache: {e}")
-
-# Load environment variables
-load_dotenv()
+        def _fake_tensor_cuda(self, *args, **kwargs):
+            # Force float32 on CPU
+            return self.float().to(torch.device('cpu'))
+    
+        def _fake_module_cuda(self, *args, **kwargs):
+            # Force float32 on CPU
+            return self.float().to(torch.device('cpu'))
+    
+        torch.Tensor.cuda = _fake_tensor_cuda
+        torch.nn.Module.cuda = _fake_module_cuda
+    
+        # Also patch bfloat16 conversion to redirect to float32 on CPU
+        _original_tensor_bfloat16 = torch.Tensor.bfloat16
+        def _fake_bfloat16(self):
+            log.warning("⚠️  bfloat16 requested on CPU, using float32 instead")
+            return self.float()
+        torch.Tensor.bfloat16 = _fake_bfloat16
+    
+        # Patch embedding layers to handle float indices (convert to long)
+        _original_embedding_forward = torch.nn.Embedding.forward
+        def _patched_embedding_forward(self, input):
+            # If input is float, convert to long for embedding lookup
+            if input.dtype in [torch.float32, torch.float16, torch.bfloat16]:
+                input = input.long()
+            return _original_embedding_forward(self, input)
+        torch.nn.Embedding.forward = _patched_embedding_forward
+    
+        # Patch masked_scatter_ to handle float masks (convert to bool)
+        _original_masked_scatter_ = torch.Tensor.masked_scatter_
+        def _patched_masked_scatter_(self, mask, source):
+            # If mask is float, convert to bool (assumes > 0.5 = True)
+            if mask.dtype in [torch.float32, torch.float16, torch.bfloat16]:
+                mask = mask.bool()
+            return _original_masked_scatter_(self, mask, source)
+        torch.Tensor.masked_scatter_ = _patched_masked_scatter_
+    
+        log.info("✓ CPU-only patches installed (all .cuda() and .bfloat16() calls redirected)")
+        log.info("✓ All operations will use float32 for CPU compatibility")
+        log.info("✓ Embedding layer patched to handle float→long conversion")
+        log.info("✓ masked_scatter_ patched to handle float→bool masks")
+
+def _patch_dynamic_cache():
+    """DynamicCache compatibility patches (runs once, right after transformers is imported)"""
+    # Fix DynamicCache compatibility issue with transformers 4.57.1+
+    try:
+        from transformers.cache_utils import DynamicCache
+        log.info("⚙️  Patching DynamicCache for transformers 4.57.1+ compatibility...")
+    
+        # Patch __init__ to add _seen_tokens tracking
+        original_init = DynamicCache.__init__
+        def patched_init(self, *args, **kwargs):
+            original_init(self, *args, **kwargs)
+            self._seen_tokens = 0
+            self._max_length = None
+    
+        # Add seen_tokens property
+        def get_seen_tokens(self):
+            if hasattr(self, '_seen_tokens'):
+                return self._seen_tokens
+            # Fallback: calculate from cache
+            if hasattr(self, 'key_cache') and len(self.key_cache) > 0:
+                return self.key_cache[0].shape[-2] if self.key_cache[0] is not None else 0
+            return 0
+    
+        def set_seen_tokens(self, value):
+            self._seen_tokens = value
+    
+        # Add get_max_length method
+        def get_max_length(self):
+            if hasattr(self, '_max_length'):
+                return self._max_length
+            return None
+    
+        # Add get_seq_length method (sometimes also needed)
+        def get_seq_length(self, layer_idx=None):
+            if layer_idx is not None and hasattr(self, 'key_cache') and len(self.key_cache) > layer_idx:
+                if self.key_cache[layer_idx] is not None:
+                    return self.key_cache[layer_idx].shape[-2]
+            elif hasattr(self, 'key_cache') and len(self.key_cache) > 0:
+                if self.key_cache[0] is not None:
+                    return self.key_cache[0].shape[-2]
+            return 0
+    
+        # Apply patches
+        DynamicCache.__init__ = patched_init
+        if not hasattr(DynamicCache, 'seen_tokens'):
+            DynamicCache.seen_tokens = property(get_seen_tokens, set_seen_tokens)
+        if not hasattr(DynamicCache, 'get_max_length'):
+            DynamicCache.get_max_length = get_max_length
+        if not hasattr(DynamicCache, 'get_seq_length'):
+            DynamicCache.get_seq_length = get_seq_length
+    
+        log.info("✓ DynamicCache compatibility patches applied")
+        log.info("  - seen_tokens property")
+        log.info("  - get_max_length() method")
+        log.info("  - get_seq_length() method")
+    except Exception as e:
+        log.warning(f"⚠️  Could not patch DynamicCache: {e}")
 
 app = Flask(__name__)
 CORS(app)
@@ -138,7 +227,220 @@ CORS(app)
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp', 'pdf'}
-MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+# Uploads above UPLOAD_SPOOL_THRESHOLD go to disk and large images are decoded
+# within IMAGE_DECODE_MAX_MPX, so the size of an upload no longer decides how
+# much memory it takes
+MAX_FILE_SIZE = int(float(os.getenv('MAX_UPLOAD_MB', '256')) * 1024 * 1024)
+
+# Uploads are read into memory; only uploads larger than this are spooled to a
+# uniquely named file in UPLOAD_FOLDER
+UPLOAD_SPOOL_THRESHOLD = int(float(os.getenv('UPLOAD_SPOOL_THRESHOLD_MB', '8')) * 1024 * 1024)
+
+# Browser-side upload preparation (GET /api/upload-config)
+# With CLIENT_IMAGE_PREP on, the web UI crops empty margins off photos,
+# downscales them to the longest side the engines can use and re-encodes them
+# as CLIENT_IMAGE_TYPE at CLIENT_IMAGE_QUALITY before uploading. Files still
+# larger than UPLOAD_CHUNK_MB (typically PDFs) are sent in chunks through
+# /api/uploads, resuming where they left off after a dropped connection.
+# Unfinished chunked uploads are removed after UPLOAD_SESSION_TTL_SECONDS
+# without a chunk; at most UPLOAD_MAX_SESSIONS are open at once.
+CLIENT_IMAGE_PREP = os.getenv('CLIENT_IMAGE_PREP', '1').lower() in ('1', 'true', 'yes')
+CLIENT_IMAGE_TYPE = os.getenv('CLIENT_IMAGE_TYPE', 'image/webp')
+CLIENT_IMAGE_QUALITY = float(os.getenv('CLIENT_IMAGE_QUALITY', '0.92'))
+UPLOAD_CHUNK_BYTES = int(float(os.getenv('UPLOAD_CHUNK_MB', '4')) * 1024 * 1024)
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv('UPLOAD_SESSION_TTL_SECONDS', '3600'))
+UPLOAD_MAX_SESSIONS = max(1, int(os.getenv('UPLOAD_MAX_SESSIONS', '64')))
+
+# PDF rasterization pipeline
+# Pages are rendered in a process pool ahead of OCR. Set PDF_RASTER_WORKERS=0
+# to render serially in the request thread (the old behaviour).
+PDF_RENDER_ZOOM = 2  # 2x zoom (144 DPI), the old fixed fitz.Matrix(2, 2); always used when IMAGE_PREP=0
+PDF_RASTER_WORKERS = int(os.getenv('PDF_RASTER_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+PDF_PREFETCH_PAGES = max(1, int(os.getenv('PDF_PREFETCH_PAGES', '4')))
+
+# Image preparation before OCR
+# With IMAGE_PREP on, PDF pages are rendered clipped to their content at a zoom
+# chosen from the page size and the engine's input size (between the min and
+# max zoom, and never above a scanned page's own resolution; the default max is
+# the old fixed zoom, so pages never get more pixels than before). Every image then
+# has empty margins cropped and is downscaled to the engine's input size, so
+# no pixels the model would throw away are rendered or moved.
+# OCR_MAX_IMAGE_SIDE overrides the per-engine longest side.
+IMAGE_PREP = os.getenv('IMAGE_PREP', '1').lower() in ('1', 'true', 'yes')
+PDF_MIN_RENDER_ZOOM = float(os.getenv('PDF_MIN_RENDER_ZOOM', '1'))
+PDF_MAX_RENDER_ZOOM = float(os.getenv('PDF_MAX_RENDER_ZOOM', str(PDF_RENDER_ZOOM)))
+OCR_MAX_IMAGE_SIDE = int(os.getenv('OCR_MAX_IMAGE_SIDE', '0'))
+
+# Memory budget for large inputs
+# No decoded image or rendered PDF page holds more than IMAGE_DECODE_MAX_MPX
+# megapixels (3 bytes each). Larger images are reduced by an integer factor
+# while they are decoded, never holding the full-size pixels: JPEGs with
+# DCT scaling (draft mode), uncompressed BMP/PPM/TIFF a band of rows at a
+# time. Other formats that large are rejected; PDF pages are rendered at a
+# lower zoom.
+IMAGE_DECODE_MAX_MPX = float(os.getenv('IMAGE_DECODE_MAX_MPX', '128'))
+IMAGE_DECODE_BAND_PIXELS = 4 * 1024 * 1024  # Pixels read per band of an uncompressed image
+# decode_image() enforces the budget itself; Pillow's decompression-bomb
+# check would refuse images that can be decoded reduced
+Image.MAX_IMAGE_PIXELS = None
+
+# Native PDF text layer
+# Pages of digitally-born PDFs whose embedded text looks trustworthy (enough
+# characters, no broken font encodings) are read with PyMuPDF instead of OCR.
+# Large images on such pages that the text does not cover are still OCR'd.
+PDF_TEXT_LAYER = os.getenv('PDF_TEXT_LAYER', '1').lower() in ('1', 'true', 'yes')
+PDF_TEXT_LAYER_MIN_CHARS = int(os.getenv('PDF_TEXT_LAYER_MIN_CHARS', '20'))
+
+# Layout analysis (region-level OCR)
+# With LAYOUT_MODE on, each page is split into text blocks that are OCR'd
+# independently (batched/in parallel) and merged back in reading order, so
+# one dense page is several short decodes instead of one long one and blank
+# areas cost nothing.
+#   off       - OCR whole pages (default)
+#   heuristic - recursive XY-cut on the page's ink (NumPy only, no model)
+#   detector  - EasyOCR's CRAFT text detector, lines grouped into blocks
+# Pages that split into fewer than 2 or more than LAYOUT_MAX_BLOCKS blocks
+# are OCR'd whole.
+LAYOUT_MODE = os.getenv('LAYOUT_MODE', 'off').lower()
+LAYOUT_MODES = ('off', 'heuristic', 'detector')
+if LAYOUT_MODE not in LAYOUT_MODES:
+    log.warning(f"⚠️  Unknown LAYOUT_MODE '{LAYOUT_MODE}' (expected one of {', '.join(LAYOUT_MODES)}), using 'off'")
+    LAYOUT_MODE = 'off'
+LAYOUT_MAX_BLOCKS = int(os.getenv('LAYOUT_MAX_BLOCKS', '24'))
+
+# Engine routing (per image)
+#   deepseek - DeepSeek-OCR, with EasyOCR while DeepSeek is failing (default)
+#   easyocr  - EasyOCR only
+#   cascade  - EasyOCR first; images whose EasyOCR confidence is below
+#              ESCALATION_MIN_CONFIDENCE are re-read by DeepSeek-OCR, but only
+#              ESCALATION_BUDGET of all images on average (bursts of up to
+#              ESCALATION_BURST), so the expensive engine can't take over
+OCR_ROUTING = os.getenv('OCR_ROUTING', 'deepseek').lower()
+OCR_ROUTING_MODES = ('deepseek', 'easyocr', 'cascade')
+if OCR_ROUTING not in OCR_ROUTING_MODES:
+    log.warning(f"⚠️  Unknown OCR_ROUTING '{OCR_ROUTING}' (expected one of {', '.join(OCR_ROUTING_MODES)}), using 'deepseek'")
+    OCR_ROUTING = 'deepseek'
+ESCALATION_MIN_CONFIDENCE = float(os.getenv('ESCALATION_MIN_CONFIDENCE', '0.6'))
+ESCALATION_BUDGET = float(os.getenv('ESCALATION_BUDGET', '0.25'))
+ESCALATION_BURST = max(1, int(os.getenv('ESCALATION_BURST', '4')))
+
+# EasyOCR languages
+# EASYOCR_LANGUAGES (comma-separated EasyOCR codes) are read unless a request
+# asks for others in its `languages` field. There is one reader per language
+# set, loaded on first use; all readers share one text detector. Past
+# EASYOCR_MAX_READERS readers or EASYOCR_READERS_MAX_MB of recognizer weights
+# (0 = no limit) the least recently used one is unloaded. The
+# EASYOCR_LANGUAGES reader is never unloaded.
+EASYOCR_LANGUAGES = tuple(sorted({
+    code.strip().lower() for code in os.getenv('EASYOCR_LANGUAGES', 'en').split(',') if code.strip()
+})) or ('en',)
+EASYOCR_MAX_READERS = max(1, int(os.getenv('EASYOCR_MAX_READERS', '4')))
+EASYOCR_READERS_MAX_BYTES = int(float(os.getenv('EASYOCR_READERS_MAX_MB', '0')) * 1024 * 1024)
+
+# EasyOCR runtime
+#   torch - EasyOCR's own PyTorch networks (default; int8-quantized on CPU)
+#   onnx  - the same detector and recognizer exported to ONNX once (cached in
+#           EASYOCR_ONNX_DIR) and run by ONNX Runtime on the CPU with all
+#           graph optimizations; needs `pip install onnxruntime onnx`
+# EASYOCR_ONNX_THREADS sets ONNX Runtime's intra-op threads (0 = one per core).
+EASYOCR_RUNTIME = os.getenv('EASYOCR_RUNTIME', 'torch').lower()
+EASYOCR_RUNTIMES = ('torch', 'onnx')
+if EASYOCR_RUNTIME not in EASYOCR_RUNTIMES:
+    log.warning(f"⚠️  Unknown EASYOCR_RUNTIME '{EASYOCR_RUNTIME}' (expected one of {', '.join(EASYOCR_RUNTIMES)}), using 'torch'")
+    EASYOCR_RUNTIME = 'torch'
+EASYOCR_ONNX_DIR = os.getenv('EASYOCR_ONNX_DIR', os.path.join(os.path.expanduser('~'), '.EasyOCR', 'onnx'))
+EASYOCR_ONNX_THREADS = max(0, int(os.getenv('EASYOCR_ONNX_THREADS', '0')))
+
+# DeepSeek-OCR circuit breaker
+# After DEEPSEEK_BREAKER_FAILURES consecutive errors (or a failed model load)
+# DeepSeek-OCR is skipped for DEEPSEEK_BREAKER_RESET_SECONDS. Then one trial
+# image is let through: success closes the circuit, failure reopens it for
+# twice as long (up to DEEPSEEK_BREAKER_MAX_RESET_SECONDS).
+DEEPSEEK_BREAKER_FAILURES = max(1, int(os.getenv('DEEPSEEK_BREAKER_FAILURES', '3')))
+DEEPSEEK_BREAKER_RESET_SECONDS = float(os.getenv('DEEPSEEK_BREAKER_RESET_SECONDS', '30'))
+DEEPSEEK_BREAKER_MAX_RESET_SECONDS = float(os.getenv('DEEPSEEK_BREAKER_MAX_RESET_SECONDS', '1800'))
+
+# DeepSeek-OCR decoding budget
+# Text is streamed to job clients while it is decoded. Each image's decode
+# stops after DEEPSEEK_MAX_NEW_TOKENS tokens, after DEEPSEEK_MAX_DECODE_SECONDS
+# (0 = no limit), or once the last DEEPSEEK_REPETITION_WINDOW tokens are the
+# same phrase looping (0 = never check); the text up to there is kept.
+DEEPSEEK_MAX_NEW_TOKENS = max(1, int(os.getenv('DEEPSEEK_MAX_NEW_TOKENS', '4096')))
+DEEPSEEK_MAX_DECODE_SECONDS = float(os.getenv('DEEPSEEK_MAX_DECODE_SECONDS', '600'))
+DEEPSEEK_REPETITION_WINDOW = max(0, int(os.getenv('DEEPSEEK_REPETITION_WINDOW', '256')))
+DEEPSEEK_STREAM_INTERVAL_SECONDS = 0.25  # At most this often a decode reports its text so far
+
+# Micro-batching inference scheduler
+# Concurrent OCR calls (other requests, other pages of the same PDF) are
+# gathered into batches of up to BATCH_MAX_SIZE images, waiting at most
+# BATCH_MAX_WAIT_MS for a batch to fill up.
+BATCH_MAX_SIZE = max(1, int(os.getenv('BATCH_MAX_SIZE', '4')))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', '20'))
+BATCH_MAX_QUEUE = max(1, int(os.getenv('BATCH_MAX_QUEUE', '64')))
+
+# OCR result cache
+# Results are keyed on the decoded pixels plus engine and inference settings.
+# The memory tier is an LRU bounded by OCR_CACHE_MAX_MB of cached text; set
+# OCR_CACHE_DIR to also keep results on disk across restarts.
+OCR_CACHE_MAX_BYTES = int(float(os.getenv('OCR_CACHE_MAX_MB', '64')) * 1024 * 1024)
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', '')
+
+# CPU inference precision for DeepSeek-OCR (ignored on GPU)
+#   fp32      - full float32 model (default, ~16GB RAM)
+#   int8      - dynamic int8 quantization of all Linear layers
+#   bf16      - float32 weights, bfloat16 autocast during inference
+#   int8-bf16 - both of the above
+# bf16 autocast is only enabled when the CPU has native bfloat16 support.
+CPU_PRECISION = os.getenv('CPU_PRECISION', 'fp32').lower()
+CPU_PRECISION_MODES = ('fp32', 'int8', 'bf16', 'int8-bf16')
+
+# DeepSeek-OCR worker pool (CPU serving)
+# With INFERENCE_WORKERS > 0 the Flask process never loads the model itself.
+# The float32 weights are exported once to WEIGHTS_CACHE_DIR, and every worker
+# process memory-maps that file read-only, so the OS shares one copy of the
+# weights between all workers. Keep BATCH_MAX_SIZE >= INFERENCE_WORKERS so a
+# batch can keep every worker busy.
+INFERENCE_WORKERS = max(0, int(os.getenv('INFERENCE_WORKERS', '0')))
+# An empty value (as in a copied .env.example) means the default
+INFERENCE_THREADS_PER_WORKER = int(
+    os.getenv('INFERENCE_THREADS_PER_WORKER') or max(1, (os.cpu_count() or 1) // max(1, INFERENCE_WORKERS))
+)
+WEIGHTS_CACHE_DIR = os.getenv('WEIGHTS_CACHE_DIR', 'model_cache')
+
+# Model preloading
+# MODEL_PRELOAD=1 loads the OCR engine in a background thread at startup and
+# (unless MODEL_WARMUP=0) runs one synthetic inference to prime kernels and
+# allocators. /api/ready answers 503 until that has finished.
+MODEL_PRELOAD = os.getenv('MODEL_PRELOAD', '0').lower() in ('1', 'true', 'yes')
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', '1').lower() in ('1', 'true', 'yes')
+
+# Background OCR jobs (/api/jobs)
+JOB_WORKERS = max(1, int(os.getenv('JOB_WORKERS', '2')))
+JOB_TTL_SECONDS = int(os.getenv('JOB_TTL_SECONDS', '3600'))  # Finished jobs are kept this long
+# A job whose last stream client disconnected is cancelled after this long
+# unless a client reconnects (0 = never cancel abandoned jobs)
+JOB_ABANDON_SECONDS = float(os.getenv('JOB_ABANDON_SECONDS', '30'))
+
+# Admission control (/api/ocr and /api/jobs)
+# Each request is costed in megapixels of OCR work (pages x pixels the engine
+# will see). Up to ADMISSION_MAX_RUNNING_MPX runs at once and up to
+# ADMISSION_MAX_QUEUED_MPX more waits, served one request per client in turn
+# (clients are told apart by ADMISSION_CLIENT_HEADER, else the remote
+# address). Single images of at most ADMISSION_PRIORITY_MAX_MPX go in a
+# priority lane ahead of the queue. Beyond the queue limit requests get 429
+# with a Retry-After estimated from recent throughput; /api/ocr requests
+# still waiting after ADMISSION_MAX_WAIT_SECONDS get 503.
+ADMISSION_MAX_RUNNING_MPX = float(os.getenv('ADMISSION_MAX_RUNNING_MPX', '32'))
+ADMISSION_MAX_QUEUED_MPX = float(os.getenv('ADMISSION_MAX_QUEUED_MPX', '256'))
+ADMISSION_PRIORITY_MAX_MPX = float(os.getenv('ADMISSION_PRIORITY_MAX_MPX', '4'))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', '300'))
+ADMISSION_CLIENT_HEADER = os.getenv('ADMISSION_CLIENT_HEADER', '')
+
+# Graceful shutdown (serve.py)
+# On shutdown new uploads get 503 and /api/ready reports not ready, while
+# queued and running OCR work gets up to SHUTDOWN_DRAIN_SECONDS to finish;
+# jobs still unfinished then are cancelled.
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', '120'))
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
@@ -146,27 +448,201 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 # Create uploads folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Global model instances (lazy loaded)
-_model = None
-_tokenizer = None
-_ocr_reader = None  # EasyOCR fallback
-_use_fallback = False  # Track if we should use fallback
+# ============================================================
+# Metrics (Prometheus text format on /metrics)
+# ============================================================
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics_registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Sum of every series matching the given labels"""
+        wanted = {self.labelnames.index(name): str(value) for name, value in labels.items()}
+        with self._lock:
+            return sum(value for key, value in self._values.items()
+                       if all(key[index] == label for index, label in wanted.items()))
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels (durations in seconds)"""
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _metrics_registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labelnames, key, [('le', repr(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+_metrics_registry = []
+_gauge_callbacks = []  # Functions returning [(name, help, [(labels dict, value)])] at scrape time
+
+REQUESTS_TOTAL = Counter('ocr_http_requests_total', 'HTTP requests by endpoint and status code', ('endpoint', 'status'))
+REQUEST_SECONDS = Histogram('ocr_http_request_seconds', 'Time to produce an HTTP response', ('endpoint',))
+PIXELS_TOTAL = Counter(
+    'ocr_image_pixels_total',
+    'Pixels before/after image preparation (input, prepared) and PDF pixels rendered vs. the fixed 2x zoom',
+    ('engine', 'stage')
+)
+PDF_PAGES_TOTAL = Counter('ocr_pdf_pages_total', 'PDF pages by extraction path', ('path',))
+LAYOUT_BLOCKS_TOTAL = Counter(
+    'ocr_layout_blocks_total', 'Pages split by the layout stage (unit=page) and blocks OCR\'d from them (unit=block)',
+    ('mode', 'unit')
+)
+PAGES_TOTAL = Counter('ocr_pages_total', 'Pages/images OCR\'d, by engine and source (model or cache)', ('engine', 'source'))
+FALLBACKS_TOTAL = Counter('ocr_fallbacks_total', 'DeepSeek-OCR failures that sent work to EasyOCR, by reason', ('reason',))
+ROUTING_TOTAL = Counter(
+    'ocr_routing_decisions_total',
+    'Cascade routing decisions (confident, escalated, budget_exhausted, circuit_open, escalation_failed)',
+    ('decision',)
+)
+ADMISSION_TOTAL = Counter(
+    'ocr_admission_total',
+    'Admission decisions by lane (priority or fair) and outcome (admitted, rejected, cancelled)',
+    ('lane', 'outcome')
+)
+CANCELLED_TOTAL = Counter(
+    'ocr_cancelled_total',
+    'Requests and jobs stopped before finishing, by reason (disconnected, queue_timeout, abandoned, requested, shutdown)',
+    ('reason',)
+)
+ERRORS_TOTAL = Counter('ocr_errors_total', 'Errors raised inside an instrumented stage', ('stage',))
+STAGE_SECONDS = Histogram('ocr_stage_seconds', 'Time spent in each OCR pipeline stage', ('stage',))
+DECODE_TOKENS_TOTAL = Counter(
+    'ocr_deepseek_generated_tokens_total',
+    'Tokens generated by DeepSeek-OCR, by why the decode stopped (eos, max_tokens, time_budget, repetition)',
+    ('stop',)
+)
+DECODE_TOKENS_PER_SECOND = Histogram(
+    'ocr_deepseek_tokens_per_second', 'DeepSeek-OCR decode speed per image, from the first generated token',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+EASYOCR_READERS_TOTAL = Counter(
+    'ocr_easyocr_reader_pool_total', 'EasyOCR reader pool lookups and changes (hit, loaded, load_failed, evicted)',
+    ('event',)
+)
+CHUNKED_UPLOADS_TOTAL = Counter(
+    'ocr_chunked_uploads_total', 'Chunked uploads by event (created, completed, used, returned, deleted, expired, offset_conflict, busy)',
+    ('event',)
+)
+MODEL_LOAD_SECONDS = Histogram(
+    'ocr_model_load_seconds', 'Model loading time by engine and phase', ('engine', 'phase'),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200)
+)
+
+@contextmanager
+def stage_timer(stage, histogram=STAGE_SECONDS, **labels):
+    """Time a block into `histogram` (the stage histogram by default) and count errors raised in it"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS_TOTAL.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if histogram is STAGE_SECONDS:
+            histogram.observe(elapsed, stage=stage)
+        else:
+            histogram.observe(elapsed, **labels)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("stage finished", extra=dict(labels, stage=stage, duration_ms=round(elapsed * 1000, 1)))
+
+def render_metrics():
+    lines = []
+    for metric in list(_metrics_registry):
+        lines.extend(metric.collect())
+    for callback in _gauge_callbacks:
+        for name, documentation, samples in callback():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return "\n".join(lines) + "\n"
+
+_cpu_bf16_autocast = False  # Set by _apply_cpu_precision() when bf16 autocast is usable
+
+DEEPSEEK_MODEL_NAME = "deepseek-ai/DeepSeek-OCR"
+
+# DeepSeek-OCR inference settings (also part of the OCR cache key)
+DEEPSEEK_PROMPT = "<image>\nExtract all text from this image."
+DEEPSEEK_INFER_PARAMS = {'base_size': 1024, 'image_size': 640, 'crop_mode': True}
+EASYOCR_PARAMS = {'paragraph': True}  # Plus the reader's languages
 
 def get_deepseek_model():
-    """Lazy load DeepSeek-OCR model"""
-    global _model, _tokenizer, _use_fallback
+    """(model, tokenizer) of this process's DeepSeek-OCR engine, loading it on first use; (None, None) if it fails"""
+    return _deepseek_engine.model()
+
+def _load_deepseek_model():
+    """Load DeepSeek-OCR; returns (model, tokenizer), or (None, None) when it fails"""
+    log.info("Loading DeepSeek-OCR model...")
+    log.info("First time: ~8GB download + initialization (5-10 min)")
+    log.warning("⚠️  IMPORTANT: This model requires significant resources:")
+    log.info("   - GPU: ~8GB VRAM, fast inference (~5-10 sec/image)")
+    log.info("   - CPU: ~16GB RAM, VERY slow inference (~2-5 min/image)")
     
-    if _model is None and not _use_fallback:
-        print("=" * 60)
-        print("Loading DeepSeek-OCR model...")
-        print("First time: ~8GB download + initialization (5-10 min)")
-        print("=" * 60)
-        print("\n⚠️  IMPORTANT: This model requires significant resources:")
-        print("   - GPU: ~8GB VRAM, fast inference (~5-10 sec/image)")
-        print("   - CPU: ~16GB RAM, VERY slow inference (~2-5 min/image)")
-        print("=" * 60)
-        
-        model_name = "deepseek-ai/DeepSeek-OCR"
+    model_name = DEEPSEEK_MODEL_NAME
+    
+    # Importing torch/transformers can fail too; it goes through the same
+    # failure path as the load itself
+    try:
+        torch = _import_torch()
+        _import_transformers()
+        from transformers import AutoModel, AutoTokenizer
         
         # Check if CUDA is available and actually works
         device = "cpu"
@@ -175,338 +651,3846 @@ def get_deepseek_model():
                 # Test if CUDA actually works
                 torch.zeros(1).cuda()
                 device = "cuda"
-                print(f"🔧 Using device: {device}")
+                log.info(f"🔧 Using device: {device}")
             else:
-                print(f"🔧 Using device: {device}")
-                print("⚠️  WARNING: Running on CPU will be VERY slow!")
-                print("   Recommended: Use NVIDIA GPU for practical performance.")
+                log.info(f"🔧 Using device: {device}")
+                log.warning("⚠️  WARNING: Running on CPU will be VERY slow!")
+                log.info("   Recommended: Use NVIDIA GPU for practical performance.")
         except Exception as cuda_error:
-            print(f"🔧 Using device: cpu (CUDA check failed: {cuda_error})")
-            print("⚠️  WARNING: Running on CPU will be VERY slow!")
-            print("   Recommended: Use NVIDIA GPU for practical performance.")
-        except Exception as cuda_error:
-            print(f"🔧 Using device: cpu (CUDA check failed: {cuda_error})")
-            print("⚠️  WARNING: Running on CPU will be VERY slow!")
-            print("   Recommended: Use NVIDIA GPU for practical performance.")
+            log.info(f"🔧 Using device: cpu (CUDA check failed: {cuda_error})")
+            log.warning("⚠️  WARNING: Running on CPU will be VERY slow!")
+            log.info("   Recommended: Use NVIDIA GPU for practical performance.")
+        
+        log.info("📥 Loading tokenizer...")
+        start_time = time.time()
+        
+        tokenizer = AutoTokenizer.from_pretrained(
+            model_name,
+            trust_remote_code=True
+        )
+        tok_time = time.time() - start_time
+        MODEL_LOAD_SECONDS.observe(tok_time, engine='deepseek', phase='tokenizer')
+        log.info(f"✓ Tokenizer loaded ({tok_time:.1f}s)")
+        
+        log.info("📥 Loading DeepSeek-OCR model (this takes a few minutes)...")
+        log.info("⏳ First time: Downloading ~8GB (5-10 min)")
+        log.info("⏳ Subsequent: Loading from cache (30-60s GPU, 2-3min CPU)")
+        log.info("⚙️  Applying compatibility patches for transformers 4.57.1+...")
+        model_start = time.time()
         
+        _install_flash_attention_shim()
+        
+        # First try: Load with eager attention (safest, most compatible)
         try:
-            print("\n📥 Loading tokenizer...")
-            import time
-            start_time = time.time()
-            
-            _tokenizer = AutoTokenizer.from_pretrained(
+            log.info("📦 Starting model download/load... (this is the slow part)")
+            model = AutoModel.from_pretrained(
                 model_name,
-                trust_remote_code=True
+                trust_remote_code=True,
+                torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+                low_cpu_mem_usage=True,
+                device_map="auto" if device == "cuda" else None,
+                attn_implementation="eager",  # Avoid flash attention issues
+                force_download=False,
+                resume_download=True,
             )
-            tok_time = time.time() - start_time
-            print(f"✓ Tokenizer loaded ({tok_time:.1f}s)")
-            
-            print("\n📥 Loading DeepSeek-OCR model (this takes a few minutes)...")
-            print("⏳ First time: Downloading ~8GB (5-10 min)")
-            print("⏳ Subsequent: Loading from cache (30-60s GPU, 2-3min CPU)")
-            print("⚙️  Applying compatibility patches for transformers 4.57.1+...")
-            model_start = time.time()
-            
-            # Monkey-patch to handle missing LlamaFlashAttention2
-            import sys
-            import transformers.models.llama.modeling_llama as llama_module
-            
-            # If LlamaFlashAttention2 doesn't exist, create a dummy class
-            if not hasattr(llama_module, 'LlamaFlashAttention2'):
-                print("⚠️  LlamaFlashAttention2 not found, creating compatibility shim...")
-                # Create a dummy class that points to the standard attention
-                llama_module.LlamaFlashAttention2 = llama_module.LlamaAttention
-                print("✓ Compatibility shim installed")
+            model_time = time.time() - model_start
+            log.info(f"✓ Model loaded with eager attention ({model_time:.1f}s)")
+        except Exception as e:
+            error_msg = str(e)
+            log.warning(f"⚠️  Eager attention failed: {error_msg[:200]}")
+            log.info("Trying alternative loading method...")
             
-            # First try: Load with eager attention (safest, most compatible)
+            # Second try: Load with sdpa attention (scaled dot product attention)
             try:
-                print("📦 Starting model download/load... (this is the slow part)")
-                _model = AutoModel.from_pretrained(
+                model = AutoModel.from_pretrained(
                     model_name,
                     trust_remote_code=True,
                     torch_dtype=torch.float16 if device == "cuda" else torch.float32,
                     low_cpu_mem_usage=True,
                     device_map="auto" if device == "cuda" else None,
-                    attn_implementation="eager",  # Avoid flash attention issues
+                    attn_implementation="sdpa",
                     force_download=False,
                     resume_download=True,
                 )
-                model_time = time.time() - model_start
-                print(f"✓ Model loaded with eager attention ({model_time:.1f}s)")
-            except Exception as e:
-                error_msg = str(e)
-                print(f"⚠️  Eager attention failed: {error_msg[:200]}")
-                print("Trying alternative loading method...")
-                
-                # Second try: Load with sdpa attention (scaled dot product attention)
-                try:
-                    _model = AutoModel.from_pretrained(
-                        model_name,
-                        trust_remote_code=True,
-                        torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-                        low_cpu_mem_usage=True,
-                        device_map="auto" if device == "cuda" else None,
-                        attn_implementation="sdpa",
-                        force_download=False,
-                        resume_download=True,
-                    )
-                    print("✓ Model loaded with SDPA attention")
-                except Exception as e2:
-                    error_msg2 = str(e2)
-                    print(f"⚠️  SDPA attention failed: {error_msg2[:200]}")
-                    print("Trying without attention specification...")
-                    
-                    # Third try: Load without specifying attention (let model decide)
-                    _model = AutoModel.from_pretrained(
-                        model_name,
-                        trust_remote_code=True,
-                        torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-                        low_cpu_mem_usage=True,
-                        device_map="auto" if device == "cuda" else None,
-                        force_download=False,
-                        resume_download=True,
-                    )
-                    print("✓ Model loaded with default attention")
-            
-            # Move model to correct device with proper dtype
-            if device == "cpu":
-                print("⚙️  Converting model to CPU with float32 (bfloat16 not fully supported on CPU)...")
-                # Force convert ALL parameters and buffers to float32
-                _model = _model.float()  # Convert to float32
-                _model = _model.to(torch.device('cpu'))
+                log.info("✓ Model loaded with SDPA attention")
+            except Exception as e2:
+                error_msg2 = str(e2)
+                log.warning(f"⚠️  SDPA attention failed: {error_msg2[:200]}")
+                log.info("Trying without attention specification...")
                 
-                # Additional: Convert any remaining bfloat16 parameters
-                for name, param in _model.named_parameters():
-                    if param.dtype == torch.bfloat16:
-                        param.data = param.data.float()
-                
-                for name, buffer in _model.named_buffers():
-                    if buffer.dtype == torch.bfloat16:
-                        buffer.data = buffer.data.float()
-                
-                print("⚠️  Model set to CPU mode (will be slow)")
-            else:
-                # Only try .cuda() if we confirmed CUDA works
-                try:
-                    _model = _model.cuda()
-                    print("✓ Model moved to GPU")
-                except Exception as e:
-                    print(f"⚠️  GPU move failed: {e}, falling back to CPU")
-                    _model = _model.float().to(torch.device('cpu'))
+                # Third try: Load without specifying attention (let model decide)
+                model = AutoModel.from_pretrained(
+                    model_name,
+                    trust_remote_code=True,
+                    torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+                    low_cpu_mem_usage=True,
+                    device_map="auto" if device == "cuda" else None,
+                    force_download=False,
+                    resume_download=True,
+                )
+                log.info("✓ Model loaded with default attention")
+        
+        MODEL_LOAD_SECONDS.observe(time.time() - model_start, engine='deepseek', phase='weights')
+        conversion_start = time.time()
+        
+        # Move model to correct device with proper dtype
+        if device == "cpu":
+            log.info("⚙️  Converting model to CPU with float32 (bfloat16 not fully supported on CPU)...")
+            # Force convert ALL parameters and buffers to float32
+            model = model.float()  # Convert to float32
+            model = model.to(torch.device('cpu'))
             
-            _model.eval()
+            # Additional: Convert any remaining bfloat16 parameters
+            for name, param in model.named_parameters():
+                if param.dtype == torch.bfloat16:
+                    param.data = param.data.float()
             
-            print("\n" + "=" * 60)
-            print("✅ DeepSeek-OCR model loaded successfully!")
-            print(f"   Device: {device}")
-            print(f"   Dtype: {next(_model.parameters()).dtype}")
-            print("=" * 60)
+            for name, buffer in model.named_buffers():
+                if buffer.dtype == torch.bfloat16:
+                    buffer.data = buffer.data.float()
             
-        except Exception as e:
-            print(f"\n❌ Error loading DeepSeek-OCR model: {str(e)}")
-            print("⚠️  Switching to EasyOCR fallback...")
-            _use_fallback = True
-            return None, None
+            model = _apply_cpu_precision(model)
+            log.warning("⚠️  Model set to CPU mode (will be slow)")
+        else:
+            # Only try .cuda() if we confirmed CUDA works
+            try:
+                model = model.cuda()
+                log.info("✓ Model moved to GPU")
+            except Exception as e:
+                log.warning(f"⚠️  GPU move failed: {e}, falling back to CPU")
+                model = model.float().to(torch.device('cpu'))
+        
+        model.eval()
+        MODEL_LOAD_SECONDS.observe(time.time() - conversion_start, engine='deepseek', phase='device_conversion')
+        MODEL_LOAD_SECONDS.observe(time.time() - start_time, engine='deepseek', phase='total')
+        
+        log.info("✅ DeepSeek-OCR model loaded successfully!")
+        log.info(f"   Device: {device}")
+        log.info(f"   Dtype: {next(model.parameters()).dtype}")
+        return model, tokenizer
+        
+    except Exception as e:
+        log.error(f"❌ Error loading DeepSeek-OCR model: {str(e)}")
+        log.warning("⚠️  Switching to EasyOCR fallback...")
+        FALLBACKS_TOTAL.inc(reason='load_failed')
+        return None, None
+
+def _install_flash_attention_shim():
+    """Monkey-patch to handle missing LlamaFlashAttention2 (needed by the model's remote code)"""
+    import transformers.models.llama.modeling_llama as llama_module
     
-    return _model, _tokenizer
+    # If LlamaFlashAttention2 doesn't exist, create a dummy class
+    if not hasattr(llama_module, 'LlamaFlashAttention2'):
+        log.warning("⚠️  LlamaFlashAttention2 not found, creating compatibility shim...")
+        # Create a dummy class that points to the standard attention
+        llama_module.LlamaFlashAttention2 = llama_module.LlamaAttention
+        log.info("✓ Compatibility shim installed")
+
+def _cpu_supports_bf16():
+    """True when oneDNN can run bfloat16 kernels natively (AVX512-BF16 / AMX)"""
+    torch = _import_torch()
+    try:
+        return bool(torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
 
-def get_easyocr_reader():
-    """Lazy load EasyOCR reader as fallback"""
-    global _ocr_reader
+def _apply_cpu_precision(model):
+    """Apply CPU_PRECISION to a float32 CPU model"""
+    global _cpu_bf16_autocast
     
-    if _ocr_reader is None:
-        print("\n" + "=" * 60)
-        print("Initializing EasyOCR (fallback mode)...")
-        print("=" * 60)
-        try:
-            import easyocr
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            print(f"🔧 Loading EasyOCR on {device}...")
-            _ocr_reader = easyocr.Reader(['en'], gpu=(device == "cuda"))
-            print(f"✅ EasyOCR initialized successfully!")
-        except ImportError:
-            print("📥 EasyOCR not installed. Installing...")
-            import subprocess
-            import sys
-            subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'easyocr'])
-            import easyocr
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            _ocr_reader = easyocr.Reader(['en'], gpu=(device == "cuda"))
-            print(f"✅ EasyOCR installed and initialized!")
-        except Exception as e:
-            print(f"⚠️  GPU initialization failed: {e}")
-            print("Trying CPU mode...")
-            import easyocr
-            _ocr_reader = easyocr.Reader(['en'], gpu=False)
-            print("✅ EasyOCR initialized on CPU!")
+    mode = CPU_PRECISION if CPU_PRECISION in CPU_PRECISION_MODES else 'fp32'
+    if mode != CPU_PRECISION:
+        log.warning(f"⚠️  Unknown CPU_PRECISION '{CPU_PRECISION}', using fp32")
     
-    return _ocr_reader
-
-def extract_text_from_image(image: Image.Image) -> str:
-    """Extract text from an image using DeepSeek-OCR with EasyOCR fallback"""
-    global _use_fallback
+    if mode in ('int8', 'int8-bf16'):
+        torch = _import_torch()
+        log.info("⚙️  Quantizing Linear layers to dynamic int8...")
+        quantize_start = time.time()
+        # inplace=True avoids a deepcopy of the whole float32 model
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+        quantize_time = time.time() - quantize_start
+        MODEL_LOAD_SECONDS.observe(quantize_time, engine='deepseek', phase='quantization')
+        log.info(f"✓ int8 dynamic quantization applied ({quantize_time:.1f}s)")
     
+    if mode in ('bf16', 'int8-bf16'):
+        if _cpu_supports_bf16():
+            _cpu_bf16_autocast = True
+            log.info("✓ bfloat16 autocast enabled for CPU inference")
+        else:
+            log.warning("⚠️  CPU has no native bfloat16 support, keeping float32 activations")
+    
+    return model
+
+def _inference_autocast():
+    """Autocast context for DeepSeek-OCR inference (bf16 on capable CPUs, otherwise a no-op)"""
+    if _cpu_bf16_autocast:
+        torch = _import_torch()
+        return torch.autocast('cpu', dtype=torch.bfloat16)
+    from contextlib import nullcontext
+    return nullcontext()
+
+def _easyocr_module():
+    """Import EasyOCR, installing it first if it is missing"""
     try:
-        print("\n🔄 Starting OCR extraction...")
-        
-        # Try DeepSeek-OCR first if not in fallback mode
-        if not _use_fallback:
+        import easyocr
+    except ImportError:
+        log.info("📥 EasyOCR not installed. Installing...")
+        import subprocess
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'easyocr'])
+        import easyocr
+    return easyocr
+
+# Reader attributes that make up its text detector (language-independent)
+_EASYOCR_DETECTOR_ATTRS = ('detector', 'detect_network', 'get_detector', 'get_textbox')
+
+def _load_easyocr_reader(languages, detector=None, runtime='torch'):
+    """Create an EasyOCR reader for `languages`.
+
+    `detector` is {'device': ..., <_EASYOCR_DETECTOR_ATTRS>} taken from a
+    reader loaded earlier; when it is on the same device the new reader
+    borrows it instead of loading its own copy of the detector weights.
+    With runtime 'onnx' the reader is loaded on the CPU without EasyOCR's
+    own quantization and its networks are swapped for ONNX Runtime sessions.
+    """
+    log.info(f"Initializing EasyOCR ({', '.join(languages)})...")
+    # EasyOCR imports torch itself; import it here first so the CPU-only patches apply
+    torch = _import_torch()
+    easyocr = _easyocr_module()
+
+    def create(gpu):
+        options = {'gpu': gpu}
+        if runtime == 'onnx':
+            options['quantize'] = False  # Export the float graphs; ONNX Runtime optimizes them itself
+        if detector is not None and detector['device'] == ("cuda" if gpu else "cpu"):
+            reader = easyocr.Reader(list(languages), detector=False, **options)
+            for name in _EASYOCR_DETECTOR_ATTRS:
+                setattr(reader, name, detector[name])
+        else:
+            reader = easyocr.Reader(list(languages), **options)
+        return reader
+
+    device = "cuda" if torch.cuda.is_available() and runtime == 'torch' else "cpu"
+    log.info(f"🔧 Loading EasyOCR on {device}...")
+    try:
+        reader = create(device == "cuda")
+    except ValueError:
+        raise  # An unknown or incompatible language set; another device won't help
+    except Exception as e:
+        if device == "cpu":
+            raise
+        log.warning(f"⚠️  GPU initialization failed: {e}")
+        log.info("Trying CPU mode...")
+        reader = create(False)
+    if runtime == 'onnx':
+        _easyocr_to_onnx(reader)
+    log.info(f"✅ EasyOCR initialized on {reader.device} ({', '.join(languages)})")
+    return reader
+
+def _reader_bytes(reader):
+    """Bytes of a reader's recognizer weights (torch or ONNX)"""
+    if isinstance(reader.recognizer, OnnxModule):
+        return reader.recognizer.weight_bytes
+    return _module_bytes(reader.recognizer)
+
+def _module_bytes(module):
+    """Bytes of a torch module's weights, including dynamically quantized (packed) ones"""
+    torch = _import_torch()
+    total = 0
+    pending = list(module.state_dict().values())
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (tuple, list)):
+            pending.extend(value)
+        elif isinstance(value, torch.Tensor):
+            total += value.numel() * value.element_size()
+    return total
+
+def parse_languages(value):
+    """Normalise EasyOCR language codes (a comma-separated string or a list) into a reader key.
+
+    An empty value means EASYOCR_LANGUAGES. Raises ValueError for anything
+    not shaped like an EasyOCR code ("en", "ch_sim", "rs_cyrillic", ...);
+    whether EasyOCR knows the code, and can read those languages together,
+    is only found out when their reader loads.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    codes = {code.strip().lower() for code in value or () if code and code.strip()}
+    if not codes:
+        return EASYOCR_LANGUAGES
+    invalid = sorted(code for code in codes if not _LANGUAGE_CODE.fullmatch(code))
+    if invalid:
+        raise ValueError(f"Invalid language code(s): {', '.join(invalid)}")
+    return tuple(sorted(codes))
+
+_LANGUAGE_CODE = re.compile(r'[a-z]{2,3}(_[a-z]+)?')
+
+class EasyOCRReaderPool:
+    """EasyOCR readers keyed by language set, loaded on first use and shared by all threads.
+
+    Each language set loads once: concurrent first callers wait for the
+    same load, while other language sets load (or are used) in parallel.
+    The text detector comes from the first reader and is borrowed by the
+    rest. Beyond max_readers readers or max_bytes of recognizer weights the
+    least recently used reader is dropped from the pool; batches already
+    holding it finish normally. The default set and the reader just loaded
+    are never dropped.
+    """
+
+    def __init__(self, default_languages, max_readers, max_bytes=0, load_reader=_load_easyocr_reader):
+        self.default_languages = default_languages
+        self.load_reader = load_reader  # (languages, detector) -> reader
+        self.max_readers = max_readers
+        self.max_bytes = max_bytes
+        self._readers = OrderedDict()  # languages -> {'reader', 'bytes', 'load_seconds', 'loaded_at', 'uses'}
+        self._loading = {}  # languages -> lock held while that set loads
+        self._detector = None
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'load_failures': 0, 'evictions': 0}
+
+    def _lookup(self, languages):
+        with self._lock:
+            entry = self._readers.get(languages)
+            if entry is None:
+                return None
+            self._readers.move_to_end(languages)
+            entry['uses'] += 1
+            self._stats['hits'] += 1
+        EASYOCR_READERS_TOTAL.inc(event='hit')
+        return entry['reader']
+
+    def get(self, languages=None):
+        """The reader for `languages` (a parse_languages() key; None for the default set)"""
+        languages = languages or self.default_languages
+        reader = self._lookup(languages)
+        if reader is not None:
+            return reader
+
+        with self._lock:
+            load_lock = self._loading.setdefault(languages, threading.Lock())
+        with load_lock:
+            # Another thread may have finished loading this set while we waited
+            reader = self._lookup(languages)
+            if reader is not None:
+                return reader
+            start = time.perf_counter()
             try:
-                model, tokenizer = get_deepseek_model()
-                
-                # Check if model loaded successfully
-                if model is None or tokenizer is None:
-                    print("⚠️  DeepSeek-OCR unavailable, using EasyOCR fallback")
-                    _use_fallback = True
-                else:
-                    # Save image temporarily (model expects file path)
-                    import tempfile
-                    temp_dir = tempfile.mkdtemp()
-                    temp_image_path = os.path.join(temp_dir, 'input_image.png')
-                    image.save(temp_image_path, 'PNG')
-                    
-                    try:
-                        # Prepare the prompt (using DeepSeek-OCR's format)
-                        prompt = "<image>\nExtract all text from this image."
-                        
-                        print("📝 Processing image with DeepSeek-OCR...")
-                        print("⚙️  Using: base_size=1024, image_size=640, crop_mode=True")
-                        
-                        # Use DeepSeek-OCR's custom infer method
-                        result = model.infer(
-                            tokenizer=tokenizer,
-                            prompt=prompt,
-                            image_file=temp_image_path,
-                            output_path=temp_dir,
-                            base_size=1024,
-                            image_size=640,
-                            crop_mode=True,
-                            save_results=False,
-                            test_compress=False
-                        )
-                        
-                        # Clean up result
-                        if result:
-                            text = result.strip()
-                            if text.startswith("Extract all text from this image."):
-                                text = text.replace("Extract all text from this image.", "").strip()
-                        else:
-                            text = "No text detected in the image."
-                        
-                        print(f"✅ DeepSeek-OCR complete! Extracted {len(text)} characters\n")
-                        return text
-                        
-                    finally:
-                        # Clean up temp files
-                        import shutil
-                        if os.path.exists(temp_dir):
-                            shutil.rmtree(temp_dir, ignore_errors=True)
-                            
-            except Exception as deepseek_error:
-                print(f"⚠️  DeepSeek-OCR error: {str(deepseek_error)}")
-                print("🔄 Falling back to EasyOCR...")
-                _use_fallback = True
-        
-        # Use EasyOCR fallback
-        if _use_fallback:
-            reader = get_easyocr_reader()
-            
-            print("📝 Processing image with EasyOCR...")
-            import numpy as np
-            image_array = np.array(image)
-            
-            results = reader.readtext(image_array, detail=0, paragraph=True)
-            text = '\n'.join(results)
-            result = text if text.strip() else "No text detected in the image."
-            print(f"✅ EasyOCR complete! Extracted {len(result)} characters\n")
-            return result
-        
+                with stage_timer('easyocr_load', MODEL_LOAD_SECONDS, engine='easyocr', phase='total'):
+                    reader = self.load_reader(languages, self._detector)
+            except Exception:
+                with self._lock:
+                    self._loading.pop(languages, None)
+                    self._stats['load_failures'] += 1
+                EASYOCR_READERS_TOTAL.inc(event='load_failed')
+                raise
+            entry = {
+                'reader': reader,
+                'bytes': _reader_bytes(reader),
+                'load_seconds': round(time.perf_counter() - start, 2),
+                'loaded_at': time.time(),
+                'uses': 1,
+            }
+            with self._lock:
+                if self._detector is None:
+                    self._detector = {name: getattr(reader, name) for name in _EASYOCR_DETECTOR_ATTRS}
+                    self._detector['device'] = reader.device
+                self._readers[languages] = entry
+                self._loading.pop(languages, None)
+                self._stats['loads'] += 1
+                self._evict()
+            EASYOCR_READERS_TOTAL.inc(event='loaded')
+            log.info(f"📚 EasyOCR reader for {', '.join(languages)} loaded in {entry['load_seconds']}s "
+                     f"({entry['bytes'] / 1024 / 1024:.0f}MB)")
+            return reader
+
+    def _evict(self):
+        """Drop least recently used readers until the pool fits (caller holds _lock)"""
+        total = sum(entry['bytes'] for entry in self._readers.values())
+        for languages in list(self._readers)[:-1]:
+            if len(self._readers) <= self.max_readers and (not self.max_bytes or total <= self.max_bytes):
+                break
+            if languages == self.default_languages:
+                continue
+            entry = self._readers.pop(languages)
+            total -= entry['bytes']
+            self._stats['evictions'] += 1
+            EASYOCR_READERS_TOTAL.inc(event='evicted')
+            log.info(f"🗑️  Unloaded EasyOCR reader for {', '.join(languages)} "
+                     f"(used {entry['uses']} time(s), {entry['bytes'] / 1024 / 1024:.0f}MB)")
+
+    def loaded(self, languages=None):
+        with self._lock:
+            return (languages or self.default_languages) in self._readers
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['readers'] = [
+                {
+                    'languages': list(languages),
+                    'bytes': entry['bytes'],
+                    'load_seconds': entry['load_seconds'],
+                    'resident_seconds': round(now - entry['loaded_at'], 1),
+                    'uses': entry['uses'],
+                }
+                for languages, entry in reversed(self._readers.items())  # Most recently used first
+            ]
+            stats['loading'] = [list(languages) for languages in self._loading]
+        stats['bytes'] = sum(reader['bytes'] for reader in stats['readers'])
+        stats['default_languages'] = list(self.default_languages)
+        stats['max_readers'] = self.max_readers
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+def get_easyocr_reader(languages=None):
+    """The (lazily loaded) EasyOCR reader for `languages`, by default EASYOCR_LANGUAGES"""
+    return _easyocr_engine.readers.get(languages)
+
+# ============================================================
+# EasyOCR on ONNX Runtime
+# ============================================================
+
+class OnnxModule:
+    """Stands in for one of EasyOCR's torch networks, running an ONNX Runtime session instead.
+
+    EasyOCR calls its networks with torch tensors and post-processes torch
+    tensors, so inputs are handed over as NumPy arrays (without copying)
+    and outputs wrapped back into tensors. Extra positional inputs beyond
+    the graph's (the recognizer's unused text argument) are ignored.
+    """
+
+    def __init__(self, path):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EASYOCR_ONNX_THREADS:
+            options.intra_op_num_threads = EASYOCR_ONNX_THREADS
+        self.path = path
+        self.weight_bytes = os.path.getsize(path)
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self._input_names = [graph_input.name for graph_input in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, *inputs):
+        torch = _import_torch()
+        feeds = {name: value.detach().cpu().numpy() for name, value in zip(self._input_names, inputs)}
+        outputs = [torch.from_numpy(output) for output in self.session.run(None, feeds)]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+def _export_onnx(module, sample, path, input_names, output_names, dynamic_axes):
+    """Export `module` to `path` unless it's already there (written atomically, so concurrent loads are safe)"""
+    if os.path.exists(path):
+        return
+    torch = _import_torch()
+    log.info(f"📦 Exporting {os.path.basename(path)} to ONNX (first use only)...")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    options = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        options['dynamo'] = False  # The TorchScript exporter handles EasyOCR's LSTMs with dynamic widths
+    try:
+        with torch.no_grad():
+            torch.onnx.export(module, sample, temp_path, input_names=input_names, output_names=output_names,
+                              dynamic_axes=dynamic_axes, opset_version=17, **options)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _onnx_recognizer_graph(recognizer):
+    """Wrap EasyOCR's recognizer so it exports as image -> logits.
+
+    The visual features are pooled with AdaptiveAvgPool2d((None, 1)), which
+    the ONNX exporter can't handle for variable-width inputs; it is the mean
+    over the last axis, so it is exported as exactly that.
+    """
+    torch = _import_torch()
+
+    class MeanOverLastAxis(torch.nn.Module):
+        def forward(self, x):
+            return x.mean(dim=3, keepdim=True)
+
+    class RecognizerGraph(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, image):
+            return self.model(image, None)
+
+    for name, child in list(recognizer.named_modules()):
+        if isinstance(child, torch.nn.AdaptiveAvgPool2d) and tuple(child.output_size) == (None, 1):
+            parent_name, _, attribute = name.rpartition('.')
+            setattr(recognizer.get_submodule(parent_name), attribute, MeanOverLastAxis())
+    return RecognizerGraph(recognizer).eval()
+
+def _easyocr_to_onnx(reader):
+    """Swap a CPU reader's detector and recognizer for ONNX Runtime sessions.
+
+    The graphs are exported on first use into EASYOCR_ONNX_DIR (per EasyOCR
+    version, detector and recognition model) and reused from there. If
+    anything fails the reader keeps its torch networks.
+    """
+    torch = _import_torch()
+    import easyocr
+    directory = os.path.join(EASYOCR_ONNX_DIR, easyocr.__version__)
+    try:
+        if not isinstance(reader.detector, OnnxModule):
+            if reader.detect_network != 'craft':
+                raise RuntimeError(f"no ONNX export for the {reader.detect_network} detector")
+            path = os.path.join(directory, 'detector_craft.onnx')
+            _export_onnx(reader.detector.eval(), (torch.randn(1, 3, 320, 320),), path, ['image'], ['scores', 'feature'],
+                         {'image': {0: 'batch', 2: 'height', 3: 'width'},
+                          'scores': {0: 'batch', 1: 'score_height', 2: 'score_width'},
+                          'feature': {0: 'batch', 2: 'feature_height', 3: 'feature_width'}})
+            reader.detector = OnnxModule(path)
+
+        # The network (and so the graph) depends on the recognition model only, not the language set
+        path = os.path.join(directory, f"recognizer_{reader.model_lang}_{len(reader.character)}.onnx")
+        if not os.path.exists(path):
+            _export_onnx(_onnx_recognizer_graph(reader.recognizer.eval()), (torch.randn(1, 1, 64, 256),), path,
+                         ['image'], ['logits'], {'image': {0: 'batch', 3: 'width'}, 'logits': {0: 'batch', 1: 'steps'}})
+        reader.recognizer = OnnxModule(path)
+    except ImportError as e:
+        log.warning(f"⚠️  ONNX Runtime is not available ({e}); EasyOCR stays on PyTorch. "
+                    f"Install it with: pip install onnxruntime onnx")
     except Exception as e:
-        print(f"❌ OCR Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise Exception(f"OCR processing failed: {str(e)}")
+        log.warning(f"⚠️  Could not move EasyOCR to ONNX Runtime, it stays on PyTorch: {e}")
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# ============================================================
+# Image handoff (PyMuPDF / PIL / NumPy without re-encoding)
+# ============================================================
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+class _PixmapSamples:
+    """Expose a fitz.Pixmap sample buffer through the NumPy array interface.
 
-@app.route('/api/ocr', methods=['POST'])
-def ocr_scan():
+    The resulting array points straight at MuPDF's memory and keeps the
+    pixmap alive for as long as the array (or any view of it) exists.
+    """
+
+    def __init__(self, pix):
+        self._pix = pix
+        self.__array_interface__ = {
+            'version': 3,
+            'shape': (pix.height, pix.width, pix.n),
+            'typestr': '|u1',
+            'strides': (pix.stride, pix.n, 1),
+            'data': (pix.samples_ptr, True),
+        }
+
+def pixmap_to_array(pix):
+    """Wrap an RGB fitz.Pixmap as a read-only (H, W, 3) uint8 array, zero-copy"""
+    import numpy as np
+    return np.asarray(_PixmapSamples(pix))
+
+def samples_to_array(samples, width, height, n, stride):
+    """View raw pixmap samples (e.g. returned by a raster worker) as an (H, W, n) array, zero-copy"""
+    import numpy as np
+    flat = np.frombuffer(samples, dtype=np.uint8)
+    return np.lib.stride_tricks.as_strided(
+        flat, shape=(height, width, n), strides=(stride, n, 1), writeable=False
+    )
+
+def as_image_array(image):
+    """Return an (H, W, 3) uint8 array for EasyOCR, without copying arrays we already have"""
+    import numpy as np
+    if isinstance(image, np.ndarray):
+        return image
+    return np.asarray(image)
+
+def as_pil_image(image):
+    """Return a PIL RGB image (PIL stores RGB padded to 4 bytes, so arrays are copied once here)"""
+    if isinstance(image, Image.Image):
+        return image
+    return Image.fromarray(image, 'RGB')
+
+# DeepSeek-OCR's remote code only accepts an image *path* and opens it with
+# PIL inside infer(). Images registered here are handed to its loader directly.
+_in_memory_images = {}
+_in_memory_images_lock = threading.Lock()
+_in_memory_loader_installed = False
+_deepseek_scratch_dir = None
+
+def _install_in_memory_image_loader(model):
+    """Wrap the model module's load_pil_images() so it can resolve in-memory images"""
+    global _in_memory_loader_installed
+
+    if _in_memory_loader_installed:
+        return True
+
+    model_module = sys.modules.get(type(model).__module__)
+    original_loader = getattr(model_module, 'load_pil_images', None)
+    if original_loader is None:
+        return False
+
+    def load_pil_images(conversations):
+        with _in_memory_images_lock:
+            refs = [ref for message in conversations for ref in message.get("images", [])]
+            if refs and all(ref in _in_memory_images for ref in refs):
+                return [_in_memory_images[ref] for ref in refs]
+        return original_loader(conversations)
+
+    model_module.load_pil_images = load_pil_images
+    _in_memory_loader_installed = True
+    log.info("✓ DeepSeek-OCR in-memory image loader installed (no temp files)")
+    return True
+
+@contextmanager
+def deepseek_image_input(model, image):
+    """Yield (image_file, output_path) arguments for model.infer().
+
+    Uses the in-memory loader when available and only falls back to writing a
+    PNG into a temporary directory for model revisions it cannot hook.
+    """
+    global _deepseek_scratch_dir
+
+    if _deepseek_scratch_dir is None:
+        import tempfile
+        _deepseek_scratch_dir = tempfile.mkdtemp(prefix='ocrweb-deepseek-')
+
+    with stage_timer('pil_convert'):
+        pil_image = as_pil_image(image)
+
+    if _install_in_memory_image_loader(model):
+        image_ref = f"memory://{uuid.uuid4().hex}.png"
+        with _in_memory_images_lock:
+            _in_memory_images[image_ref] = pil_image
+        try:
+            yield image_ref, _deepseek_scratch_dir
+        finally:
+            with _in_memory_images_lock:
+                _in_memory_images.pop(image_ref, None)
+        return
+
+    import tempfile
+    import shutil
+    temp_dir = tempfile.mkdtemp()
+    temp_image_path = os.path.join(temp_dir, 'input_image.png')
+    with stage_timer('temp_file_write'):
+        pil_image.save(temp_image_path, 'PNG')
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'File type not allowed. Please upload an image or PDF file.'}), 400
-        
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        print(f"\n📁 Processing file: {filename}")
-        
+        yield temp_image_path, temp_dir
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+# ============================================================
+# Image preparation (margin crop, engine-sized resolution)
+# ============================================================
+
+# Longest image side each engine can make use of
+ENGINE_MAX_IMAGE_SIDE = {
+    # crop_mode tiles the page into image_size crops, at most three per side
+    # (plus a base_size global view); anything larger is resized away
+    'deepseek': DEEPSEEK_INFER_PARAMS['image_size'] * 3 if DEEPSEEK_INFER_PARAMS['crop_mode']
+                else DEEPSEEK_INFER_PARAMS['base_size'],
+    # EasyOCR's detector shrinks images to its canvas_size (2560) anyway
+    'easyocr': 2560,
+}
+MARGIN_CROP_PADDING = 16  # Pixels of background kept around the content
+PDF_CONTENT_PADDING = 6  # Points of page kept around the content when clipping a render
+
+def active_engine():
+    """The engine most pages are read by right now (sizes PDF renders)"""
+    if OCR_ROUTING == 'deepseek' and _deepseek_breaker.state == 'closed':
+        return 'deepseek'
+    return 'easyocr'
+
+def engine_max_side(engine):
+    return OCR_MAX_IMAGE_SIDE or ENGINE_MAX_IMAGE_SIDE[engine]
+
+def client_max_image_side():
+    """Longest image side worth uploading, for browsers preparing images (0 = send images as they are).
+
+    A page may end up with either engine (DeepSeek-OCR falls back to
+    EasyOCR, the cascade uses both), so this is the larger of their sizes.
+    With LAYOUT_MODE on each block is sized on its own, so a page has no
+    useful limit; with IMAGE_PREP off nothing is downscaled server-side either.
+    """
+    if not (CLIENT_IMAGE_PREP and IMAGE_PREP) or LAYOUT_MODE != 'off':
+        return 0
+    engines = ('easyocr',) if OCR_ROUTING == 'easyocr' else tuple(ENGINE_MAX_IMAGE_SIDE)
+    return max(engine_max_side(engine) for engine in engines)
+
+def find_content_box(array):
+    """Return (top, bottom, left, right) around the non-background pixels, or None for a blank image.
+
+    Works on a subsampled darkest-channel view, so the cost stays small even
+    for large photos; background is estimated from the image itself, so
+    off-white scans and sensor noise are not mistaken for content.
+    """
+    import numpy as np
+
+    height, width = array.shape[:2]
+    step = max(1, max(height, width) // 1024)
+    gray = array[::step, ::step].min(axis=2)
+    background = np.percentile(gray, 90)
+    ink = gray < background - 48
+    rows = np.flatnonzero(ink.mean(axis=1) > 0.002)
+    cols = np.flatnonzero(ink.mean(axis=0) > 0.002)
+    if rows.size == 0 or cols.size == 0:
+        return None
+    pad = MARGIN_CROP_PADDING
+    return (max(0, rows[0] * step - pad), min(height, (rows[-1] + 1) * step + pad),
+            max(0, cols[0] * step - pad), min(width, (cols[-1] + 1) * step + pad))
+
+def prepare_image(image, engine):
+    """Crop empty margins and downscale `image` to what `engine` can use.
+
+    Returns an (H, W, 3) uint8 array. Cropping is a view of the input;
+    only downscaling allocates a new image. Nothing is ever upscaled.
+    """
+    array = as_image_array(image)
+    height, width = array.shape[:2]
+    PIXELS_TOTAL.inc(height * width, engine=engine, stage='input')
+    if not IMAGE_PREP:
+        PIXELS_TOTAL.inc(height * width, engine=engine, stage='prepared')
+        return array
+
+    box = find_content_box(array)
+    if box is not None:
+        top, bottom, left, right = box
+        # Not worth a smaller view for a sliver of margin
+        if (bottom - top) * (right - left) < 0.95 * height * width:
+            array = array[top:bottom, left:right]
+            height, width = array.shape[:2]
+
+    max_side = engine_max_side(engine)
+    if max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        import numpy as np
+        array = np.asarray(Image.fromarray(np.ascontiguousarray(array), 'RGB')
+                           .resize(size, Image.BILINEAR, reducing_gap=2.0))
+        height, width = array.shape[:2]
+
+    PIXELS_TOTAL.inc(height * width, engine=engine, stage='prepared')
+    return array
+
+def _raw_layout(image):
+    """(strips, rawmode, stride, orientation) of an uncompressed image, else None.
+
+    `strips` lists (top, bottom, offset) for each run of rows stored together:
+    one for BMP/PPM and single-strip TIFFs, one per strip for multi-strip
+    TIFFs (libtiff's default), which must be full-width and cover the image
+    top to bottom.
+    """
+    if not image.tile or image.mode not in ('RGB', 'RGBA', 'RGBX', 'CMYK', 'L'):
+        return None
+    strips = []
+    layout_args = None
+    for codec, extents, offset, args in image.tile:
+        args = (args,) if isinstance(args, str) else tuple(args)
+        left, top, right, bottom = extents
+        expected_top = strips[-1][1] if strips else 0
+        if codec != 'raw' or (left, right, top) != (0, image.width, expected_top) or bottom <= top:
+            return None
+        if layout_args is None:
+            layout_args = args
+        elif args != layout_args:
+            return None
+        strips.append((top, bottom, offset))
+    if strips[-1][1] != image.height:
+        return None
+    rawmode = layout_args[0]
+    stride = layout_args[1] if len(layout_args) > 1 else 0
+    orientation = layout_args[2] if len(layout_args) > 2 else 1
+    if orientation < 0 and len(strips) > 1:
+        return None
+    if not stride:
         try:
-            if filepath.lower().endswith('.pdf'):
-                pdf_document = fitz.open(filepath)
-                all_text = []
-                
-                print(f"📄 PDF with {len(pdf_document)} page(s)")
-                
-                for page_num in range(len(pdf_document)):
-                    print(f"\n--- Page {page_num + 1}/{len(pdf_document)} ---")
-                    
-                    page = pdf_document[page_num]
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                    img_data = pix.tobytes("png")
-                    
-                    from io import BytesIO
-                    image = Image.open(BytesIO(img_data)).convert('RGB')
-                    
-                    page_text = extract_text_from_image(image)
-                    all_text.append(f"--- Page {page_num + 1} ---\n{page_text}")
-                
-                pdf_document.close()
-                extracted_text = "\n\n".join(all_text)
+            stride = len(Image.new(image.mode, (image.width, 1)).tobytes('raw', rawmode))
+        except (ValueError, SystemError):
+            return None  # A rawmode Pillow can only unpack
+    return strips, rawmode, stride, orientation
+
+def _read_raw_rows(image, layout, top, bottom):
+    """The stored bytes of rows top..bottom, gathered from the strips holding them"""
+    strips, _, stride, orientation = layout
+    chunks = []
+    for strip_top, strip_bottom, offset in strips:
+        start, end = max(top, strip_top), min(bottom, strip_bottom)
+        if start >= end:
+            continue
+        # Bottom-up images (BMP) store the last row first
+        row = start - strip_top if orientation > 0 else strip_bottom - end
+        image.fp.seek(offset + row * stride)
+        data = image.fp.read((end - start) * stride)
+        if len(data) < (end - start) * stride:
+            raise ValueError("Image file is truncated")
+        chunks.append(data)
+    return b''.join(chunks)
+
+def _decode_raw_in_bands(image, layout, factor):
+    """Read an uncompressed image a band of rows at a time, reducing each band by `factor` into the result"""
+    _, rawmode, stride, orientation = layout
+    width, height = image.size
+    result = Image.new('RGB', (math.ceil(width / factor), math.ceil(height / factor)))
+    # A multiple of `factor` rows per band, so bands reduce without seams
+    rows = max(1, IMAGE_DECODE_BAND_PIXELS // (width * factor)) * factor
+    for top in range(0, height, rows):
+        bottom = min(height, top + rows)
+        data = _read_raw_rows(image, layout, top, bottom)
+        band = Image.frombytes(image.mode, (width, bottom - top), data, 'raw', rawmode, stride, orientation)
+        result.paste(band.convert('RGB').reduce(factor), (0, top // factor))
+    return result
+
+def decode_image(image):
+    """Decode an opened PIL image to RGB within IMAGE_DECODE_MAX_MPX.
+
+    Images within the budget are decoded as they are. Larger ones are reduced
+    by the smallest integer factor that fits while they are decoded: JPEGs
+    through draft mode, uncompressed images band by band. Other formats that
+    large raise ValueError instead of being decoded whole.
+    """
+    budget = IMAGE_DECODE_MAX_MPX * 1e6
+    width, height = image.size
+    if width * height <= budget:
+        return image.convert('RGB')
+
+    factor = math.ceil(math.sqrt(width * height / budget))
+    if image.format in ('JPEG', 'MPO'):
+        # The decoder can only scale by 1/2, 1/4 or 1/8; draft() picks the
+        # largest of those that still gives at least the requested size
+        scale = next((scale for scale in (2, 4, 8) if scale >= factor), 8)
+        image.draft('RGB', (max(1, width // scale), max(1, height // scale)))
+        if image.size[0] * image.size[1] <= budget:
+            log.debug(f"🖼️  Decoded {width}x{height} JPEG at 1/{scale} scale")
+            return image.convert('RGB')
+    else:
+        layout = _raw_layout(image)
+        if layout is not None:
+            log.debug(f"🖼️  Decoded {width}x{height} {image.format} in bands at 1/{factor} scale")
+            return _decode_raw_in_bands(image, layout, factor)
+    raise ValueError(
+        f"Image is too large to decode ({width}x{height}, {width * height / 1e6:.0f} MP over the "
+        f"{IMAGE_DECODE_MAX_MPX:g} MP limit); save it as JPEG or uncompressed TIFF, or raise IMAGE_DECODE_MAX_MPX"
+    )
+
+def _zoom_within_budget(area, zoom):
+    """Lower `zoom` so that rendering `area` stays within IMAGE_DECODE_MAX_MPX"""
+    pixels = area.width * area.height * zoom * zoom
+    budget = IMAGE_DECODE_MAX_MPX * 1e6
+    return zoom * math.sqrt(budget / pixels) if pixels > budget else zoom
+
+def pdf_content_rect(page):
+    """Page area that has any drawing, text or image on it (the whole page if unknown)"""
+    import fitz
+    try:
+        boxes = page.get_bboxlog()
+    except (AttributeError, RuntimeError):
+        return page.rect
+    content = None
+    for kind, box in boxes:
+        if not kind.startswith('ignore'):
+            content = fitz.Rect(box) if content is None else content | box
+    if content is None:
+        return page.rect
+    content = (content + (-PDF_CONTENT_PADDING, -PDF_CONTENT_PADDING,
+                          PDF_CONTENT_PADDING, PDF_CONTENT_PADDING)) & page.rect
+    return page.rect if content.is_empty else content
+
+def _scan_resolution_zoom(page):
+    """Zoom at which a scanned page (one image covering most of it) renders at the scan's own resolution"""
+    import fitz
+    page_area = page.rect.width * page.rect.height
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info['bbox'])
+        if bbox.width and bbox.height and bbox.width * bbox.height >= 0.8 * page_area:
+            return max(info['width'] / bbox.width, info['height'] / bbox.height)
+    return None
+
+def render_pdf_page(page, engine, clip=None):
+    """Rasterize one PDF page (or just the `clip` region of it) for OCR by `engine`.
+
+    Returns (pixmap, pixels the same area would have had at the fixed
+    PDF_RENDER_ZOOM, the (x0, y0, x1, y1) page area in points the pixmap shows).
+    """
+    import fitz
+    area = page.rect if clip is None else fitz.Rect(clip) & page.rect
+    fixed_zoom_pixels = round(area.width * PDF_RENDER_ZOOM) * round(area.height * PDF_RENDER_ZOOM)
+    if not IMAGE_PREP:
+        zoom = _zoom_within_budget(area, PDF_RENDER_ZOOM)
+        matrix = fitz.Matrix(zoom, zoom)
+        pix = page.get_pixmap(matrix=matrix, clip=clip, colorspace=fitz.csRGB, alpha=False)
+        return pix, fixed_zoom_pixels, tuple(area)
+
+    clip = pdf_content_rect(page) if clip is None else area
+    zoom = engine_max_side(engine) / max(clip.width, clip.height)
+    # Rendering a scan above its own resolution only adds interpolated pixels
+    scan_zoom = _scan_resolution_zoom(page)
+    if scan_zoom:
+        zoom = min(zoom, scan_zoom)
+    zoom = _zoom_within_budget(clip, min(PDF_MAX_RENDER_ZOOM, max(PDF_MIN_RENDER_ZOOM, zoom)))
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, colorspace=fitz.csRGB, alpha=False)
+    return pix, fixed_zoom_pixels, tuple(clip)
+
+# ============================================================
+# Micro-batching inference scheduler
+# ============================================================
+
+class MicroBatcher:
+    """Gather concurrent OCR calls into batches run by one inference thread.
+
+    submit() returns a Future. The worker thread takes the first waiting item,
+    keeps collecting until it has max_batch_size items or max_wait_ms has
+    passed, then hands the whole batch to run_batch(images, listeners), which
+    must return one result (or Exception instance) per image in the same
+    order. listeners[i] is the on_text callback given to submit() for
+    images[i] (or None); engines that stream their output call it with the
+    text decoded so far.
+    """
+
+    def __init__(self, name, run_batch, max_batch_size=BATCH_MAX_SIZE,
+                 max_wait_ms=BATCH_MAX_WAIT_MS, max_queue=BATCH_MAX_QUEUE):
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._run_batch = run_batch
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'items': 0,
+            'errors': 0,
+            'last_batch_size': 0,
+            'max_batch_size_seen': 0,
+            'batch_size_counts': {},
+            'total_batch_ms': 0.0,
+            'max_batch_ms': 0.0,
+            'last_batch_ms': 0.0,
+            'total_wait_ms': 0.0,
+        }
+
+    def submit(self, image, on_text=None):
+        """Queue an image for the next batch; raises queue.Full when saturated"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put_nowait((image, on_text, future, time.monotonic()))
+        return future
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._worker, name=f"ocr-batcher-{self.name}", daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            images = [image for image, _, _, _ in batch]
+            listeners = [on_text for _, on_text, _, _ in batch]
+
+            try:
+                results = self._run_batch(images, listeners)
+            except Exception as e:
+                results = [e] * len(batch)
             else:
-                image = Image.open(filepath).convert('RGB')
-                extracted_text = extract_text_from_image(image)
-            
-            if not extracted_text or not extracted_text.strip():
-                extracted_text = "No text could be extracted from the file."
-                
-        except Exception as ocr_error:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            return jsonify({'error': f'OCR extraction failed: {str(ocr_error)}'}), 500
-        
-        os.remove(filepath)
+                if len(results) != len(batch):
+                    # Never leave a caller waiting on a future nobody resolves
+                    mismatch = RuntimeError(
+                        f"{self.name} batch returned {len(results)} result(s) for {len(batch)} item(s)"
+                    )
+                    log.error(f"❌ {mismatch}")
+                    results = [mismatch] * len(batch)
+
+            elapsed_ms = (time.monotonic() - started) * 1000.0
+            errors = 0
+            for (_, _, future, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    errors += 1
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            with self._lock:
+                stats = self._stats
+                size = len(batch)
+                stats['batches'] += 1
+                stats['items'] += size
+                stats['errors'] += errors
+                stats['last_batch_size'] = size
+                stats['max_batch_size_seen'] = max(stats['max_batch_size_seen'], size)
+                stats['batch_size_counts'][size] = stats['batch_size_counts'].get(size, 0) + 1
+                stats['total_batch_ms'] += elapsed_ms
+                stats['max_batch_ms'] = max(stats['max_batch_ms'], elapsed_ms)
+                stats['last_batch_ms'] = elapsed_ms
+                stats['total_wait_ms'] += sum((started - queued) * 1000.0 for _, _, _, queued in batch)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['batch_size_counts'] = dict(stats['batch_size_counts'])
+        batches = stats['batches'] or 1
+        items = stats['items'] or 1
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'batches': stats['batches'],
+            'items': stats['items'],
+            'errors': stats['errors'],
+            'avg_batch_size': round(stats['items'] / batches, 2),
+            'last_batch_size': stats['last_batch_size'],
+            'max_batch_size_seen': stats['max_batch_size_seen'],
+            'batch_size_counts': stats['batch_size_counts'],
+            'avg_batch_ms': round(stats['total_batch_ms'] / batches, 1),
+            'last_batch_ms': round(stats['last_batch_ms'], 1),
+            'max_batch_ms': round(stats['max_batch_ms'], 1),
+            'avg_queue_wait_ms': round(stats['total_wait_ms'] / items, 1),
+        }
+
+class DecodeStopped(Exception):
+    """Raised from DecodeMonitor.put() to end generate() early"""
+
+    def __init__(self, reason):
+        super().__init__(f"decode stopped ({reason})")
+        self.reason = reason
+
+def degenerate_tail(token_ids, window, n=8):
+    """Index where the last `window` tokens start looping, or None while they still read like text.
+
+    The tail counts as a loop when over 90% of its n-grams already occurred
+    earlier in it. The index is the start of the loop's second time round,
+    so cutting there keeps one copy of the repeated phrase.
+    """
+    if len(token_ids) < window:
+        return None
+    tail = token_ids[-window:]
+    seen = set()
+    repeats = 0
+    first_repeat = None
+    for index in range(len(tail) - n + 1):
+        gram = tuple(tail[index:index + n])
+        if gram in seen:
+            repeats += 1
+            if first_repeat is None:
+                first_repeat = index
+        else:
+            seen.add(gram)
+    if repeats < 0.9 * (len(tail) - n + 1):
+        return None
+    return len(token_ids) - window + first_repeat
+
+class DecodeMonitor:
+    """Streamer handed to generate() for one image.
+
+    Collects the generated tokens, reports the text so far to `on_text`
+    (at most every DEEPSEEK_STREAM_INTERVAL_SECONDS) and raises
+    DecodeStopped once the time budget is spent or the output loops.
+    """
+
+    def __init__(self, tokenizer, on_text=None):
+        self.tokenizer = tokenizer
+        self.on_text = on_text
+        self.token_ids = []
+        self.stop_reason = None
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.last_token_at = None
+        self._prompt_seen = False
+        self._last_report = 0.0
+
+    def put(self, value):
+        if not self._prompt_seen:
+            # generate() hands the streamer the prompt first
+            self._prompt_seen = True
+            return
+        now = time.monotonic()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.last_token_at = now
+        self.token_ids.extend(int(token) for token in value.reshape(-1).tolist())
         
-        return jsonify({
-            'success': True,
-            'text': extracted_text,
-            'filename': filename
-        })
+        if DEEPSEEK_MAX_DECODE_SECONDS > 0 and now - self.started > DEEPSEEK_MAX_DECODE_SECONDS:
+            self._stop('time_budget')
+        if DEEPSEEK_REPETITION_WINDOW and len(self.token_ids) % 16 == 0:
+            cut = degenerate_tail(self.token_ids, DEEPSEEK_REPETITION_WINDOW)
+            if cut is not None:
+                del self.token_ids[cut:]
+                self._stop('repetition')
+        if self.on_text is not None and now - self._last_report >= DEEPSEEK_STREAM_INTERVAL_SECONDS:
+            self._last_report = now
+            self._report()
+
+    def end(self):
+        if self.stop_reason is None:
+            self.stop_reason = 'max_tokens' if len(self.token_ids) >= DEEPSEEK_MAX_NEW_TOKENS else 'eos'
+
+    def _stop(self, reason):
+        self.stop_reason = reason
+        raise DecodeStopped(reason)
+
+    def _report(self):
+        try:
+            self.on_text(self.text())
+        except Exception as e:
+            log.debug(f"on_text listener failed: {e}")
+
+    def text(self):
+        return self.tokenizer.decode(self.token_ids, skip_special_tokens=True).strip()
+
+    def stats(self):
+        """{'tokens', 'seconds', 'stop'} for this decode; seconds run from the first generated token"""
+        seconds = 0.0
+        if self.first_token_at is not None:
+            seconds = self.last_token_at - self.first_token_at
+        return {'tokens': len(self.token_ids), 'seconds': round(seconds, 3), 'stop': self.stop_reason or 'eos'}
+
+_decode_state = threading.local()  # .monitor: the DecodeMonitor of the decode running on this thread
+
+def _install_decode_hook(model):
+    """Wrap model.generate() so infer()'s decode uses the current thread's DecodeMonitor and token budget"""
+    if getattr(model, '_ocrweb_decode_hook', False):
+        return
+    original_generate = model.generate
+
+    def generate(*args, **kwargs):
+        monitor = getattr(_decode_state, 'monitor', None)
+        if monitor is not None:
+            # Replaces the remote code's own streamer, which prints every token to stdout
+            kwargs['streamer'] = monitor
+            kwargs['max_new_tokens'] = min(kwargs.get('max_new_tokens') or DEEPSEEK_MAX_NEW_TOKENS,
+                                           DEEPSEEK_MAX_NEW_TOKENS)
+        return original_generate(*args, **kwargs)
+
+    model.generate = generate
+    model._ocrweb_decode_hook = True
+
+def _record_decode(stats):
+    """Count a finished decode in the metrics (also for decodes that ran in a worker process)"""
+    DECODE_TOKENS_TOTAL.inc(stats['tokens'], stop=stats['stop'])
+    if stats['seconds'] > 0:
+        DECODE_TOKENS_PER_SECOND.observe(stats['tokens'] / stats['seconds'])
+    if stats['stop'] != 'eos':
+        log.warning(f"⚠️  DeepSeek-OCR decode stopped early ({stats['stop']}) after {stats['tokens']} token(s)")
+
+def _deepseek_infer(model, tokenizer, image, on_text=None):
+    """Run DeepSeek-OCR on a single image; returns (cleaned-up text, decode stats).
+
+    The text decoded so far goes to `on_text` while the model runs. A decode
+    stopped by its time budget or a repetition loop keeps the text up to there.
+    """
+    _install_decode_hook(model)
+    monitor = DecodeMonitor(tokenizer, on_text)
+    with deepseek_image_input(model, image) as (image_file, output_path):
+        log.debug("📝 Processing image with DeepSeek-OCR...")
+        log.debug(f"⚙️  Using: {', '.join(f'{k}={v}' for k, v in DEEPSEEK_INFER_PARAMS.items())}")
+        
+        # Use DeepSeek-OCR's custom infer method
+        _decode_state.monitor = monitor
+        try:
+            with stage_timer('deepseek_infer'), _inference_autocast():
+                result = model.infer(
+                    tokenizer=tokenizer,
+                    prompt=DEEPSEEK_PROMPT,
+                    image_file=image_file,
+                    output_path=output_path,
+                    save_results=False,
+                    test_compress=False,
+                    **DEEPSEEK_INFER_PARAMS
+                )
+        except DecodeStopped:
+            result = None
+        finally:
+            _decode_state.monitor = None
+    monitor.end()
+    
+    # Clean up result; infer() only returns text in some revisions, the
+    # monitor always has the generated tokens. An image without text gives ''
+    # (join_page_sections() reports a document with no text at all)
+    text = (result or monitor.text() or '').strip()
+    if text.startswith("Extract all text from this image."):
+        text = text.replace("Extract all text from this image.", "").strip()
+    return text, monitor.stats()
+
+def _easyocr_result(detections):
+    """Turn readtext(detail=1) output into (text, confidence).
+
+    The text is grouped into paragraphs exactly as paragraph=True would; the
+    confidence is the character-weighted mean over the detected lines, so a
+    confidently read stray mark can't outweigh a garbled paragraph.
+    """
+    from easyocr.utils import get_paragraph
+    if not detections:
+        return '', 0.0
+    text = '\n'.join(paragraph for _, paragraph in get_paragraph(detections)).strip()
+    chars = sum(len(line) for _, line, _ in detections)
+    confidence = sum(len(line) * score for _, line, score in detections) / chars if chars else 0.0
+    return text, float(confidence)
+
+# ============================================================
+# DeepSeek-OCR worker pool (shared memory-mapped weights)
+# ============================================================
+
+def _shared_weights_path():
+    return os.path.join(WEIGHTS_CACHE_DIR, "deepseek-ocr-fp32.pt")
+
+def _export_shared_weights(weights_path):
+    """Load DeepSeek-OCR as float32 on CPU and save every tensor for memory-mapping.
+
+    Runs in a short-lived helper process so the supervisor never keeps a copy
+    of the model.
+    """
+    global CPU_PRECISION
+    
+    CPU_PRECISION = 'fp32'  # Workers apply CPU_PRECISION themselves after mapping
+    torch = _import_torch()
+    model, tokenizer = get_deepseek_model()
+    if model is None or tokenizer is None:
+        raise RuntimeError("DeepSeek-OCR failed to load")
+    
+    # remove_duplicate=False keeps every name of tied weights; torch.save
+    # stores shared storages once
+    tensors = {name: param.detach().cpu() for name, param in model.named_parameters(remove_duplicate=False)}
+    tensors.update({name: buffer.cpu() for name, buffer in model.named_buffers(remove_duplicate=False)})
+    
+    os.makedirs(os.path.dirname(weights_path), exist_ok=True)
+    temp_path = f"{weights_path}.{os.getpid()}.tmp"
+    torch.save(tensors, temp_path)
+    os.replace(temp_path, weights_path)
+    log.info(f"✓ Shared weights written to {weights_path}")
+
+def ensure_shared_weights():
+    """Export the memory-mappable weights file once (no-op when it already exists)"""
+    weights_path = _shared_weights_path()
+    if os.path.exists(weights_path):
+        return weights_path
+    
+    import multiprocessing
+    log.info(f"⚙️  Exporting DeepSeek-OCR weights for the worker pool to {weights_path}...")
+    export_start = time.time()
+    process = multiprocessing.get_context('spawn').Process(
+        target=_export_shared_weights, args=(weights_path,), name='ocr-weights-export'
+    )
+    process.start()
+    process.join()
+    if process.exitcode != 0 or not os.path.exists(weights_path):
+        raise RuntimeError(f"weights export failed (exit code {process.exitcode})")
+    log.info(f"✓ Weights exported ({time.time() - export_start:.1f}s)")
+    return weights_path
+
+def _assign_shared_tensors(model, tensors):
+    """Point every parameter and buffer of a meta-device model at the mapped tensors"""
+    torch = _import_torch()
+    for module_name, module in model.named_modules(remove_duplicate=False):
+        prefix = f"{module_name}." if module_name else ""
+        for name, param in list(module._parameters.items()):
+            if param is not None and prefix + name in tensors:
+                module._parameters[name] = torch.nn.Parameter(tensors[prefix + name], requires_grad=False)
+        for name, buffer in list(module._buffers.items()):
+            if buffer is not None and prefix + name in tensors:
+                module._buffers[name] = tensors[prefix + name]
+
+def _load_mapped_model(weights_path):
+    """Build DeepSeek-OCR around memory-mapped weights (runs in each worker process)"""
+    torch = _import_torch()
+    _import_transformers()
+    from transformers import AutoConfig, AutoModel, AutoTokenizer
+    
+    _install_flash_attention_shim()
+    tokenizer = AutoTokenizer.from_pretrained(DEEPSEEK_MODEL_NAME, trust_remote_code=True)
+    config = AutoConfig.from_pretrained(DEEPSEEK_MODEL_NAME, trust_remote_code=True)
+    
+    # mmap=True leaves the tensors backed by the file: pages are shared
+    # read-only between all workers through the OS page cache
+    tensors = torch.load(weights_path, mmap=True, weights_only=True, map_location='cpu')
+    
+    # Build the module tree without allocating any weights
+    with torch.device('meta'):
+        model = AutoModel.from_config(config, trust_remote_code=True)
+    _assign_shared_tensors(model, tensors)
     
+    unmapped = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers())
+                if tensor.is_meta]
+    if unmapped:
+        raise RuntimeError(f"{len(unmapped)} tensor(s) missing from {weights_path}, e.g. {unmapped[0]}")
+    
+    model.eval()
+    model = _apply_cpu_precision(model)
+    return model, tokenizer
+
+def _inference_worker_main(worker_id, weights_path, num_threads, task_queue, result_queue):
+    """Entry point of a DeepSeek-OCR worker process"""
+    _import_torch().set_num_threads(num_threads)
+    try:
+        model, tokenizer = _load_mapped_model(weights_path)
+    except Exception as e:
+        result_queue.put(('failed', worker_id, str(e)))
+        return
+    result_queue.put(('ready', worker_id, None))
+    
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, image, stream = task
+        on_text = (lambda text, task_id=task_id: result_queue.put(('partial', task_id, text))) if stream else None
+        try:
+            result_queue.put(('result', task_id, _deepseek_infer(model, tokenizer, image, on_text)))
+        except Exception as e:
+            result_queue.put(('error', task_id, str(e)))
+
+class DeepSeekWorkerPool:
+    """DeepSeek-OCR worker processes fed over a task queue.
+
+    Images are pickled to whichever worker is free; a collector thread routes
+    results back to the Future returned by submit(), and partial text to
+    the submit()'s on_text.
+    """
+
+    def __init__(self, size, threads_per_worker):
+        self.size = size
+        self.threads_per_worker = threads_per_worker
+        self._context = None
+        self._task_queue = None
+        self._result_queue = None
+        self._processes = []
+        self._pending = {}
+        self._listeners = {}  # task id -> on_text
+        self._lock = threading.Lock()
+        self._next_task_id = 0
+        self._broken = None
+        self._completed = 0
+        self._failed = 0
+
+    def start(self):
+        """Export weights if needed, start the workers and wait until all have loaded"""
+        import multiprocessing
+        
+        weights_path = ensure_shared_weights()
+        # spawn: forking a process that already runs Flask and torch threads is not safe
+        self._context = multiprocessing.get_context('spawn')
+        self._task_queue = self._context.Queue()
+        self._result_queue = self._context.Queue()
+        
+        log.info(f"⚙️  Starting {self.size} DeepSeek-OCR worker process(es) "
+              f"({self.threads_per_worker} thread(s) each)...")
+        start_time = time.time()
+        for worker_id in range(self.size):
+            process = self._context.Process(
+                target=_inference_worker_main,
+                args=(worker_id, weights_path, self.threads_per_worker, self._task_queue, self._result_queue),
+                name=f"ocr-worker-{worker_id}",
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        
+        ready = 0
+        while ready < self.size:
+            try:
+                kind, worker_id, error = self._result_queue.get(timeout=5.0)
+            except queue.Empty:
+                dead = [p.name for p in self._processes if not p.is_alive()]
+                if dead:
+                    self.shutdown()
+                    raise RuntimeError(f"worker process(es) exited while loading: {', '.join(dead)}")
+                continue
+            if kind == 'failed':
+                self.shutdown()
+                raise RuntimeError(f"worker {worker_id} failed to load the model: {error}")
+            ready += 1
+        log.info(f"✅ DeepSeek-OCR worker pool ready ({time.time() - start_time:.1f}s)")
+        
+        threading.Thread(target=self._collect, name='ocr-worker-results', daemon=True).start()
+
+    def submit(self, image, on_text=None):
+        """Future of (text, why the decode stopped); on_text gets the text so far while it runs"""
+        future = Future()
+        with self._lock:
+            if self._broken:
+                raise RuntimeError(self._broken)
+            task_id = self._next_task_id
+            self._next_task_id += 1
+            self._pending[task_id] = future
+            if on_text is not None:
+                self._listeners[task_id] = on_text
+        # Send a plain contiguous array; PIL images and pixmap views don't pickle cheaply
+        import numpy as np
+        self._task_queue.put((task_id, np.ascontiguousarray(as_image_array(image)), on_text is not None))
+        return future
+
+    def _collect(self):
+        while True:
+            try:
+                kind, task_id, payload = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                dead = [p.name for p in self._processes if not p.is_alive()]
+                if dead and self._broken is None:
+                    self._fail_all(f"worker process(es) died: {', '.join(dead)}")
+                    return
+                continue
+            
+            if kind == 'partial':
+                on_text = self._listeners.get(task_id)
+                if on_text is not None:
+                    try:
+                        on_text(payload)
+                    except Exception as e:
+                        log.debug(f"on_text listener failed: {e}")
+                continue
+            
+            with self._lock:
+                future = self._pending.pop(task_id, None)
+                self._listeners.pop(task_id, None)
+                if kind == 'result':
+                    self._completed += 1
+                else:
+                    self._failed += 1
+            if future is None:
+                continue
+            if kind == 'result':
+                text, stats = payload
+                _record_decode(stats)
+                future.set_result((text, stats['stop']))
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _fail_all(self, reason):
+        log.error(f"❌ DeepSeek-OCR worker pool broken: {reason}")
+        with self._lock:
+            self._broken = reason
+            pending, self._pending = self._pending, {}
+            self._listeners.clear()
+        for future in pending.values():
+            future.set_exception(RuntimeError(reason))
+
+    @property
+    def broken(self):
+        return self._broken is not None
+
+    def shutdown(self):
+        for _ in self._processes:
+            self._task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.size,
+                'alive': sum(1 for p in self._processes if p.is_alive()),
+                'threads_per_worker': self.threads_per_worker,
+                'in_flight': len(self._pending),
+                'completed': self._completed,
+                'failed': self._failed,
+                'broken': self._broken,
+            }
+
+_inference_pool = None
+_inference_pool_lock = threading.Lock()
+_inference_pool_failures = 0  # Failed pool starts; callers waiting on one that failed give up too
+
+def get_inference_pool():
+    """Start (once) and return the DeepSeek-OCR worker pool, or None if it cannot run"""
+    global _inference_pool, _inference_pool_failures
+    
+    failures = _inference_pool_failures
+    with _inference_pool_lock:
+        if _inference_pool is not None and _inference_pool.broken:
+            _inference_pool.shutdown()
+            _inference_pool = None
+        if _inference_pool is None:
+            if _inference_pool_failures != failures:
+                # The start we were waiting on failed; don't retry it back-to-back
+                return None
+            pool = DeepSeekWorkerPool(INFERENCE_WORKERS, INFERENCE_THREADS_PER_WORKER)
+            try:
+                pool.start()
+            except Exception as e:
+                log.error(f"❌ Could not start DeepSeek-OCR worker pool: {str(e)}")
+                _inference_pool_failures += 1
+                return None
+            _inference_pool = pool
+        return _inference_pool
+
+# ============================================================
+# OCR engines
+# ============================================================
+
+class OCREngine:
+    """One OCR backend as the router sees it.
+
+    An engine loads its model(s) on demand (load()), reads batches of
+    images (recognize_batch(), run by the engine's MicroBatcher) and
+    describes itself (capabilities()). Adding a runtime or model means
+    adding an engine; the routing, caching and batching around it stay
+    the same.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.batcher = MicroBatcher(self.name, self.recognize_batch)
+
+    def load(self):
+        """Load the engine if it isn't yet; True when it can take work"""
+        raise NotImplementedError
+
+    def recognize_batch(self, items, listeners):
+        """Read a batch: one result (or Exception instance) per item; see MicroBatcher"""
+        raise NotImplementedError
+
+    def warmup_item(self, image):
+        """The batch item recognize_batch() expects for a plain image"""
+        return image
+
+    def warm_up(self):
+        """Read one synthetic page through the batcher (not the result cache) so the first real page isn't slow"""
+        self.batcher.submit(self.warmup_item(_make_warmup_image())).result()
+
+    def cache_params(self, **params):
+        """Everything besides the pixels that determines this engine's output (part of the cache key)"""
+        raise NotImplementedError
+
+    def capabilities(self):
+        """What this engine can do, for /api/health: streaming, confidence, languages, runtime, ..."""
+        raise NotImplementedError
+
+class DeepSeekEngine(OCREngine):
+    """DeepSeek-OCR, in this process or in the worker pool (INFERENCE_WORKERS).
+
+    Items are images; results are (text, why the decode stopped). Text
+    is streamed to the listeners while it is decoded.
+    """
+
+    name = 'deepseek'
+
+    def __init__(self):
+        super().__init__()
+        self._model = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+        self._failed_loads = 0
+
+    def model(self):
+        """(model, tokenizer) in this process, loading them on first use; (None, None) if loading fails.
+
+        Only one thread loads the model; concurrent callers wait for it and
+        then share the result, including a failure: callers that were
+        waiting on a load that failed don't each try again. A failed load is
+        retried by the next call.
+        """
+        if self._model is None:
+            failed_loads = self._failed_loads
+            with self._lock:
+                # Another thread may have loaded, or failed to, while we waited for the lock
+                if self._model is None and self._failed_loads == failed_loads:
+                    model, tokenizer = _load_deepseek_model()
+                    if model is None or tokenizer is None:
+                        self._failed_loads += 1
+                    else:
+                        self._model, self._tokenizer = model, tokenizer
+        return self._model, self._tokenizer
+
+    def load(self):
+        """Load DeepSeek-OCR (in-process or in the worker pool) and report whether it is usable.
+
+        A failure opens the DeepSeek circuit breaker, so the (slow) load is only
+        retried once the breaker lets a trial through.
+        """
+        if INFERENCE_WORKERS > 0:
+            available = get_inference_pool() is not None
+        else:
+            model, tokenizer = self.model()
+            available = model is not None and tokenizer is not None
+        if not available:
+            _deepseek_breaker.record_failure(trip=True)
+        return available
+
+    def recognize_batch(self, images, listeners):
+        """The remote-code infer() only accepts one image, so a batch is run
+        back-to-back on the inference thread; batching still keeps the model
+        single-threaded and lets requests share warm caches instead of racing.
+        """
+        if INFERENCE_WORKERS > 0:
+            pool = get_inference_pool()
+            if pool is None:
+                return [RuntimeError("DeepSeek-OCR worker pool is not available")] * len(images)
+            # Spread the batch over the worker processes
+            futures = [pool.submit(image, on_text) for image, on_text in zip(images, listeners)]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        model, tokenizer = self.model()
+        if model is None or tokenizer is None:
+            return [RuntimeError("DeepSeek-OCR model is not available")] * len(images)
+
+        results = []
+        for image, on_text in zip(images, listeners):
+            try:
+                text, stats = _deepseek_infer(model, tokenizer, image, on_text)
+                _record_decode(stats)
+                results.append((text, stats['stop']))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def cache_params(self, **params):
+        return dict(DEEPSEEK_INFER_PARAMS, prompt=DEEPSEEK_PROMPT, cpu_precision=CPU_PRECISION,
+                    max_new_tokens=DEEPSEEK_MAX_NEW_TOKENS, repetition_window=DEEPSEEK_REPETITION_WINDOW, **params)
+
+    def capabilities(self):
+        return {
+            'streaming': True,
+            'confidence': False,
+            'languages': 'any',
+            'runtime': 'torch',
+            'precision': CPU_PRECISION,
+            'worker_processes': INFERENCE_WORKERS,
+            'loaded': self._model is not None or _inference_pool is not None,
+        }
+
+class EasyOCREngine(OCREngine):
+    """EasyOCR, with one reader per language set (EasyOCRReaderPool).
+
+    Items are (image, languages); results are (text, confidence). With
+    runtime 'onnx' the readers' networks run on ONNX Runtime.
+    """
+
+    name = 'easyocr'
+
+    def __init__(self, runtime):
+        super().__init__()
+        self.runtime = runtime
+        self.readers = EasyOCRReaderPool(
+            EASYOCR_LANGUAGES, EASYOCR_MAX_READERS, EASYOCR_READERS_MAX_BYTES,
+            load_reader=lambda languages, detector: _load_easyocr_reader(languages, detector, runtime)
+        )
+
+    def load(self):
+        self.readers.get()
+        return True
+
+    def warmup_item(self, image):
+        return image, EASYOCR_LANGUAGES
+
+    def recognize_batch(self, items, listeners):
+        """Images with identical shapes and languages go through
+        reader.readtext_batched() in one detector/recognizer pass; odd-sized
+        images fall back to readtext(). `listeners` are not called: EasyOCR has
+        no partial text to report.
+        """
+        arrays = [as_image_array(image) for image, _ in items]
+        results = [None] * len(arrays)
+
+        groups = {}
+        for index, (array, (_, languages)) in enumerate(zip(arrays, items)):
+            groups.setdefault((languages, array.shape), []).append(index)
+
+        for (languages, _), indices in groups.items():
+            try:
+                reader = self.readers.get(languages)
+                with stage_timer('easyocr_readtext'):
+                    if len(indices) > 1:
+                        batch_results = reader.readtext_batched(
+                            [arrays[i] for i in indices], detail=1, paragraph=False
+                        )
+                    else:
+                        batch_results = [reader.readtext(arrays[indices[0]], detail=1, paragraph=False)]
+                for index, detections in zip(indices, batch_results):
+                    results[index] = _easyocr_result(detections)
+            except Exception as e:
+                for index in indices:
+                    results[index] = e
+        return results
+
+    def cache_params(self, languages=None, **params):
+        cache_params = dict(EASYOCR_PARAMS, languages=list(languages or EASYOCR_LANGUAGES), **params)
+        if self.runtime != 'torch':
+            cache_params['runtime'] = self.runtime
+        return cache_params
+
+    def capabilities(self):
+        return {
+            'streaming': False,
+            'confidence': True,
+            'languages': 'per request',
+            'default_languages': list(EASYOCR_LANGUAGES),
+            'runtime': self.runtime,
+            'loaded': self.readers.loaded(),
+        }
+
+_deepseek_engine = DeepSeekEngine()
+_easyocr_engine = EasyOCREngine(EASYOCR_RUNTIME)
+_engines = {engine.name: engine for engine in (_deepseek_engine, _easyocr_engine)}
+
+def get_engine(name):
+    """The OCR engine registered as `name` ('deepseek' or 'easyocr')"""
+    return _engines[name]
+
+# ============================================================
+# OCR result cache
+# ============================================================
+
+class OCRResultCache:
+    """Content-addressed OCR result cache.
+
+    Keys are a SHA-256 over the decoded RGB pixels, the engine name and its
+    inference parameters. Recently used results stay in an in-memory LRU
+    bounded by max_bytes of text; with cache_dir set, every result is also
+    written to disk and survives restarts.
+    """
+
+    VERSION = 2  # Bump to invalidate existing entries after output changes
+
+    def __init__(self, max_bytes, cache_dir=''):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir or None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def image_digest(image):
+        """Hash the decoded pixels (arrays are hashed in place, without copying)"""
+        import numpy as np
+        array = as_image_array(image)
+        digest = hashlib.sha256()
+        digest.update(f"{array.shape}{array.dtype}".encode())
+        if array.flags.c_contiguous:
+            digest.update(memoryview(array).cast('B'))
+        else:
+            # Cropped views: hash row by row rather than copying the whole image
+            for row in array:
+                digest.update(memoryview(np.ascontiguousarray(row)).cast('B'))
+        return digest.hexdigest()
+
+    def make_key(self, digest, engine, params):
+        payload = json.dumps({'v': self.VERSION, 'engine': engine, 'params': params}, sort_keys=True)
+        return hashlib.sha256(f"{digest}:{payload}".encode()).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return text
+
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                    text = f.read()
+            except OSError:
+                text = None
+            if text is not None:
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                self._remember(key, text)
+                return text
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, key, text):
+        self._remember(key, text)
+        with self._lock:
+            self._stats['stores'] += 1
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(temp_path, path)
+            except OSError as e:
+                log.warning(f"⚠️  Could not write OCR cache entry: {e}")
+
+    def _remember(self, key, text):
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.encode('utf-8'))
+            self._entries[key] = text
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.encode('utf-8'))
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        stats['max_bytes'] = self.max_bytes
+        stats['disk_dir'] = self.cache_dir
+        return stats
+
+_ocr_cache = OCRResultCache(OCR_CACHE_MAX_BYTES, OCR_CACHE_DIR)
+
+# ============================================================
+# Engine routing (circuit breaker, confidence cascade)
+# ============================================================
+
+class CircuitBreaker:
+    """Skip a failing engine for a while instead of giving up on it for good.
+
+    closed -> open after `failure_threshold` consecutive failures (or at once
+    for trip=True); open -> half_open after the cool-down, letting exactly
+    one trial call through; half_open -> closed on success, or back to open
+    with the cool-down doubled (up to `max_reset_seconds`) on failure.
+    """
+
+    def __init__(self, name, failure_threshold, reset_seconds, max_reset_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_reset_seconds = reset_seconds
+        self.max_reset_seconds = max_reset_seconds
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.trips = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go to the engine now (claims the trial slot when half-open)"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+                log.info(f"🔄 {self.name}: trying again after {self.reset_seconds:.0f}s")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                log.info(f"✅ {self.name} recovered")
+            self.state = 'closed'
+            self._failures = 0
+            self.reset_seconds = self.base_reset_seconds
+
+    def release(self):
+        """Hand back a half-open trial that never reached the engine (e.g. a full queue)"""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+                self._opened_at = time.monotonic() - self.reset_seconds
+
+    def record_failure(self, trip=False):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open':
+                self.reset_seconds = min(self.reset_seconds * 2, self.max_reset_seconds)
+                self._open()
+            elif self.state == 'closed' and (trip or self._failures >= self.failure_threshold):
+                self._open()
+
+    def _open(self):
+        self.state = 'open'
+        self.trips += 1
+        self._opened_at = time.monotonic()
+        log.warning(f"⚠️  {self.name} disabled for {self.reset_seconds:.0f}s after {self._failures} failure(s)")
+
+    def stats(self):
+        with self._lock:
+            retry_in = None
+            if self.state == 'open':
+                retry_in = round(max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at)), 1)
+            return {'state': self.state, 'trips': self.trips, 'consecutive_failures': self._failures,
+                    'reset_seconds': self.reset_seconds, 'retry_in_seconds': retry_in}
+
+class EscalationBudget:
+    """Token bucket limiting how many images the cascade may send to the expensive engine.
+
+    Every routed image earns `rate` tokens (up to `burst`); an escalation
+    spends one, so on average at most `rate` of all images escalate.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(min(1, burst))
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.rate)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def refund(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def stats(self):
+        with self._lock:
+            return {'rate': self.rate, 'burst': self.burst, 'tokens': round(self._tokens, 2)}
+
+_deepseek_breaker = CircuitBreaker(
+    'DeepSeek-OCR', DEEPSEEK_BREAKER_FAILURES, DEEPSEEK_BREAKER_RESET_SECONDS, DEEPSEEK_BREAKER_MAX_RESET_SECONDS
+)
+_escalation_budget = EscalationBudget(ESCALATION_BUDGET, ESCALATION_BURST)
+
+def _deepseek_ocr(image, budget=None, on_text=None):
+    """Read `image` with DeepSeek-OCR (through the result cache).
+
+    Returns None instead of raising when DeepSeek can't be used right now:
+    the circuit is open, the `budget` (if given) is spent, or it failed, in
+    which case the failure is fed to the circuit breaker. Calls with a budget
+    are cascade escalations and are counted in ROUTING_TOTAL. `on_text`
+    receives the text so far while the model decodes.
+    """
+    def route(decision):
+        if budget is not None:
+            ROUTING_TOTAL.inc(decision=decision)
+
+    with stage_timer('image_prepare'):
+        prepared = prepare_image(image, 'deepseek')
+    with stage_timer('cache_digest'):
+        image_digest = _ocr_cache.image_digest(prepared)
+    cache_key = _ocr_cache.make_key(image_digest, 'deepseek', _deepseek_engine.cache_params())
+    cached = _ocr_cache.get(cache_key)
+    if cached is not None:
+        PAGES_TOTAL.inc(engine='deepseek', source='cache')
+        route('escalated')
+        log.debug(f"✅ DeepSeek-OCR result served from cache ({len(cached)} characters)")
+        return cached
+
+    if budget is not None and not budget.try_spend():
+        route('budget_exhausted')
+        return None
+    if not _deepseek_breaker.allow():
+        if budget is not None:
+            budget.refund()
+        route('circuit_open')
+        return None
+
+    try:
+        if not _deepseek_engine.load():
+            log.warning("⚠️  DeepSeek-OCR unavailable, using EasyOCR fallback")
+            FALLBACKS_TOTAL.inc(reason='model_unavailable')
+            route('escalation_failed')
+            return None
+        # Queue wait + batch execution, as seen by the caller
+        with stage_timer('deepseek_wait'):
+            text, stop = _deepseek_engine.batcher.submit(prepared, on_text).result()
+    except queue.Full:
+        # Back-pressure, not a model failure; don't count it against the breaker
+        _deepseek_breaker.release()
+        raise
+    except Exception as deepseek_error:
+        log.warning(f"⚠️  DeepSeek-OCR error: {str(deepseek_error)}")
+        log.debug("🔄 Falling back to EasyOCR...")
+        FALLBACKS_TOTAL.inc(reason='inference_error')
+        _deepseek_breaker.record_failure()
+        route('escalation_failed')
+        return None
+
+    _deepseek_breaker.record_success()
+    route('escalated')
+    PAGES_TOTAL.inc(engine='deepseek', source='model')
+    # A decode cut short by the clock depends on load, not on the image
+    if stop != 'time_budget':
+        _ocr_cache.put(cache_key, text)
+    log.debug(f"✅ DeepSeek-OCR complete! Extracted {len(text)} characters")
+    return text
+
+def _easyocr_ocr(image, languages=None):
+    """Read `image` with EasyOCR (through the result cache); returns (text, confidence)"""
+    languages = languages or EASYOCR_LANGUAGES
+    with stage_timer('image_prepare'):
+        prepared = prepare_image(image, 'easyocr')
+    with stage_timer('cache_digest'):
+        image_digest = _ocr_cache.image_digest(prepared)
+    cache_key = _ocr_cache.make_key(
+        image_digest, 'easyocr', _easyocr_engine.cache_params(languages=languages, output='text+confidence')
+    )
+    cached = _ocr_cache.get(cache_key)
+    if cached is not None:
+        PAGES_TOTAL.inc(engine='easyocr', source='cache')
+        text, confidence = json.loads(cached)
+        log.debug(f"✅ EasyOCR result served from cache ({len(text)} characters)")
+        return text, confidence
+
+    log.debug("📝 Processing image with EasyOCR...")
+    with stage_timer('easyocr_wait'):
+        text, confidence = _easyocr_engine.batcher.submit((prepared, languages)).result()
+    PAGES_TOTAL.inc(engine='easyocr', source='model')
+    _ocr_cache.put(cache_key, json.dumps([text, confidence]))
+    log.debug(f"✅ EasyOCR complete! Extracted {len(text)} characters (confidence {confidence:.2f})")
+    return text, confidence
+
+def _cascade_ocr(image, on_text=None, languages=None):
+    """EasyOCR first; escalate to DeepSeek-OCR only when EasyOCR is unsure and the budget allows"""
+    _escalation_budget.earn()
+    text, confidence = _easyocr_ocr(image, languages)
+    if confidence >= ESCALATION_MIN_CONFIDENCE:
+        ROUTING_TOTAL.inc(decision='confident')
+        return text
+
+    escalated = _deepseek_ocr(image, budget=_escalation_budget, on_text=on_text)
+    if escalated is None:
+        return text
+    log.debug(f"⬆️  Escalated to DeepSeek-OCR (EasyOCR confidence {confidence:.2f})")
+    return escalated
+
+def extract_text_from_image(image, on_text=None, languages=None) -> str:
+    """Extract text from an image, routing it between the engines per OCR_ROUTING.
+
+    `image` may be a PIL image or an (H, W, 3) uint8 NumPy array. It is
+    cropped and downscaled for each engine first (see prepare_image()). The
+    call blocks until the micro-batcher has run the batch containing this image;
+    meanwhile DeepSeek-OCR's text so far is passed to `on_text`, if given.
+    `languages` (a parse_languages() key) picks the EasyOCR reader;
+    DeepSeek-OCR reads any language without being told.
+    """
+    try:
+        log.debug("🔄 Starting OCR extraction...")
+        
+        if OCR_ROUTING == 'cascade':
+            return _cascade_ocr(image, on_text, languages)
+        
+        # Try DeepSeek-OCR first unless its circuit is open
+        if OCR_ROUTING == 'deepseek':
+            text = _deepseek_ocr(image, on_text=on_text)
+            if text is not None:
+                return text
+        
+        return _easyocr_ocr(image, languages)[0]
+        
+    except queue.Full:
+        raise Exception("OCR processing failed: inference queue is full, try again later")
     except Exception as e:
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
+        log.exception(f"❌ OCR Error: {str(e)}")
+        raise Exception(f"OCR processing failed: {str(e)}")
+
+# ============================================================
+# Layout analysis (region-level OCR)
+# ============================================================
+
+LAYOUT_MIN_BLOCKS = 2
+
+_block_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_QUEUE, thread_name_prefix='ocr-block')
+
+def _ink_mask(array):
+    """Subsampled boolean mask of the non-background pixels, and the subsampling step"""
+    import numpy as np
+    step = max(1, max(array.shape[:2]) // 1024)
+    gray = array[::step, ::step].min(axis=2)
+    return gray < np.percentile(gray, 90) - 48, step
+
+def _split_runs(profile, min_gap):
+    """[(start, end)] of the True runs in a 1-D profile, merging runs separated by fewer than min_gap"""
+    import numpy as np
+    indices = np.flatnonzero(profile)
+    if indices.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) > min_gap)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def _xy_cut(ink, top, bottom, left, right, row_gap, col_gap, blocks, depth=0):
+    """Recursively split a region at blank row bands, then blank column gutters.
+
+    Leaves are appended to `blocks` top-to-bottom, left-to-right within each
+    band, which is reading order for ordinary single- and multi-column pages.
+    """
+    region = ink[top:bottom, left:right]
+    # A couple of stray noise pixels don't make a row or column "inked"
+    rows = _split_runs(region.sum(axis=1) > max(1, 0.002 * (right - left)), row_gap)
+    if not rows:
+        return
+    if len(rows) > 1 and depth < 12:
+        for start, end in rows:
+            _xy_cut(ink, top + start, top + end, left, right, row_gap, col_gap, blocks, depth + 1)
+        return
+
+    top, bottom = top + rows[0][0], top + rows[-1][1]
+    region = ink[top:bottom, left:right]
+    cols = _split_runs(region.sum(axis=0) > max(1, 0.002 * (bottom - top)), col_gap)
+    if not cols:
+        return
+    if len(cols) > 1 and depth < 12:
+        for start, end in cols:
+            _xy_cut(ink, top, bottom, left + start, left + end, row_gap, col_gap, blocks, depth + 1)
+        return
+    blocks.append((top, bottom, left + cols[0][0], left + cols[-1][1]))
+
+def _heuristic_text_blocks(array):
+    import numpy as np
+
+    ink, step = _ink_mask(array)
+    # The typical text line height (in mask pixels) sets the gaps that separate
+    # blocks: more than a line of blank rows between paragraphs, gutters wider
+    # than word spacing between columns
+    line_runs = _split_runs(ink.sum(axis=1) > max(1, 0.002 * ink.shape[1]), 0)
+    if not line_runs:
+        return []
+    line_height = max(1, int(np.median([end - start for start, end in line_runs])))
+    blocks = []
+    _xy_cut(ink, 0, ink.shape[0], 0, ink.shape[1], int(1.5 * line_height), int(2.5 * line_height), blocks)
+    min_ink = line_height * line_height // 4
+    return [(top * step, bottom * step, left * step, right * step) for top, bottom, left, right in blocks
+            if ink[top:bottom, left:right].sum() >= min_ink]  # Drop specks and scanner dust
+
+def _detector_text_blocks(array):
+    import numpy as np
+
+    reader = get_easyocr_reader()
+    horizontal_list, free_list = reader.detect(np.ascontiguousarray(array))
+    lines = [(y_min, y_max, x_min, x_max) for x_min, x_max, y_min, y_max in horizontal_list[0]]
+    for points in free_list[0]:
+        xs, ys = [point[0] for point in points], [point[1] for point in points]
+        lines.append((min(ys), max(ys), min(xs), max(xs)))
+
+    # Group detected lines into blocks: a line joins the block above it when
+    # they overlap horizontally and the vertical gap is under one line height
+    blocks = []
+    for top, bottom, left, right in sorted(lines):
+        height = bottom - top
+        for block in blocks:
+            if top - block[1] < height and left < block[3] and right > block[2]:
+                block[:] = [min(block[0], top), max(block[1], bottom), min(block[2], left), max(block[3], right)]
+                break
+        else:
+            blocks.append([top, bottom, left, right])
+    return [tuple(int(v) for v in block) for block in blocks]
+
+def detect_text_blocks(array):
+    """Split a page image into text blocks; returns [(top, bottom, left, right)] in reading order"""
+    height, width = array.shape[:2]
+    blocks = _detector_text_blocks(array) if LAYOUT_MODE == 'detector' else _heuristic_text_blocks(array)
+    pad = MARGIN_CROP_PADDING
+    return [(max(0, top - pad), min(height, bottom + pad), max(0, left - pad), min(width, right + pad))
+            for top, bottom, left, right in blocks]
+
+def recognize_page(image, on_text=None, languages=None):
+    """OCR one page image, splitting it into text blocks first when LAYOUT_MODE is on.
+
+    Returns (text, blocks). `blocks` is None when the page was OCR'd whole,
+    otherwise [{'bbox': [x0, y0, x1, y1], 'text': ...}] for the blocks that
+    had text, in reading order, in pixel coordinates of `image`. Only pages OCR'd whole report their text so
+    far to `on_text`; blocks are short decodes.
+    """
+    if LAYOUT_MODE == 'off':
+        return extract_text_from_image(image, on_text, languages), None
+
+    array = as_image_array(image)
+    with stage_timer('layout'):
+        boxes = detect_text_blocks(array)
+    if not LAYOUT_MIN_BLOCKS <= len(boxes) <= LAYOUT_MAX_BLOCKS:
+        return extract_text_from_image(array, on_text, languages), None
+    LAYOUT_BLOCKS_TOTAL.inc(mode=LAYOUT_MODE, unit='page')
+    LAYOUT_BLOCKS_TOTAL.inc(len(boxes), mode=LAYOUT_MODE, unit='block')
+
+    # Keep one batch worth of crops in flight; more would only sit in the queue
+    texts = [None] * len(boxes)
+    in_flight = deque()
+    for index, (top, bottom, left, right) in enumerate(boxes):
+        block = array[top:bottom, left:right]
+        in_flight.append((index, _block_executor.submit(extract_text_from_image, block, languages=languages)))
+        if len(in_flight) >= BATCH_MAX_SIZE:
+            done_index, future = in_flight.popleft()
+            texts[done_index] = future.result()
+    for index, future in in_flight:
+        texts[index] = future.result()
+
+    blocks = [{'bbox': [left, top, right, bottom], 'text': text}
+              for (top, bottom, left, right), text in zip(boxes, texts) if text.strip()]
+    return "\n\n".join(text for text in texts if text.strip()), blocks
+
+def map_blocks(blocks, size, area, ndigits=None):
+    """Move block bboxes from pixels of an image of `size` (width, height) to the `area` (x0, y0, x1, y1) it shows.
+
+    For a PDF render `area` is the page region in points; for a decoded image
+    it is the original image, which decode_image() may have reduced.
+    """
+    width, height = size
+    x0, y0, x1, y1 = area
+    scale_x, scale_y = (x1 - x0) / width, (y1 - y0) / height
+    return [dict(block, bbox=[round(x0 + left * scale_x, ndigits), round(y0 + top * scale_y, ndigits),
+                              round(x0 + right * scale_x, ndigits), round(y0 + bottom * scale_y, ndigits)])
+            for block in blocks for left, top, right, bottom in [block['bbox']]]
+
+_page_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_QUEUE, thread_name_prefix='ocr-page')
+
+def ocr_pages(pages, on_text=None, languages=None):
+    """OCR an iterable of (page_num, page_count, path, layer_text, images, areas) and yield
+    (page_num, page_count, text, details) in order.
+
+    A page's text is its text-layer text followed by the OCR text of each of
+    its images. `details` has the page's `path` and, when the layout stage
+    split any of its images, the text `blocks` (with a `region` index if the
+    page had several images), their bboxes moved from image pixels to the
+    page coordinates in `areas` (see map_blocks()). Up to BATCH_MAX_SIZE images are submitted at
+    once so the pages of one document can share inference batches; a page is
+    yielded as soon as it and every page before it are done. Closing
+    the generator early (a cancelled request) drops images not yet started.
+
+    While a page is being decoded, on_text(page_num, page_count, text) gets
+    the page's text so far. `languages` picks the EasyOCR reader.
+    """
+    in_flight = deque()
+    images_in_flight = 0
+    try:
+        for page_num, page_count, path, layer_text, images, areas in pages:
+            listeners = [None] * len(images)
+            if on_text is not None:
+                listeners = _page_text_listeners(page_num, page_count, layer_text, len(images), on_text)
+            futures = [_page_executor.submit(recognize_page, image, listener, languages)
+                       for image, listener in zip(images, listeners)]
+            regions = [((image.shape[1], image.shape[0]), area) for image, area in zip(images, areas)]
+            in_flight.append((page_num, page_count, path, layer_text, futures, regions))
+            images_in_flight += len(futures)
+            # Pages at the head that are finished (text-layer pages have
+            # nothing to wait for) go out at once; past BATCH_MAX_SIZE images
+            # the oldest page is waited for
+            while in_flight and (images_in_flight >= BATCH_MAX_SIZE
+                                 or all(future.done() for future in in_flight[0][4])):
+                page_num, page_count, path, layer_text, futures, regions = in_flight.popleft()
+                images_in_flight -= len(futures)
+                yield (page_num, page_count) + _page_result(path, layer_text, futures, regions)
+        while in_flight:
+            page_num, page_count, path, layer_text, futures, regions = in_flight.popleft()
+            yield (page_num, page_count) + _page_result(path, layer_text, futures, regions)
+    finally:
+        for _, _, _, _, futures, _ in in_flight:
+            for future in futures:
+                future.cancel()
+
+def _page_text_listeners(page_num, page_count, layer_text, region_count, on_text):
+    """One on_text per image of a page, each reporting the whole page's text so far"""
+    parts = [None] * region_count
+    lock = threading.Lock()
+
+    def listener(region):
+        def on_region_text(text):
+            with lock:
+                parts[region] = text
+                page_text = "\n\n".join(part for part in [layer_text] + parts if part and part.strip())
+            on_text(page_num, page_count, page_text)
+        return on_region_text
+
+    return [listener(region) for region in range(region_count)]
+
+def _page_result(path, layer_text, futures, regions):
+    results = [future.result() for future in futures]
+    parts = [layer_text] + [text for text, _ in results]
+    details = {'path': path}
+    blocks = []
+    for region, ((_, region_blocks), (size, area)) in enumerate(zip(results, regions)):
+        for block in map_blocks(region_blocks or (), size, area, ndigits=2):
+            blocks.append(dict(block, region=region) if len(results) > 1 else block)
+    if blocks:
+        details['blocks'] = blocks
+    return "\n\n".join(part for part in parts if part and part.strip()), details
+
+# ============================================================
+# Model preloading and readiness
+# ============================================================
+
+_readiness = {
+    'state': 'pending' if MODEL_PRELOAD else 'lazy',  # lazy | pending | loading | warming_up | ready | failed
+    'engine': None,
+    'error': None,
+    'load_seconds': None,
+    'warmup_seconds': None,
+}
+_readiness_lock = threading.Lock()
+_preload_thread = None
+
+def _set_readiness(**changes):
+    with _readiness_lock:
+        _readiness.update(changes)
+
+def _make_warmup_image():
+    """A small synthetic page with a few lines of text to run through the engine once"""
+    from PIL import ImageDraw
+    image = Image.new('RGB', (640, 320), 'white')
+    draw = ImageDraw.Draw(image)
+    for line, text in enumerate(["OCR warm-up page", "The quick brown fox jumps over the lazy dog", "0123456789"]):
+        draw.text((40, 40 + line * 80), text, fill='black')
+    return image
+
+def _preload_models():
+    try:
+        _set_readiness(state='loading')
+        load_start = time.time()
+        # DeepSeek for the deepseek route and as the cascade's escalation target,
+        # EasyOCR whenever it serves first or DeepSeek didn't load
+        engines = []
+        if OCR_ROUTING != 'easyocr' and _deepseek_engine.load():
+            engines.append('deepseek')
+        if OCR_ROUTING != 'deepseek' or not engines:
+            _easyocr_engine.load()
+            engines.append('easyocr')
+        _set_readiness(engine='+'.join(engines), load_seconds=round(time.time() - load_start, 1))
+        
+        if MODEL_WARMUP:
+            _set_readiness(state='warming_up')
+            log.info(f"🔥 Warming up {', '.join(engines)}...")
+            warmup_start = time.time()
+            # Bypass the result cache so the model really runs
+            if 'deepseek' in engines:
+                try:
+                    _deepseek_engine.warm_up()
+                except Exception as e:
+                    log.warning(f"⚠️  DeepSeek-OCR warm-up failed: {str(e)}")
+                    FALLBACKS_TOTAL.inc(reason='warmup_failed')
+                    _deepseek_breaker.record_failure(trip=True)
+                    engines.remove('deepseek')
+                    if 'easyocr' not in engines:
+                        log.info("🔄 Falling back to EasyOCR...")
+                        engines.append('easyocr')
+            if 'easyocr' in engines:
+                _easyocr_engine.warm_up()
+            warmup_seconds = round(time.time() - warmup_start, 1)
+            _set_readiness(engine='+'.join(engines), warmup_seconds=warmup_seconds)
+            log.info(f"✓ Warm-up complete ({warmup_seconds:.1f}s)")
         
+        _set_readiness(state='ready')
+        log.info(f"✅ OCR engine ready ({' + '.join(engines)}, routing: {OCR_ROUTING})")
+    except Exception as e:
+        log.error(f"❌ Model preload failed: {str(e)}")
+        _set_readiness(state='failed', error=str(e))
+
+def start_model_preload():
+    """Load and warm up the OCR engine in a background thread (only once per process)"""
+    global _preload_thread
+    
+    with _readiness_lock:
+        if _preload_thread is not None:
+            return
+        _preload_thread = threading.Thread(target=_preload_models, name='ocr-preload', daemon=True)
+        _preload_thread.start()
+
+@app.before_request
+def _preload_on_first_request():
+    """Start MODEL_PRELOAD under servers that import app:app directly (waitress-serve, gunicorn).
+
+    serve.py and `python app.py` start it at startup; elsewhere the first
+    request, typically the first /api/ready probe, does. Spawned raster
+    workers and the reloader parent import this module but never serve a
+    request, so they never load the model.
+    """
+    if MODEL_PRELOAD and _preload_thread is None:
+        start_model_preload()
+
+def is_ready():
+    with _readiness_lock:
+        return _readiness['state'] in ('lazy', 'ready') and not _draining.is_set()
+
+# ============================================================
+# PDF rasterization pipeline
+# ============================================================
+
+_raster_pool = None
+_raster_pool_lock = threading.Lock()
+_worker_pdf_cache = {}  # Per-process: document id -> open fitz.Document
+
+def _worker_open_pdf(doc_id, source):
+    """Open a PDF once per worker process and reuse it for the following pages.
+
+    `source` comes from UploadedDocument.pdf_source(): a file path, or the
+    (name, size) of a shared memory block holding the PDF, copied out once.
+    """
+    import fitz
+    doc = _worker_pdf_cache.get(doc_id)
+    if doc is None:
+        # Only keep the current document open in each worker
+        for stale_doc in _worker_pdf_cache.values():
+            stale_doc.close()
+        _worker_pdf_cache.clear()
+        if isinstance(source, str):
+            doc = fitz.open(source)
+        else:
+            from multiprocessing import shared_memory
+            name, size = source
+            shared = shared_memory.SharedMemory(name=name)
+            try:
+                data = bytes(shared.buf[:size])
+            finally:
+                shared.close()
+            doc = fitz.open(stream=data, filetype='pdf')
+        _worker_pdf_cache[doc_id] = doc
+    return doc
+
+def _render_pdf_page(doc_id, source, page_num, engine, clip=None):
+    """Rasterize a single PDF page, or a region of it, for `engine` (runs inside a raster worker process).
+
+    Returns the raw RGB samples plus geometry, the render time, the
+    fixed-zoom pixel count and the page area rendered; the parent wraps the
+    samples with samples_to_array() instead of paying for a PNG encode/decode.
+    """
+    render_start = time.perf_counter()
+    doc = _worker_open_pdf(doc_id, source)
+    pix, fixed_zoom_pixels, area = render_pdf_page(doc[page_num], engine, clip)
+    return (pix.samples, pix.width, pix.height, pix.n, pix.stride,
+            time.perf_counter() - render_start, fixed_zoom_pixels, area)
+
+def get_raster_pool():
+    """Lazily create the shared PDF rasterization process pool"""
+    global _raster_pool
+
+    if PDF_RASTER_WORKERS <= 0:
+        return None
+
+    with _raster_pool_lock:
+        if _raster_pool is None:
+            log.info(f"⚙️  Starting PDF raster pool ({PDF_RASTER_WORKERS} worker(s))")
+            # Spawned, not forked: this process has Flask, batcher, preload and
+            # torch threads running by the time the first PDF arrives
+            import multiprocessing
+            _raster_pool = ProcessPoolExecutor(max_workers=PDF_RASTER_WORKERS,
+                                               mp_context=multiprocessing.get_context('spawn'))
+        return _raster_pool
+
+def _reset_raster_pool():
+    """Drop a broken raster pool so the next PDF gets a fresh one"""
+    global _raster_pool
+
+    with _raster_pool_lock:
+        if _raster_pool is not None:
+            _raster_pool.shutdown(wait=False, cancel_futures=True)
+            _raster_pool = None
+
+def _render_page_in_process(pdf_document, page_num, engine, clip=None):
+    with stage_timer('pdf_rasterize'):
+        pix, fixed_zoom_pixels, area = render_pdf_page(pdf_document[page_num], engine, clip)
+    _count_rendered_pixels(engine, pix.width * pix.height, fixed_zoom_pixels)
+    return pixmap_to_array(pix), area
+
+def _count_rendered_pixels(engine, rendered, fixed_zoom_pixels):
+    PIXELS_TOTAL.inc(rendered, engine=engine, stage='pdf_rendered')
+    PIXELS_TOTAL.inc(fixed_zoom_pixels, engine=engine, stage='pdf_fixed_zoom')
+
+def _rect_area(rect):
+    return 0 if rect.is_empty else rect.width * rect.height
+
+def _suspicious_char(char):
+    code = ord(char)
+    # U+FFFD and private-use glyphs come from fonts without a usable ToUnicode map
+    return code == 0xFFFD or 0xE000 <= code <= 0xF8FF or (code < 32 and char not in '\n\t')
+
+def plan_pdf_page(page):
+    """Decide how to read one PDF page from its text layer.
+
+    Returns (path, layer_text, clips):
+      'text_layer' - the embedded text is trustworthy and covers the page; no OCR
+      'mixed'      - use the embedded text and OCR only the image regions in `clips`
+      'ocr'        - no usable text layer; OCR the whole page (clips == [None])
+    """
+    if not PDF_TEXT_LAYER:
+        return 'ocr', '', [None]
+    import fitz
+
+    blocks = page.get_text('dict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+    spans = [span for block in blocks for line in block.get('lines', ()) for span in line['spans']]
+    chars = "".join(span['text'] for span in spans)
+    visible = [c for c in chars if not c.isspace()]
+    if len(visible) < PDF_TEXT_LAYER_MIN_CHARS:
+        return 'ocr', '', [None]
+
+    # Font sanity: broken encodings and microscopic text mean the layer can't be trusted
+    suspicious = sum(1 for c in visible if _suspicious_char(c))
+    suspicious += sum(len(span['text'].strip()) for span in spans if span['size'] < 1)
+    if suspicious > 0.05 * len(visible):
+        return 'ocr', '', [None]
+
+    # Images the text layer doesn't cover (figures, pasted scans) still need OCR
+    page_area = _rect_area(page.rect)
+    text_rects = [fitz.Rect(block['bbox']) for block in blocks]
+    clips = []
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info['bbox']) & page.rect
+        area = _rect_area(bbox)
+        if area < 0.02 * page_area:
+            continue  # Logos, icons, bullets
+        if sum(_rect_area(bbox & rect) for rect in text_rects) < 0.5 * area:
+            clips.append(tuple(bbox))
+    if sum(_rect_area(fitz.Rect(clip)) for clip in clips) >= 0.8 * page_area:
+        # Essentially a scan with a few stray words on top
+        return 'ocr', '', [None]
+
+    text = page.get_text('text', sort=True).strip()
+    return ('mixed' if clips else 'text_layer'), text, clips
+
+def iter_pdf_pages(document):
+    """Yield (page_num, page_count, path, layer_text, images, areas) for every page of a PDF, in page order.
+
+    `path` and `layer_text` come from plan_pdf_page(). `images` holds the
+    (H, W, 3) uint8 arrays still to OCR: the whole page, the uncovered image
+    regions of a mixed page, or nothing for a text-layer page. `areas` has
+    the (x0, y0, x1, y1) page area in PDF points each image shows.
+
+    Rasterization runs in the raster pool and stays up to PDF_PREFETCH_PAGES
+    pages ahead of the consumer, so OCR of page N overlaps rendering of N+1...
+    """
+    with stage_timer('pdf_open'):
+        pdf_document = document.open_pdf()
+        page_count = len(pdf_document)
+    log.debug(f"📄 PDF with {page_count} page(s)")
+
+    # Render for the engine that is serving now; prepare_image() still
+    # downscales if a fallback happens mid-document
+    engine = active_engine()
+    pool = get_raster_pool()
+    source = document.pdf_source() if pool is not None else None
+    pending = deque()
+    next_page = 0
+
+    def submit_next():
+        nonlocal next_page
+        with stage_timer('pdf_classify'):
+            path, layer_text, clips = plan_pdf_page(pdf_document[next_page])
+        renders = []
+        for clip in clips:
+            future = None
+            if pool is not None:
+                future = pool.submit(_render_pdf_page, document.id, source, next_page, engine, clip)
+            renders.append((clip, future))
+        pending.append((next_page, path, layer_text, renders))
+        next_page += 1
+
+    def render(page_num, clip, future):
+        nonlocal pool
+        try:
+            if future is None:
+                return _render_page_in_process(pdf_document, page_num, engine, clip)
+            # Time spent blocked here means OCR is outrunning rasterization
+            with stage_timer('pdf_raster_wait'):
+                samples, width, height, n, stride, render_seconds, fixed_zoom_pixels, area = future.result()
+            STAGE_SECONDS.observe(render_seconds, stage='pdf_rasterize')
+            _count_rendered_pixels(engine, width * height, fixed_zoom_pixels)
+            return samples_to_array(samples, width, height, n, stride), area
+        except BrokenProcessPool:
+            if pool is not None:
+                log.warning("⚠️  PDF raster pool crashed, rendering remaining pages in-process")
+                _reset_raster_pool()
+                pool = None
+            return _render_page_in_process(pdf_document, page_num, engine, clip)
+
+    try:
+        while next_page < page_count and len(pending) < PDF_PREFETCH_PAGES:
+            submit_next()
+
+        while pending:
+            page_num, path, layer_text, renders = pending.popleft()
+            rendered = [render(page_num, clip, future) for clip, future in renders]
+            images = [image for image, _ in rendered]
+            areas = [area for _, area in rendered]
+            PDF_PAGES_TOTAL.inc(path=path)
+            log.debug(f"📄 Page {page_num + 1}: {path}")
+
+            # Keep the pipeline full while this page is being OCR'd
+            if next_page < page_count:
+                submit_next()
+
+            yield page_num, page_count, path, layer_text, images, areas
+    finally:
+        for _, _, _, renders in pending:
+            for _, future in renders:
+                if future is not None:
+                    future.cancel()
+        pdf_document.close()
+
+# ============================================================
+# Admission control (cost-bounded queue, fair queuing)
+# ============================================================
+
+class AdmissionRejected(Exception):
+    """The admission queue is full; `retry_after` is a hint in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Server is busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class AdmissionTicket:
+    """One request's place in the admission queue"""
+
+    def __init__(self, client, cost, priority, on_grant):
+        self.client = client
+        self.cost = cost
+        self.priority = priority
+        self.lane = 'priority' if priority else 'fair'
+        self.state = 'queued'  # queued -> running -> released | cancelled
+        self.queued_at = time.monotonic()
+        self.granted_at = None
+        self._on_grant = on_grant
+        self._granted = threading.Event()
+
+    def wait(self, timeout):
+        """Block until the ticket may run; False on timeout"""
+        return self._granted.wait(timeout)
+
+class AdmissionController:
+    """Admit OCR requests by estimated cost, fairly across clients.
+
+    Tickets run while the running cost stays within `max_running` (a ticket
+    bigger than that runs alone). Priority tickets may use `priority_reserve`
+    more, so small images never wait behind a large PDF. Up to `max_queued`
+    more cost waits: the priority lane first, then one ticket per client in
+    turn. submit() raises AdmissionRejected beyond that.
+    """
+
+    def __init__(self, max_running, max_queued, priority_reserve):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.priority_reserve = priority_reserve
+        self._priority = deque()
+        self._clients = OrderedDict()  # client -> deque of tickets, in round-robin order
+        self._running = set()
+        self._running_cost = 0.0
+        self._queued_cost = 0.0
+        self._seconds_per_mpx = None  # Moving average over finished tickets
+        self._lock = threading.Lock()
+
+    def submit(self, client, cost, priority=False, on_grant=None):
+        """Queue a request; on_grant(ticket) is called (or ticket.wait() returns) once it may run"""
+        with self._lock:
+            if self._queued_cost > 0 and self._queued_cost + cost > self.max_queued:
+                retry_after = self._retry_after(cost)
+                ADMISSION_TOTAL.inc(lane='priority' if priority else 'fair', outcome='rejected')
+                raise AdmissionRejected(retry_after)
+            ticket = AdmissionTicket(client, cost, priority, on_grant)
+            if priority:
+                self._priority.append(ticket)
+            else:
+                self._clients.setdefault(client, deque()).append(ticket)
+            self._queued_cost += cost
+            granted = self._grant()
+        self._notify(granted)
+        return ticket
+
+    def cancel(self, ticket):
+        """Drop a ticket that is still queued; False if it already started"""
+        with self._lock:
+            if ticket.state != 'queued':
+                return False
+            if ticket.priority:
+                self._priority.remove(ticket)
+            else:
+                waiting = self._clients[ticket.client]
+                waiting.remove(ticket)
+                if not waiting:
+                    del self._clients[ticket.client]
+            ticket.state = 'cancelled'
+            self._queued_cost -= ticket.cost
+            if not self._priority and not self._clients:
+                self._queued_cost = 0.0
+            ADMISSION_TOTAL.inc(lane=ticket.lane, outcome='cancelled')
+            # The cancelled ticket may have been holding up smaller ones
+            granted = self._grant()
+        self._notify(granted)
+        return True
+
+    def release(self, ticket):
+        """Mark a running ticket finished and start whatever now fits"""
+        with self._lock:
+            if ticket.state != 'running':
+                return
+            ticket.state = 'released'
+            self._running.discard(ticket)
+            self._running_cost = self._running_cost - ticket.cost if self._running else 0.0
+            if ticket.cost > 0:
+                seconds_per_mpx = (time.monotonic() - ticket.granted_at) / ticket.cost
+                if self._seconds_per_mpx is None:
+                    self._seconds_per_mpx = seconds_per_mpx
+                else:
+                    self._seconds_per_mpx = 0.8 * self._seconds_per_mpx + 0.2 * seconds_per_mpx
+            granted = self._grant()
+        self._notify(granted)
+
+    def _next_ticket(self):
+        if self._priority:
+            return self._priority[0]
+        for waiting in self._clients.values():
+            return waiting[0]
+        return None
+
+    def _grant(self):
+        """Move tickets from the queue to running while they fit (call with the lock held)"""
+        granted = []
+        while True:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            limit = self.max_running + (self.priority_reserve if ticket.priority else 0)
+            if self._running and self._running_cost + ticket.cost > limit:
+                break
+            if ticket.priority:
+                self._priority.popleft()
+            else:
+                waiting = self._clients.pop(ticket.client)
+                waiting.popleft()
+                if waiting:
+                    self._clients[ticket.client] = waiting  # Back of the round-robin order
+            self._queued_cost -= ticket.cost
+            if not self._priority and not self._clients:
+                self._queued_cost = 0.0
+            ticket.state = 'running'
+            ticket.granted_at = time.monotonic()
+            self._running.add(ticket)
+            self._running_cost += ticket.cost
+            granted.append(ticket)
+        return granted
+
+    def _notify(self, granted):
+        for ticket in granted:
+            ADMISSION_TOTAL.inc(lane=ticket.lane, outcome='admitted')
+            STAGE_SECONDS.observe(ticket.granted_at - ticket.queued_at, stage='admission_wait')
+            ticket._granted.set()
+            if ticket._on_grant is not None:
+                ticket._on_grant(ticket)
+
+    def _retry_after(self, cost):
+        """Seconds until the queue has likely drained enough for `cost` (call with the lock held)"""
+        import math
+        if self._seconds_per_mpx is None:
+            return 5
+        # Each running ticket progresses at 1 / seconds_per_mpx; the running work
+        # plus enough of the queue to make room for `cost` has to finish first
+        excess = min(self._queued_cost, self._queued_cost + cost - self.max_queued)
+        seconds = (self._running_cost + excess) * self._seconds_per_mpx / max(1, len(self._running))
+        return int(min(600, max(1, math.ceil(seconds))))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': len(self._running),
+                'running_mpx': round(self._running_cost, 1),
+                'queued': len(self._priority) + sum(len(waiting) for waiting in self._clients.values()),
+                'queued_mpx': round(self._queued_cost, 1),
+                'queued_priority': len(self._priority),
+                'waiting_clients': len(self._clients),
+                'max_running_mpx': self.max_running,
+                'max_queued_mpx': self.max_queued,
+                'seconds_per_mpx': round(self._seconds_per_mpx, 3) if self._seconds_per_mpx is not None else None,
+            }
+
+_admission = AdmissionController(ADMISSION_MAX_RUNNING_MPX, ADMISSION_MAX_QUEUED_MPX, ADMISSION_PRIORITY_MAX_MPX)
+
+def estimate_cost(document):
+    """Estimate a document's OCR work as (megapixels, priority).
+
+    Cheap on purpose: only the image header, or the PDF's page count and first
+    page size, are read. Images cost the pixels decode_image() holds, up to
+    IMAGE_DECODE_MAX_MPX, whatever size the engine then gets; PDF pages are
+    rendered at the engine's input size when IMAGE_PREP is on and cost that.
+    Text-layer pages are costed like scans. A single image of at most
+    ADMISSION_PRIORITY_MAX_MPX is a priority request.
+    """
+    try:
+        if document.is_pdf:
+            with document.open_pdf() as pdf_document:
+                pages = len(pdf_document)
+                rect = pdf_document[0].rect if pages else None
+            zoom = PDF_MAX_RENDER_ZOOM if IMAGE_PREP else PDF_RENDER_ZOOM
+            pixels = rect.width * rect.height * zoom * zoom if rect is not None else 0
+        else:
+            with document.open_image() as image:
+                width, height = image.size
+            pages, pixels = 1, width * height
+    except Exception:
+        # Unreadable uploads fail with a proper error once they run; cost them as one page
+        return 1.0, False
+    priority = not document.is_pdf and pixels / 1e6 <= ADMISSION_PRIORITY_MAX_MPX
+    pixels = min(pixels, IMAGE_DECODE_MAX_MPX * 1e6)
+    if IMAGE_PREP and document.is_pdf:
+        pixels = min(pixels, engine_max_side(active_engine()) ** 2)
+    return pages * pixels / 1e6, priority
+
+def client_id():
+    """Who a request counts against for fair queuing"""
+    if ADMISSION_CLIENT_HEADER and request.headers.get(ADMISSION_CLIENT_HEADER):
+        return request.headers[ADMISSION_CLIENT_HEADER]
+    return request.remote_addr or 'unknown'
+
+def client_disconnected():
+    """Best-effort check whether the client of the current request has hung up.
+
+    Peeks at the connection the WSGI server exposes (werkzeug, gunicorn's sync
+    workers); under servers that don't expose it the client counts as connected.
+    """
+    import select
+    import socket
+    connection = request.environ.get('werkzeug.socket') or request.environ.get('gunicorn.socket')
+    if connection is None:
+        return False
+    try:
+        readable, _, _ = select.select([connection], [], [], 0)
+        return bool(readable) and connection.recv(1, socket.MSG_PEEK) == b''
+    except ConnectionError:
+        return True
+    except (OSError, ValueError):
+        return False
+
+def shutting_down_response():
+    response = jsonify({'error': 'Server is shutting down, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+def busy_response(error):
+    """429 with Retry-After for a request the admission queue can't take"""
+    response = jsonify({'error': f'Server is busy, please retry in {error.retry_after}s',
+                        'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+@app.route('/')
+def index():
+    return render_template('index.html', max_upload_bytes=MAX_FILE_SIZE)
+
+def validate_upload():
+    """Return (file, None) for a valid upload, or (None, error response).
+
+    The upload is either a `file` in the request or the `upload_id` of a
+    finished chunked upload (returned as its ChunkedUpload).
+    """
+    upload_id = request.form.get('upload_id')
+    if upload_id:
+        upload = _get_chunked_upload(upload_id)
+        if upload is None:
+            return None, (jsonify({'error': 'Upload not found'}), 404)
+        if not upload.complete:
+            return None, (jsonify({'error': f'Upload incomplete ({upload.received} of {upload.size} bytes)'}), 409)
+        return upload, None
+    
+    if 'file' not in request.files:
+        return None, (jsonify({'error': 'No file provided'}), 400)
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return None, (jsonify({'error': 'No file selected'}), 400)
+    
+    if not allowed_file(file.filename):
+        return None, (jsonify({'error': 'File type not allowed. Please upload an image or PDF file.'}), 400)
+    
+    return file, None
+
+def requested_languages():
+    """Return (languages, None) from the request's `languages` field, or (None, error response)"""
+    value = request.form.get('languages') or request.args.get('languages')
+    try:
+        return parse_languages(value), None
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+
+class UploadedDocument:
+    """An uploaded file, held in memory or (above UPLOAD_SPOOL_THRESHOLD) in a unique spool file.
+
+    close() deletes the file at `path` unless `owns_path` is False (a file
+    that was already on disk, as in bulk_ocr.py).
+    """
+
+    def __init__(self, filename, data=None, path=None, languages=None, owns_path=True):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.data = data
+        self.path = path
+        self.owns_path = owns_path
+        self.languages = languages or EASYOCR_LANGUAGES  # EasyOCR reader to use (see parse_languages())
+        self._shared = None  # Shared-memory copy of in-memory data for the raster workers
+
+    @property
+    def is_pdf(self):
+        return self.filename.lower().endswith('.pdf')
+
+    @property
+    def size(self):
+        if self.path:
+            return os.path.getsize(self.path)
+        return len(self.data)
+
+    def pdf_source(self):
+        """Where raster workers open the PDF from: a path, or (name, size) of a shared memory block.
+
+        Uploads kept in memory are copied into shared memory the first time,
+        so each page sent to the pool carries a name, not the whole PDF, and
+        nothing is written to disk. Each worker copies the bytes out once per
+        document (see _worker_open_pdf()).
+        """
+        if self.path:
+            return self.path
+        if self._shared is None:
+            from multiprocessing import shared_memory
+            self._shared = shared_memory.SharedMemory(create=True, size=max(1, len(self.data)))
+            self._shared.buf[:len(self.data)] = self.data
+        return self._shared.name, len(self.data)
+
+    def open_pdf(self):
+        import fitz
+        if self.path:
+            return fitz.open(self.path)
+        return fitz.open(stream=self.data, filetype='pdf')
+
+    def open_image(self):
+        if self.path:
+            return Image.open(self.path)
+        from io import BytesIO
+        return Image.open(BytesIO(self.data))
+
+    def close(self):
+        self.data = None
+        if self.path and self.owns_path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+
+def upload_filename(name):
+    """A safe local name for an uploaded file, keeping its extension"""
+    filename = secure_filename(name)
+    extension = name.rsplit('.', 1)[1].lower()
+    if not filename.lower().endswith(f".{extension}"):
+        # secure_filename() drops non-ASCII names entirely; keep the type recognisable
+        filename = f"{filename or 'upload'}.{extension}"
+    return filename
+
+def read_upload(file, languages=None):
+    """Read an upload straight from the request stream.
+
+    Small files stay in memory. Larger ones are copied into a spool file with
+    a unique name, so concurrent uploads of the same filename never collide.
+    A finished chunked upload is already spooled and is used as it is.
+    """
+    if isinstance(file, ChunkedUpload):
+        return file.take(languages)
+    filename = upload_filename(file.filename)
+    data = file.stream.read(UPLOAD_SPOOL_THRESHOLD + 1)
+    if len(data) <= UPLOAD_SPOOL_THRESHOLD:
+        return UploadedDocument(filename, data=data, languages=languages)
+
+    import shutil
+    import tempfile
+    fd, path = tempfile.mkstemp(prefix='upload-', suffix=f"_{filename}", dir=app.config['UPLOAD_FOLDER'])
+    try:
+        with os.fdopen(fd, 'wb') as spool:
+            spool.write(data)
+            del data
+            shutil.copyfileobj(file.stream, spool, 1024 * 1024)
+    except Exception:
+        os.remove(path)
+        raise
+    return UploadedDocument(filename, path=path, languages=languages)
+
+def iter_document_text(document, on_text=None):
+    """Read an uploaded document, yielding (page_num, page_count, text, details) as each page finishes.
+
+    `details['path']` is how the page was read: 'text_layer', 'mixed' or
+    'ocr'; `details['blocks']` lists the layout blocks when the page was
+    split (see recognize_page()), with bboxes in PDF points of the page or in
+    pixels of the original image. on_text(page_num, page_count, text) gets
+    each page's text so far while it is decoded. EasyOCR reads the
+    document's `languages`.
+    """
+    if document.is_pdf:
+        pages = iter_pdf_pages(document)
+        for page_num, page_count, page_text, details in ocr_pages(pages, on_text, document.languages):
+            log.debug(f"--- Page {page_num + 1}/{page_count} ({details['path']}) ---")
+            yield page_num, page_count, page_text, details
+    else:
+        with stage_timer('image_decode'), document.open_image() as source:
+            original_size = source.size
+            image = decode_image(source)
+        listener = None
+        if on_text is not None:
+            listener = lambda text: on_text(0, 1, text)
+        page_text, blocks = recognize_page(image, listener, document.languages)
+        details = {'path': 'ocr'}
+        if blocks:
+            details['blocks'] = map_blocks(blocks, image.size, (0, 0) + original_size)
+        yield 0, 1, page_text, details
+
+def format_page_section(page_num, page_text, is_pdf):
+    """Format one page the way it appears in the combined result"""
+    if is_pdf:
+        return f"--- Page {page_num + 1} ---\n{page_text}"
+    return page_text
+
+def join_page_sections(sections):
+    extracted_text = "\n\n".join(sections)
+    if not extracted_text or not extracted_text.strip():
+        extracted_text = "No text could be extracted from the file."
+    return extracted_text
+
+def await_admission(ticket):
+    """Hold a synchronous request until its ticket runs.
+
+    Returns None once admitted, or an error response if the client hung up or
+    the wait exceeded ADMISSION_MAX_WAIT_SECONDS (the ticket is then cancelled).
+    """
+    deadline = time.monotonic() + ADMISSION_MAX_WAIT_SECONDS
+    while not ticket.wait(0.25):
+        if client_disconnected():
+            reason, response = 'disconnected', (jsonify({'error': 'Client disconnected'}), 499)
+        elif time.monotonic() >= deadline:
+            response = jsonify({'error': 'Timed out waiting for a free OCR slot, please retry'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(int(ADMISSION_MAX_WAIT_SECONDS))
+            reason = 'queue_timeout'
+        else:
+            continue
+        if _admission.cancel(ticket):
+            CANCELLED_TOTAL.inc(reason=reason)
+            log.info(f"🚫 Dropped queued request from {ticket.client} ({reason})")
+            return response
+        return None  # Admitted just now
+    return None
+
+def stream_ocr_json(document, results):
+    """Yield the /api/ocr JSON body piece by piece as the pages in `results` finish.
+
+    Only the per-page details are kept until the end; each page's text is
+    written out as soon as it is read. The body is the same object a
+    buffered response would be, with "success" written last: a page failing
+    midway ends it with "success": false and the "error", since the status
+    code has already been sent.
+    """
+    def escape(text):
+        return json.dumps(text)[1:-1]
+
+    yield '{"filename": ' + json.dumps(document.filename) + ', "text": "'
+    pages = []
+    error = None
+    # Text held back while everything so far is blank, so an empty result
+    # still becomes join_page_sections()' placeholder
+    blank = ''
+    try:
+        for page_num, _, page_text, details in results:
+            section = format_page_section(page_num, page_text, document.is_pdf)
+            piece = section if not pages else "\n\n" + section
+            pages.append(dict(details, page=page_num + 1))
+            if blank is not None:
+                blank += piece
+                if blank.strip():
+                    piece, blank = blank, None
+                else:
+                    continue
+            yield escape(piece)
+            if client_disconnected():
+                CANCELLED_TOTAL.inc(reason='disconnected')
+                log.info(f"🚫 Client left, stopped {document.filename} after {len(pages)} page(s)")
+                return
+    except Exception as ocr_error:
+        error = f'OCR extraction failed: {str(ocr_error)}'
+    finally:
+        results.close()
+    if blank is not None and error is None:
+        yield escape(join_page_sections([]))
+    tail = {'pages': pages, 'success': error is None}
+    if error is not None:
+        tail['error'] = error
+    yield '", ' + json.dumps(tail)[1:]
+
+@app.route('/api/ocr', methods=['POST'])
+def ocr_scan():
+    """OCR an upload and return its text as it is read.
+
+    The response starts once the first page is done (an error before that is
+    still a plain 500) and the text of later pages is streamed as they finish.
+    """
+    document = None
+    ticket = None
+    streaming = False
+    try:
+        file, error_response = validate_upload()
+        if error_response:
+            return error_response
+        languages, error_response = requested_languages()
+        if error_response:
+            return error_response
+        
+        if _draining.is_set():
+            return shutting_down_response()
+        
+        with stage_timer('upload_read'):
+            document = read_upload(file, languages)
+        
+        cost, priority = estimate_cost(document)
+        try:
+            ticket = _admission.submit(client_id(), cost, priority)
+        except AdmissionRejected as busy:
+            if isinstance(file, ChunkedUpload):
+                file.put_back(document)
+            return busy_response(busy)
+        error_response = await_admission(ticket)
+        if error_response:
+            if isinstance(file, ChunkedUpload):
+                file.put_back(document)
+            return error_response
+        
+        log.debug(f"📁 Processing file: {document.filename} (~{cost:.1f} MP)")
+        
+        results = iter_document_text(document)
+        try:
+            first_page = next(results)
+        except StopIteration:
+            first_page = None
+        except Exception as ocr_error:
+            results.close()
+            return jsonify({'error': f'OCR extraction failed: {str(ocr_error)}'}), 500
+        
+        def remaining_pages():
+            if first_page is not None:
+                yield first_page
+            yield from results
+        
+        def finish():
+            results.close()
+            _admission.release(ticket)
+            document.close()
+        
+        def body():
+            try:
+                yield from stream_ocr_json(document, remaining_pages())
+            finally:
+                finish()
+        
+        response = Response(stream_with_context(body()), mimetype='application/json')
+        # Also clean up when the body is never read at all
+        response.call_on_close(finish)
+        streaming = True
+        return response
+    
+    except Exception as e:
         return jsonify({
             'error': f'OCR processing failed: {str(e)}'
         }), 500
+    
+    finally:
+        if not streaming:
+            if ticket is not None:
+                _admission.release(ticket)
+            if document is not None:
+                document.close()
+
+# ============================================================
+# Chunked uploads (resumable)
+# ============================================================
+
+UPLOAD_READ_BYTES = 64 * 1024  # Chunk bytes read from the request (and written) at a time
+UPLOAD_STALL_SECONDS = 10  # A chunk writer that received nothing for this long can be replaced
+
+class UploadOffsetConflict(Exception):
+    """A chunk was sent for another offset than the bytes received so far"""
+
+class UploadBusy(UploadOffsetConflict):
+    """Another request is still writing a chunk of this upload"""
+
+class ChunkedUpload:
+    """A file sent in chunks through /api/uploads, spooled to UPLOAD_FOLDER.
+
+    Chunks arrive in order, each naming the offset it starts at. Bytes are
+    kept as they are written, so a chunk cut off by a dropped connection
+    still counts for what arrived; the client asks for the offset again
+    (or gets it back with a 409) and resumes from there.
+
+    One request writes at a time, but the request body is read without
+    holding the lock: a second writer gets UploadBusy at once, and once the
+    current writer has received nothing for UPLOAD_STALL_SECONDS (a
+    connection that dropped without the server noticing) a new writer at
+    the right offset replaces it.
+    """
+
+    def __init__(self, filename, size):
+        import tempfile
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.size = size
+        self.received = 0
+        self.updated_at = time.time()
+        self._lock = threading.Lock()
+        self._writer = None  # Token of the request currently writing a chunk
+        fd, self.path = tempfile.mkstemp(prefix='chunked-', suffix=f"_{filename}", dir=app.config['UPLOAD_FOLDER'])
+        os.close(fd)
+
+    @property
+    def complete(self):
+        return self.received == self.size
+
+    def append(self, offset, stream):
+        """Write the chunk starting at `offset` from `stream`; returns the bytes received so far.
+
+        Raises UploadOffsetConflict if `offset` isn't where the upload stands,
+        UploadBusy if another request is writing (or took over from this
+        one), ValueError if the chunk runs past the declared size.
+        """
+        writer = object()
+        with self._lock:
+            if self.path is None:
+                raise ValueError('Upload has expired')
+            if offset != self.received:
+                raise UploadOffsetConflict(offset)
+            if self._writer is not None and time.time() - self.updated_at < UPLOAD_STALL_SECONDS:
+                raise UploadBusy(offset)
+            self._writer = writer
+            self.updated_at = time.time()
+        try:
+            with open(self.path, 'r+b') as spool:
+                while True:
+                    # Read from the network outside the lock; only the write is serialized
+                    block = stream.read(UPLOAD_READ_BYTES)
+                    if not block:
+                        break
+                    with self._lock:
+                        if self._writer is not writer:
+                            raise UploadBusy(offset)
+                        if self.path is None:
+                            raise ValueError('Upload has expired')
+                        if self.received + len(block) > self.size:
+                            raise ValueError(f'Chunk runs past the declared size of {self.size} bytes')
+                        spool.seek(self.received)
+                        spool.write(block)
+                        spool.flush()
+                        self.received += len(block)
+                        self.updated_at = time.time()
+        finally:
+            with self._lock:
+                if self._writer is writer:
+                    self._writer = None
+        return self.received
+
+    def take(self, languages=None):
+        """Hand the finished file over as an UploadedDocument (which then owns it); an upload is read once"""
+        with _chunked_uploads_lock:
+            if _chunked_uploads.pop(self.id, None) is None:
+                raise ValueError('Upload was already used or has expired')
+        CHUNKED_UPLOADS_TOTAL.inc(event='used')
+        return UploadedDocument(self.filename, path=self.path, languages=languages)
+
+    def put_back(self, document):
+        """Undo take() for a request that wasn't admitted, so the client can retry with the same upload_id.
+
+        `document` (from take()) no longer owns the file; closing it leaves the upload in place.
+        """
+        document.owns_path = False
+        self.updated_at = time.time()
+        with _chunked_uploads_lock:
+            _chunked_uploads[self.id] = self
+        CHUNKED_UPLOADS_TOTAL.inc(event='returned')
+
+    def discard(self):
+        with self._lock:
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+            self.path = None
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'received': self.received,
+            'complete': self.complete,
+            'chunk_bytes': UPLOAD_CHUNK_BYTES,
+            'upload_url': url_for('upload_chunk', upload_id=self.id),
+        }
+
+_chunked_uploads = {}
+_chunked_uploads_lock = threading.Lock()
+
+def _purge_expired_uploads():
+    now = time.time()
+    with _chunked_uploads_lock:
+        expired = [upload for upload in _chunked_uploads.values()
+                   if now - upload.updated_at > UPLOAD_SESSION_TTL_SECONDS]
+        for upload in expired:
+            del _chunked_uploads[upload.id]
+    for upload in expired:
+        upload.discard()
+        CHUNKED_UPLOADS_TOTAL.inc(event='expired')
+
+def _get_chunked_upload(upload_id):
+    with _chunked_uploads_lock:
+        return _chunked_uploads.get(upload_id)
+
+@app.route('/api/upload-config', methods=['GET'])
+def upload_config():
+    """How browsers should prepare files before uploading them (see CLIENT_IMAGE_PREP)"""
+    return jsonify({
+        'max_upload_bytes': MAX_FILE_SIZE,
+        'allowed_extensions': sorted(ALLOWED_EXTENSIONS),
+        'image': {
+            'max_side': client_max_image_side(),
+            'margin_padding': MARGIN_CROP_PADDING,
+            'type': CLIENT_IMAGE_TYPE,
+            'quality': CLIENT_IMAGE_QUALITY,
+        },
+        'chunk_bytes': UPLOAD_CHUNK_BYTES,
+        'uploads_url': url_for('create_upload'),
+    })
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a chunked upload of a file (`filename`, `size` in bytes); its chunks go to the returned upload_url"""
+    params = request.get_json(silent=True) or request.form
+    filename = str(params.get('filename') or '')
+    try:
+        size = int(params.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size must be the file size in bytes'}), 400
+    if not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed. Please upload an image or PDF file.'}), 400
+    if not 0 < size <= MAX_FILE_SIZE:
+        return jsonify({'error': f'File size must be between 1 byte and {MAX_FILE_SIZE // (1024 * 1024)}MB'}), 413
+    
+    if _draining.is_set():
+        return shutting_down_response()
+    
+    _purge_expired_uploads()
+    with _chunked_uploads_lock:
+        if len(_chunked_uploads) >= UPLOAD_MAX_SESSIONS:
+            response = jsonify({'error': 'Too many uploads in progress, please retry shortly'})
+            response.status_code = 429
+            response.headers['Retry-After'] = '5'
+            return response
+        upload = ChunkedUpload(upload_filename(filename), size)
+        _chunked_uploads[upload.id] = upload
+    CHUNKED_UPLOADS_TOTAL.inc(event='created')
+    return jsonify(upload.to_dict()), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Where a chunked upload stands: resume by sending the chunk at `received`"""
+    upload = _get_chunked_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload.to_dict())
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append the request body, the chunk starting at ?offset=, to a chunked upload"""
+    upload = _get_chunked_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        offset = int(request.args['offset'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'offset must be the position of the chunk in bytes'}), 400
+    
+    was_complete = upload.complete
+    try:
+        upload.append(offset, request.stream)
+    except UploadBusy:
+        CHUNKED_UPLOADS_TOTAL.inc(event='busy')
+        response = jsonify({'error': 'Another request is sending a chunk of this upload', **upload.to_dict()})
+        response.status_code = 409
+        response.headers['Retry-After'] = '1'
+        return response
+    except UploadOffsetConflict:
+        CHUNKED_UPLOADS_TOTAL.inc(event='offset_conflict')
+        return jsonify({'error': f'Expected the chunk at offset {upload.received}', **upload.to_dict()}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e), **upload.to_dict()}), 400
+    if upload.complete and not was_complete:
+        CHUNKED_UPLOADS_TOTAL.inc(event='completed')
+    return jsonify(upload.to_dict())
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    """Abandon a chunked upload and delete what was received"""
+    with _chunked_uploads_lock:
+        upload = _chunked_uploads.pop(upload_id, None)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    upload.discard()
+    CHUNKED_UPLOADS_TOTAL.inc(event='deleted')
+    return '', 204
+
+# ============================================================
+# Background OCR jobs
+# ============================================================
+
+class OCRJob:
+    """State of one background OCR run; streamed to clients page by page"""
+
+    def __init__(self, filename, is_pdf):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.is_pdf = is_pdf
+        self.status = 'queued'  # queued -> running -> done | failed | cancelled
+        self.page_count = None
+        self.pages = []
+        self.partials = {}  # page_num -> (version, event) for pages still being decoded
+        self.partial_version = 0
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.document = None  # The upload (closed once the job ends)
+        self.ticket = None  # Admission ticket
+        self.cancel_requested = False
+        self.streams = 0  # Clients currently streaming this job
+        self._condition = threading.Condition()
+
+    def _update(self, **changes):
+        with self._condition:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self._condition.notify_all()
+
+    def start(self):
+        self._update(status='running')
+
+    def add_page(self, page_num, page_count, page_text, details):
+        page = {
+            'page': page_num + 1,
+            'page_count': page_count,
+            **details,
+            'text': page_text,
+            'section': format_page_section(page_num, page_text, self.is_pdf),
+        }
+        with self._condition:
+            self.page_count = page_count
+            self.pages.append(page)
+            self.partials.pop(page_num, None)
+            self._condition.notify_all()
+
+    def update_partial(self, page_num, page_count, page_text):
+        """Record the text decoded so far on a page that hasn't finished"""
+        partial = {
+            'page': page_num + 1,
+            'page_count': page_count,
+            'text': page_text,
+            'section': format_page_section(page_num, page_text, self.is_pdf),
+        }
+        with self._condition:
+            if any(page['page'] == page_num + 1 for page in self.pages):
+                return  # A late update for a page that has already finished
+            self.partial_version += 1
+            self.partials[page_num] = (self.partial_version, partial)
+            self._condition.notify_all()
+
+    def finish(self):
+        self._update(status='done', finished_at=time.time())
+
+    def fail(self, error):
+        self._update(status='failed', error=error, finished_at=time.time())
+
+    def request_cancel(self, reason):
+        """Ask the job to stop after its current page; False if it already finished"""
+        with self._condition:
+            if self.finished or self.cancel_requested:
+                return False
+            self.cancel_requested = True
+            self.error = f'Cancelled ({reason})'
+            return True
+
+    def cancelled(self):
+        self._update(status='cancelled', finished_at=time.time())
+
+    def attach_stream(self):
+        with self._condition:
+            self.streams += 1
+
+    def detach_stream(self):
+        """Returns the number of clients still streaming"""
+        with self._condition:
+            self.streams -= 1
+            return self.streams
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def text(self):
+        return join_page_sections([page['section'] for page in self.pages])
+
+    def wait_for_updates(self, since, partial_since, timeout):
+        """Block until there are pages after index `since`, partial text newer than
+        version `partial_since`, or the job finished.
+
+        Returns (new pages, changed partial pages, current partial version, status).
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: len(self.pages) > since or self.partial_version > partial_since or self.finished,
+                timeout=timeout
+            )
+            partials = [partial for version, partial in sorted(self.partials.values(), key=lambda item: item[0])
+                        if version > partial_since]
+            return list(self.pages[since:]), partials, self.partial_version, self.status
+
+    def to_dict(self, include_pages=True):
+        with self._condition:
+            data = {
+                'job_id': self.id,
+                'filename': self.filename,
+                'status': self.status,
+                'pages_done': len(self.pages),
+                'page_count': self.page_count,
+                'error': self.error,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+            }
+            if include_pages:
+                data['pages'] = list(self.pages)
+            if self.status == 'done':
+                data['text'] = self.text()
+        return data
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='ocr-job')
+
+def _purge_expired_jobs():
+    now = time.time()
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items()
+                   if job.finished and now - job.finished_at > JOB_TTL_SECONDS]
+        for job_id in expired:
+            del _jobs[job_id]
+
+def _run_job(job, document, ticket):
+    job.start()
+    log.debug(f"📁 Job {job.id}: processing {job.filename}")
+    try:
+        results = iter_document_text(document, on_text=job.update_partial)
+        try:
+            for page_num, page_count, page_text, details in results:
+                job.add_page(page_num, page_count, page_text, details)
+                if job.cancel_requested:
+                    break
+        finally:
+            results.close()
+        if job.cancel_requested:
+            job.cancelled()
+            log.info(f"🚫 Job {job.id} cancelled after {len(job.pages)} page(s)")
+        else:
+            job.finish()
+            log.debug(f"✅ Job {job.id} complete ({len(job.pages)} page(s))")
+    except Exception as e:
+        log.error(f"❌ Job {job.id} failed: {str(e)}")
+        job.fail(f'OCR extraction failed: {str(e)}')
+    finally:
+        _admission.release(ticket)
+        document.close()
+
+def cancel_job(job, reason):
+    """Stop a job: drop it from the admission queue, or stop it after its current page"""
+    if not job.request_cancel(reason):
+        return False
+    CANCELLED_TOTAL.inc(reason=reason)
+    if job.ticket is not None and _admission.cancel(job.ticket):
+        # Never started, so _run_job won't clean up after it
+        job.cancelled()
+        job.document.close()
+        log.info(f"🚫 Job {job.id} dropped from the queue ({reason})")
+    return True
+
+def _cancel_if_abandoned(job):
+    if job.streams == 0 and not job.finished:
+        cancel_job(job, 'abandoned')
+
+def _get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    file, error_response = validate_upload()
+    if error_response:
+        return error_response
+    languages, error_response = requested_languages()
+    if error_response:
+        return error_response
+    
+    if _draining.is_set():
+        return shutting_down_response()
+    
+    _purge_expired_jobs()
+    
+    with stage_timer('upload_read'):
+        document = read_upload(file, languages)
+    job = OCRJob(document.filename, document.is_pdf)
+    job.document = document
+    
+    # The job starts once admission grants its ticket; until then it is 'queued'
+    cost, priority = estimate_cost(document)
+    try:
+        job.ticket = _admission.submit(
+            client_id(), cost, priority,
+            on_grant=lambda ticket: _job_executor.submit(_run_job, job, document, ticket)
+        )
+    except AdmissionRejected as busy:
+        if isinstance(file, ChunkedUpload):
+            file.put_back(document)  # Keep it for the client's retry
+        document.close()
+        return busy_response(busy)
+    
+    with _jobs_lock:
+        _jobs[job.id] = job
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('job_status', job_id=job.id),
+        'stream_url': url_for('job_stream', job_id=job.id),
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = _get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    include_pages = request.args.get('pages', '1') != '0'
+    return jsonify(job.to_dict(include_pages=include_pages))
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Cancel a queued or running job (a running job stops after its current page)"""
+    job = _get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not cancel_job(job, 'requested'):
+        return jsonify({'error': f'Job already {job.status}'}), 409
+    return jsonify(job.to_dict(include_pages=False)), 202
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def job_stream(job_id):
+    """Stream page results as Server-Sent Events, or NDJSON with ?format=ndjson.
+
+    `page` events carry finished pages; `partial` events carry the text
+    decoded so far on pages still being read (latest state only, not every token).
+    """
+    job = _get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    ndjson = request.args.get('format') == 'ndjson'
+    
+    def encode(event, payload):
+        if ndjson:
+            return json.dumps(dict(payload, event=event)) + "\n"
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    
+    def generate():
+        # When the last client streaming an unfinished job goes away (the
+        # server notices on the next write, at most one keep-alive later),
+        # the job is cancelled unless someone reconnects within JOB_ABANDON_SECONDS
+        job.attach_stream()
+        try:
+            sent = 0
+            partial_version = 0
+            while True:
+                pages, partials, partial_version, status = job.wait_for_updates(sent, partial_version, timeout=15)
+                for page in pages:
+                    yield encode('page', page)
+                sent += len(pages)
+                for partial in partials:
+                    yield encode('partial', partial)
+                if status == 'done':
+                    yield encode('done', job.to_dict(include_pages=False))
+                    return
+                if status in ('failed', 'cancelled'):
+                    yield encode(status, {'error': job.error})
+                    return
+                if not pages and not partials and not ndjson:
+                    yield ": keep-alive\n\n"
+        finally:
+            if job.detach_stream() == 0 and not job.finished and JOB_ABANDON_SECONDS > 0:
+                timer = threading.Timer(JOB_ABANDON_SECONDS, _cancel_if_abandoned, (job,))
+                timer.daemon = True
+                timer.start()
+    
+    mimetype = 'application/x-ndjson' if ndjson else 'text/event-stream'
+    return Response(generate(), mimetype=mimetype, headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Don't let nginx buffer the stream
+    })
+
+# ============================================================
+# Graceful shutdown
+# ============================================================
+
+_draining = threading.Event()
+_drain_thread = None
+_drain_lock = threading.Lock()
+
+def _drain_work():
+    deadline = time.monotonic() + SHUTDOWN_DRAIN_SECONDS
+    while time.monotonic() < deadline:
+        admission = _admission.stats()
+        if admission['running'] == 0 and admission['queued'] == 0:
+            log.info("✅ Drained, no OCR work left")
+            return
+        time.sleep(0.5)
+    unfinished = [job for job in list(_jobs.values()) if not job.finished]
+    log.warning(f"⚠️  Drain timed out after {SHUTDOWN_DRAIN_SECONDS:.0f}s, cancelling {len(unfinished)} job(s)")
+    for job in unfinished:
+        cancel_job(job, 'shutdown')
+
+def begin_drain():
+    """Stop taking new OCR work and let queued and running work finish in the background.
+
+    New uploads get 503 and /api/ready turns 503 at once. Jobs still
+    unfinished SHUTDOWN_DRAIN_SECONDS later are cancelled.
+    """
+    global _drain_thread
+    with _drain_lock:
+        if _drain_thread is not None:
+            return
+        _draining.set()
+        admission = _admission.stats()
+        log.info(f"🛑 Draining: {admission['running']} running, {admission['queued']} queued "
+                 f"(up to {SHUTDOWN_DRAIN_SECONDS:.0f}s)")
+        _drain_thread = threading.Thread(target=_drain_work, name='ocr-drain', daemon=True)
+        _drain_thread.start()
+
+def drain():
+    """begin_drain() and block until the drain has finished or timed out"""
+    begin_drain()
+    _drain_thread.join()
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    endpoint = request.endpoint or 'unmatched'
+    REQUESTS_TOTAL.inc(endpoint=endpoint, status=response.status_code)
+    if 'request_start' in g:
+        # Streaming responses (SSE) are measured to the first byte, not to the end of the stream
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+def _runtime_gauges():
+    gauges = []
+    batchers = {name: engine.batcher.stats() for name, engine in _engines.items()}
+    gauges.append(('ocr_batch_queue_depth', 'Images waiting in each engine\'s micro-batch queue',
+                   [({'engine': engine}, stats['queue_depth']) for engine, stats in batchers.items()]))
+    cache = _ocr_cache.stats()
+    gauges.append(('ocr_cache_bytes', 'Bytes held by the in-memory OCR result cache', [({}, cache['bytes'])]))
+    gauges.append(('ocr_cache_entries', 'Entries in the in-memory OCR result cache', [({}, cache['entries'])]))
+    gauges.append(('ocr_cache_hit_ratio', 'OCR result cache hit ratio since start', [({}, cache['hit_rate'])]))
+    readers = _easyocr_engine.readers.stats()
+    gauges.append(('ocr_easyocr_readers_loaded', 'EasyOCR readers (language sets) currently loaded',
+                   [({}, len(readers['readers']))]))
+    gauges.append(('ocr_easyocr_reader_bytes', 'Recognizer weight bytes held by loaded EasyOCR readers',
+                   [({}, readers['bytes'])]))
+    with _readiness_lock:
+        state = _readiness['state']
+    gauges.append(('ocr_ready', '1 when the server is ready to take OCR traffic',
+                   [({}, 1 if state in ('lazy', 'ready') else 0)]))
+    gauges.append(('ocr_deepseek_circuit_open', '1 while the DeepSeek-OCR circuit breaker is open or half-open',
+                   [({}, 0 if _deepseek_breaker.state == 'closed' else 1)]))
+    gauges.append(('ocr_escalation_tokens', 'Cascade escalations currently affordable',
+                   [({}, _escalation_budget.stats()['tokens'])]))
+    admission = _admission.stats()
+    gauges.append(('ocr_admission_running_mpx', 'Estimated megapixels of OCR work admitted and running',
+                   [({}, admission['running_mpx'])]))
+    gauges.append(('ocr_admission_queued_mpx', 'Estimated megapixels of OCR work waiting for admission',
+                   [({}, admission['queued_mpx'])]))
+    gauges.append(('ocr_admission_queued', 'Requests waiting for admission, by lane',
+                   [({'lane': 'priority'}, admission['queued_priority']),
+                    ({'lane': 'fair'}, admission['queued'] - admission['queued_priority'])]))
+    gauges.append(('ocr_jobs_active', 'Background jobs queued or running',
+                   [({}, sum(1 for job in list(_jobs.values()) if not job.finished))]))
+    gauges.append(('ocr_chunked_uploads_open', 'Chunked uploads started and not yet used, deleted or expired',
+                   [({}, len(_chunked_uploads))]))
+    if _inference_pool is not None:
+        pool = _inference_pool.stats()
+        gauges.append(('ocr_inference_workers_alive', 'Live DeepSeek-OCR worker processes', [({}, pool['alive'])]))
+        gauges.append(('ocr_inference_in_flight', 'Images being OCR\'d by worker processes', [({}, pool['in_flight'])]))
+    return gauges
+
+_gauge_callbacks.append(_runtime_gauges)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint: request, stage and model-load metrics plus live gauges"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until a preloaded engine has loaded and warmed up.
+
+    Without MODEL_PRELOAD the engine loads on first use and this always
+    reports ready (state "lazy"). It is also 503 while the server drains for
+    shutdown.
+    """
+    with _readiness_lock:
+        readiness = dict(_readiness)
+    readiness['draining'] = _draining.is_set()
+    readiness['ready'] = readiness['state'] in ('lazy', 'ready') and not readiness['draining']
+    return jsonify(readiness), 200 if readiness['ready'] else 503
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'ok', 'message': 'Server is running'})
+    return jsonify({
+        'status': 'ok',
+        'message': 'Server is running',
+        'batching': {name: engine.batcher.stats() for name, engine in _engines.items()},
+        'engines': {name: engine.capabilities() for name, engine in _engines.items()},
+        'cache': _ocr_cache.stats(),
+        'easyocr_readers': _easyocr_engine.readers.stats(),
+        'routing': {
+            'mode': OCR_ROUTING,
+            'deepseek_circuit': _deepseek_breaker.stats(),
+            'escalation_budget': _escalation_budget.stats() if OCR_ROUTING == 'cascade' else None,
+        },
+        'inference_workers': _inference_pool.stats() if _inference_pool is not None else None,
+        'admission': _admission.stats(),
+        'jobs': {
+            'total': len(_jobs),
+            'active': sum(1 for job in list(_jobs.values()) if not job.finished),
+        },
+    })
 
 if __name__ == '__main__':
     print("=" * 60)
@@ -519,6 +4503,12 @@ if __name__ == '__main__':
     print("\n📌 Fallback: EasyOCR")
     print("   Automatically used if DeepSeek-OCR fails to load")
     print("=" * 60)
-    print("\n🌐 Access at: http://localhost:5000")
+    port = int(os.getenv('PORT', '5000'))
+    print(f"\n🌐 Access at: http://localhost:{port}")
+    print("   Development server; use `python serve.py` in production")
     print("=" * 60 + "\n")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # The debug reloader runs this file in a parent and a child process; only
+    # the child (WERKZEUG_RUN_MAIN) serves requests, so only it preloads
+    if MODEL_PRELOAD and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_model_preload()
+    app.run(debug=True, host=os.getenv('HOST', '0.0.0.0'), port=port)
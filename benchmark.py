@@ -0,0 +1,554 @@
+"""
+Reproducible OCR benchmark on synthetic documents
+
+Renders deterministic test pages (known text at a given DPI and noise level),
+multi-page scanned PDFs built from them and digitally-born PDFs with a real
+text layer, then OCRs them with each engine
+in its own Python process. Two paths are measured:
+
+  direct  extract_text_from_image() on every image (optionally concurrent)
+  api     POST /api/ocr through the Flask test client, images and PDFs
+
+For each engine and path the report holds pages/sec, p50/p95/p99 latency,
+mean character error rate (CER) and the process's peak RSS, plus how many
+pixels image preparation (IMAGE_PREP) saved. --prep-compare runs every engine
+with and without image preparation to show its accuracy impact.
+--runtime-compare runs the EasyOCR-based engines on both EasyOCR runtimes
+(PyTorch and ONNX Runtime, EASYOCR_RUNTIME). Results are written as JSON;
+pass --compare to diff against an earlier report.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --engines easyocr --images 10 --pdfs 2 --pdf-pages 3 --dpi 150 --noise 0.08
+    python benchmark.py --output after.json --compare before.json
+    python benchmark.py --prep-compare --dpi 300
+    python benchmark.py --engines easyocr --runtime-compare
+    python benchmark.py --save-samples benchmark_samples
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_LINES = [
+    "INVOICE No. 2024-0117",
+    "Date: 14 March 2024",
+    "Bill to: Northwind Traders Ltd.",
+    "Qty  Description            Amount",
+    "3    Paper A4 (500 sheets)   $24.90",
+    "1    Toner cartridge 85A     $61.50",
+    "Subtotal: $86.40  Tax: $6.91",
+    "Total due within 30 days: $93.31",
+    "The quick brown fox jumps over the lazy dog.",
+    "Please reference the invoice number with payment.",
+    "Shipping address: 221B Baker Street, London",
+    "Order reference: PO-55821 / Dept. 7",
+    "Payment terms: net 30, 2% discount within 10 days",
+    "All prices include VAT where applicable.",
+]
+
+PAGE_WIDTH_INCHES = 8.5
+FONT_POINTS = 14
+
+
+def load_font(size):
+    from PIL import ImageFont
+    for name in ("DejaVuSans.ttf", "arial.ttf", "Arial.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def render_page(lines, dpi=150, noise=0.0, rng=None):
+    """Render `lines` as a scanned-looking page at `dpi`.
+
+    `noise` (0-1) adds Gaussian sensor noise with that standard deviation (as
+    a fraction of full scale) and a small random skew, so results stay
+    deterministic for a given rng seed.
+    """
+    from PIL import Image, ImageDraw
+    import numpy as np
+
+    rng = rng or random.Random(0)
+    scale = dpi / 72
+    font = load_font(round(FONT_POINTS * scale))
+    line_height = round(FONT_POINTS * scale * 1.8)
+    margin = round(0.5 * dpi)
+
+    image = Image.new('RGB', (round(PAGE_WIDTH_INCHES * dpi), 2 * margin + line_height * len(lines)), 'white')
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        draw.text((margin, margin + index * line_height), line, fill='black', font=font)
+
+    if noise > 0:
+        image = image.rotate(rng.uniform(-1.5, 1.5) * noise * 10, resample=Image.BICUBIC, fillcolor='white')
+        pixels = np.asarray(image, dtype=np.float32)
+        generator = np.random.default_rng(rng.randrange(2 ** 32))
+        pixels += generator.normal(0, noise * 255, pixels.shape)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return image
+
+
+def make_samples(count, seed=1234, dpi=150, noise=0.0, lines_per_page=5):
+    """Render `count` deterministic pages; returns [(PIL image, ground truth)]"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(count):
+        lines = rng.sample(SAMPLE_LINES, k=lines_per_page)
+        samples.append((render_page(lines, dpi, noise, rng), "\n".join(lines)))
+    return samples
+
+
+def make_pdf(samples, dpi=150):
+    """Build a scanned PDF (one image per page) from samples; returns PDF bytes"""
+    import fitz
+
+    pdf = fitz.open()
+    for image, _ in samples:
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        width, height = image.size
+        page = pdf.new_page(width=width * 72 / dpi, height=height * 72 / dpi)
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    data = pdf.tobytes()
+    pdf.close()
+    return data
+
+
+def make_text_pdf(truths):
+    """Build a digitally-born PDF (embedded text, no images) with one page per ground truth"""
+    import fitz
+
+    pdf = fitz.open()
+    for truth in truths:
+        page = pdf.new_page(width=PAGE_WIDTH_INCHES * 72, height=11 * 72)
+        for index, line in enumerate(truth.splitlines()):
+            page.insert_text((36, 36 + FONT_POINTS * 1.8 * (index + 1)), line, fontsize=FONT_POINTS)
+    data = pdf.tobytes()
+    pdf.close()
+    return data
+
+
+def make_documents(args):
+    """The benchmark corpus: standalone images and multi-page PDFs, all with ground truth.
+
+    Returns (images, pdfs) where images are (PIL image, truth) and pdfs are
+    (filename, PDF bytes, truth, page count).
+    """
+    images = make_samples(args.images, seed=args.seed, dpi=args.dpi, noise=args.noise)
+    pdfs = []
+    for index in range(args.pdfs):
+        pages = make_samples(args.pdf_pages, seed=args.seed + 1 + index, dpi=args.dpi, noise=args.noise)
+        pdfs.append((f'scanned_{index}.pdf', make_pdf(pages, args.dpi),
+                     "\n".join(truth for _, truth in pages), len(pages)))
+    for index in range(args.text_pdfs):
+        pages = make_samples(args.pdf_pages, seed=args.seed + 101 + index, dpi=args.dpi)
+        truths = [truth for _, truth in pages]
+        pdfs.append((f'digital_{index}.pdf', make_text_pdf(truths), "\n".join(truths), len(truths)))
+    return images, pdfs
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def normalize(text):
+    # Drop the "--- Page N ---" headers the API adds between PDF pages
+    return " ".join(re.sub(r'^--- Page \d+ ---$', '', text, flags=re.MULTILINE).split())
+
+
+def cer(hypothesis, reference):
+    reference = normalize(reference)
+    if not reference:
+        return 0.0
+    return levenshtein(normalize(hypothesis), reference) / len(reference)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KB on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+        except Exception:
+            return None
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile (no interpolation, so small runs stay readable)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize_runs(runs, pages, wall_seconds):
+    latencies = [run['seconds'] for run in runs]
+    return {
+        'requests': len(runs),
+        'pages': pages,
+        'wall_seconds': round(wall_seconds, 3),
+        'pages_per_sec': round(pages / wall_seconds, 3) if wall_seconds else None,
+        'latency_p50': round(percentile(latencies, 0.50), 3) if latencies else None,
+        'latency_p95': round(percentile(latencies, 0.95), 3) if latencies else None,
+        'latency_p99': round(percentile(latencies, 0.99), 3) if latencies else None,
+        'mean_cer': round(sum(run['cer'] for run in runs) / len(runs), 4) if runs else None,
+        'errors': sum(1 for run in runs if run.get('error')),
+        'runs': runs,
+    }
+
+
+def timed_ocr(app, image, truth):
+    start = time.perf_counter()
+    try:
+        text = app.extract_text_from_image(image)
+        error = None
+    except Exception as e:
+        text, error = "", str(e)
+    run = {'seconds': round(time.perf_counter() - start, 4), 'cer': round(cer(text, truth), 4)}
+    if error:
+        run['error'] = error
+    return run
+
+
+def run_direct(app, images, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        runs = list(executor.map(lambda sample: timed_ocr(app, *sample), images))
+    return summarize_runs(runs, len(images), time.perf_counter() - start)
+
+
+def run_api(app, images, pdfs):
+    client = app.app.test_client()
+    uploads = []
+    for index, (image, truth) in enumerate(images):
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        uploads.append((f'sample_{index}.png', buffer.getvalue(), truth, 1))
+    for filename, data, truth, page_count in pdfs:
+        uploads.append((filename, data, truth, page_count))
+
+    runs = []
+    start = time.perf_counter()
+    for filename, data, truth, page_count in uploads:
+        request_start = time.perf_counter()
+        response = client.post('/api/ocr', data={'file': (io.BytesIO(data), filename)},
+                               content_type='multipart/form-data')
+        payload = response.get_json(silent=True) or {}
+        run = {
+            'file': filename,
+            'pages': page_count,
+            'seconds': round(time.perf_counter() - request_start, 4),
+            'cer': round(cer(payload.get('text', ''), truth), 4),
+            'paths': [page['path'] for page in payload.get('pages', [])],
+        }
+        if response.status_code != 200 or not payload.get('success'):
+            # A page failing midway still ends a streamed 200 with success: false
+            run['error'] = payload.get('error', f'HTTP {response.status_code}')
+        runs.append(run)
+    return summarize_runs(runs, sum(page_count for *_, page_count in uploads), time.perf_counter() - start)
+
+
+def run_engine(engine, args):
+    """Worker: load `engine` (an OCR_ROUTING mode) in this process and benchmark both paths"""
+    # Measure the engines, not the result cache
+    os.environ['OCR_CACHE_MAX_MB'] = '0'
+    os.environ['OCR_CACHE_DIR'] = ''
+    os.environ['MODEL_PRELOAD'] = '0'
+    os.environ['OCR_ROUTING'] = engine
+
+    import app
+
+    load_start = time.time()
+    if engine == 'deepseek':
+        loaded = app.get_engine('deepseek').load()
+    else:
+        loaded = app.get_engine('easyocr').load()
+        if engine == 'cascade':
+            # Escalation target; the cascade still runs (never escalating) if it doesn't load
+            app.get_engine('deepseek').load()
+    load_seconds = time.time() - load_start
+    if not loaded:
+        return {'engine': engine, 'error': f'{engine} failed to load'}
+
+    images, pdfs = make_documents(args)
+
+    # One untimed page so first-call kernel/allocator setup is not in the numbers
+    warmup_start = time.time()
+    app.extract_text_from_image(render_page(["Warm-up"], args.dpi))
+    warmup_seconds = time.time() - warmup_start
+    pixel_stages = ('input', 'prepared', 'pdf_fixed_zoom', 'pdf_rendered')
+    pixels_before = {stage: app.PIXELS_TOTAL.value(stage=stage) for stage in pixel_stages}
+
+    report = {
+        'engine': engine,
+        'image_prep': app.IMAGE_PREP,
+        'easyocr_runtime': None if engine == 'deepseek' else easyocr_runtime(app),
+        'load_seconds': round(load_seconds, 1),
+        'warmup_seconds': round(warmup_seconds, 2),
+        'direct': run_direct(app, images, args.concurrency),
+        'api': run_api(app, images, pdfs),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    pixels = {stage: app.PIXELS_TOTAL.value(stage=stage) - pixels_before[stage] for stage in pixel_stages}
+    pixels['prepared_saved'] = round(1 - pixels['prepared'] / pixels['input'], 4) if pixels['input'] else 0.0
+    pixels['pdf_render_saved'] = (round(1 - pixels['pdf_rendered'] / pixels['pdf_fixed_zoom'], 4)
+                                  if pixels['pdf_fixed_zoom'] else 0.0)
+    report['pixels'] = pixels
+    # A DeepSeek run whose circuit opened mid-way partly measured EasyOCR; flag it rather than mislabel it
+    report['fell_back_to_easyocr'] = engine == 'deepseek' and app._deepseek_breaker.trips > 0
+    if engine == 'cascade':
+        report['routing'] = {decision: app.ROUTING_TOTAL.value(decision=decision)
+                             for decision in ('confident', 'escalated', 'budget_exhausted',
+                                              'circuit_open', 'escalation_failed')}
+    return report
+
+
+def easyocr_runtime(app):
+    """The runtime EasyOCR's recognizer really ran on ('onnx' can fall back to 'torch' if the export failed)"""
+    reader = app.get_easyocr_reader()
+    return 'onnx' if isinstance(reader.recognizer, app.OnnxModule) else 'torch'
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    knobs = ('CPU_PRECISION', 'INFERENCE_WORKERS', 'BATCH_MAX_SIZE', 'BATCH_MAX_WAIT_MS',
+             'PDF_RASTER_WORKERS', 'PDF_PREFETCH_PAGES', 'IMAGE_PREP', 'PDF_MIN_RENDER_ZOOM',
+             'PDF_MAX_RENDER_ZOOM', 'OCR_MAX_IMAGE_SIDE', 'PDF_TEXT_LAYER', 'LAYOUT_MODE', 'LAYOUT_MAX_BLOCKS',
+             'ESCALATION_MIN_CONFIDENCE', 'ESCALATION_BUDGET', 'ESCALATION_BURST',
+             'EASYOCR_RUNTIME', 'EASYOCR_ONNX_THREADS')
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {name: os.environ[name] for name in knobs if name in os.environ},
+    }
+
+
+def run_label(report):
+    label = report['engine']
+    if report.get('easyocr_runtime') == 'onnx':
+        label += '/onnx'
+    if not report.get('image_prep', True):
+        label += '/noprep'
+    return label
+
+
+def print_comparison(summaries, previous_path):
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {run_label(e): e for e in json.load(f).get('engines', []) if 'error' not in e}
+
+    print(f"\nΔ vs {previous_path}")
+    print(f"{'run':<16} {'path':<7} {'pages/s':>16} {'p95 s':>16} {'CER':>18}")
+    for summary in summaries:
+        before = previous.get(run_label(summary))
+        if before is None:
+            continue
+        for path in ('direct', 'api'):
+            new, old = summary[path], before.get(path, {})
+            print(f"{run_label(summary):<16} {path:<7} "
+                  f"{_delta(old.get('pages_per_sec'), new['pages_per_sec']):>16} "
+                  f"{_delta(old.get('latency_p95'), new['latency_p95']):>16} "
+                  f"{_delta(old.get('mean_cer'), new['mean_cer']):>18}")
+
+
+def print_prep_impact(summaries):
+    """Pixels saved and accuracy/throughput change from IMAGE_PREP, per engine"""
+    runs = {(s['engine'], s.get('easyocr_runtime'), s['image_prep']): s for s in summaries}
+    print("\nImage preparation impact (prep vs. no prep)")
+    print(f"{'engine':<12} {'pixels':>8} {'PDF render':>10} {'pages/s':>16} {'CER':>18}")
+    for (engine, runtime, image_prep), prepared in runs.items():
+        baseline = runs.get((engine, runtime, False))
+        if not image_prep or baseline is None:
+            continue
+        if runtime == 'onnx':
+            engine += '/onnx'
+        pixels_saved = 1 - prepared['pixels']['prepared'] / (baseline['pixels']['prepared'] or 1)
+        print(f"{engine:<12} {-pixels_saved:>+8.0%} {-prepared['pixels']['pdf_render_saved']:>+10.0%} "
+              f"{_delta(baseline['api']['pages_per_sec'], prepared['api']['pages_per_sec']):>16} "
+              f"{_delta(baseline['api']['mean_cer'], prepared['api']['mean_cer']):>18}")
+
+
+def print_runtime_impact(summaries):
+    """Throughput and accuracy of ONNX Runtime against PyTorch, per EasyOCR-based engine"""
+    runs = {(s['engine'], s['image_prep'], s.get('easyocr_runtime')): s for s in summaries}
+    print("\nEasyOCR runtime impact (ONNX Runtime vs. PyTorch)")
+    print(f"{'engine':<9} {'path':<7} {'pages/s':>16} {'p95 s':>16} {'CER':>18} {'load s':>14}")
+    for (engine, image_prep, runtime), onnx in runs.items():
+        torch_run = runs.get((engine, image_prep, 'torch'))
+        if runtime != 'onnx' or torch_run is None:
+            continue
+        for path in ('direct', 'api'):
+            print(f"{engine:<9} {path:<7} "
+                  f"{_delta(torch_run[path]['pages_per_sec'], onnx[path]['pages_per_sec']):>16} "
+                  f"{_delta(torch_run[path]['latency_p95'], onnx[path]['latency_p95']):>16} "
+                  f"{_delta(torch_run[path]['mean_cer'], onnx[path]['mean_cer']):>18} "
+                  f"{_delta(torch_run['load_seconds'], onnx['load_seconds']):>14}")
+
+
+def _delta(old, new):
+    if old is None or new is None:
+        return f"{new}"
+    change = f" ({(new - old) / old:+.0%})" if old else ""
+    return f"{old}→{new}{change}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engines', default='deepseek,easyocr',
+                        help='comma-separated engines to benchmark: deepseek, easyocr, cascade (OCR_ROUTING modes)')
+    parser.add_argument('--images', type=int, default=8, help='number of single-image documents')
+    parser.add_argument('--pdfs', type=int, default=2, help='number of multi-page scanned PDFs')
+    parser.add_argument('--text-pdfs', type=int, default=1,
+                        help='number of multi-page digitally-born PDFs (text layer, no OCR needed)')
+    parser.add_argument('--pdf-pages', type=int, default=3, help='pages per PDF')
+    parser.add_argument('--dpi', type=int, default=150, help='rendering resolution of the synthetic pages')
+    parser.add_argument('--noise', type=float, default=0.05, help='scan noise level, 0 (clean) to ~0.2 (rough)')
+    parser.add_argument('--seed', type=int, default=1234, help='seed for page content and noise')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='parallel extract_text_from_image() callers in the direct path')
+    parser.add_argument('--output', default='benchmark_report.json', help='where to write the JSON report')
+    parser.add_argument('--compare', help='earlier report to print deltas against')
+    parser.add_argument('--save-samples', metavar='DIR', help='also write the generated documents to DIR')
+    parser.add_argument('--prep-compare', action='store_true',
+                        help='run every engine with and without image preparation (IMAGE_PREP)')
+    parser.add_argument('--runtime-compare', action='store_true',
+                        help='run the EasyOCR-based engines on PyTorch and on ONNX Runtime (EASYOCR_RUNTIME)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print("__REPORT__" + json.dumps(run_engine(args.worker, args)))
+        return
+
+    if args.save_samples:
+        os.makedirs(args.save_samples, exist_ok=True)
+        images, pdfs = make_documents(args)
+        for index, (image, truth) in enumerate(images):
+            image.save(os.path.join(args.save_samples, f'sample_{index}.png'))
+            with open(os.path.join(args.save_samples, f'sample_{index}.png.txt'), 'w', encoding='utf-8') as f:
+                f.write(truth)
+        for filename, data, truth, _ in pdfs:
+            with open(os.path.join(args.save_samples, filename), 'wb') as f:
+                f.write(data)
+            with open(os.path.join(args.save_samples, f'{filename}.txt'), 'w', encoding='utf-8') as f:
+                f.write(truth)
+        print(f"📁 Samples written to {args.save_samples}")
+
+    engines = [e.strip() for e in args.engines.split(',') if e.strip()]
+    worker_args = ['--images', str(args.images), '--pdfs', str(args.pdfs), '--text-pdfs', str(args.text_pdfs),
+                   '--pdf-pages', str(args.pdf_pages),
+                   '--dpi', str(args.dpi), '--noise', str(args.noise), '--seed', str(args.seed),
+                   '--concurrency', str(args.concurrency)]
+
+    print("=" * 60)
+    print("OCR benchmark")
+    print("=" * 60)
+
+    # (engine, environment overrides)
+    runs = []
+    for engine in engines:
+        for prep in (('1', '0') if args.prep_compare else (None,)):
+            runtimes = ('torch', 'onnx') if args.runtime_compare and engine != 'deepseek' else (None,)
+            for runtime in runtimes:
+                overrides = {}
+                if prep is not None:
+                    overrides['IMAGE_PREP'] = prep
+                if runtime is not None:
+                    overrides['EASYOCR_RUNTIME'] = runtime
+                runs.append((engine, overrides))
+
+    summaries = []
+    for engine, overrides in runs:
+        label = engine
+        if overrides.get('EASYOCR_RUNTIME') == 'onnx':
+            label += '/onnx'
+        if overrides.get('IMAGE_PREP') == '0':
+            label += '/noprep'
+        print(f"\n🔄 Benchmarking {label}...")
+        env = dict(os.environ, PYTHONIOENCODING='utf-8', **overrides)
+        completed = subprocess.run(
+            [sys.executable, __file__, '--worker', engine] + worker_args,
+            capture_output=True, text=True, encoding='utf-8', errors='replace', env=env
+        )
+        report_lines = [line for line in completed.stdout.splitlines() if line.startswith("__REPORT__")]
+        if completed.returncode != 0 or not report_lines:
+            print(f"❌ {label} failed:\n{completed.stderr[-2000:]}")
+            summaries.append({'engine': engine, 'error': 'worker process failed'})
+            continue
+
+        report = json.loads(report_lines[-1][len("__REPORT__"):])
+        summaries.append(report)
+        if 'error' in report:
+            print(f"❌ {label}: {report['error']}")
+            continue
+        if overrides.get('EASYOCR_RUNTIME') == 'onnx' and report['easyocr_runtime'] != 'onnx':
+            print(f"⚠️  {label} ran EasyOCR on PyTorch: the ONNX Runtime export failed (see its log)")
+        if report['fell_back_to_easyocr']:
+            print(f"⚠️  {label} fell back to EasyOCR during the run; its numbers are mixed")
+        print(f"✓ {label}: loaded in {report['load_seconds']}s, peak RSS {report['peak_rss_mb']} MB, "
+              f"image prep saved {report['pixels']['prepared_saved']:.0%} of pixels")
+
+    print("\n" + "=" * 60)
+    print(f"{'run':<16} {'path':<7} {'pages/s':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'CER':>7} {'errors':>6}")
+    for summary in summaries:
+        if 'error' in summary:
+            continue
+        for path in ('direct', 'api'):
+            result = summary[path]
+            print(f"{run_label(summary):<16} {path:<7} {result['pages_per_sec']:>8} {result['latency_p50']:>7} "
+                  f"{result['latency_p95']:>7} {result['latency_p99']:>7} {result['mean_cer']:>7.2%} "
+                  f"{result['errors']:>6}")
+    print("=" * 60)
+
+    if args.prep_compare:
+        print_prep_impact([s for s in summaries if 'error' not in s])
+
+    if args.runtime_compare:
+        print_runtime_impact([s for s in summaries if 'error' not in s])
+
+    if args.compare:
+        print_comparison([s for s in summaries if 'error' not in s], args.compare)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'corpus': {'images': args.images, 'pdfs': args.pdfs, 'text_pdfs': args.text_pdfs,
+                       'pdf_pages': args.pdf_pages, 'dpi': args.dpi, 'noise': args.noise, 'seed': args.seed},
+            'concurrency': args.concurrency,
+            'environment': environment_info(),
+            'engines': summaries,
+        }, f, indent=2)
+    print(f"\n📄 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n❌ Cancelled by user.")
@@ -0,0 +1,248 @@
+"""
+Bulk offline OCR of directories, globs and zip/tar archives
+
+Runs every image and PDF through the same pipeline as /api/ocr, inside this
+process, so there is no HTTP and no upload size limit. Several documents are
+processed at a time. One JSON line per file is appended to the output as
+soon as that file is done.
+
+Rerunning with the same output file skips every file already recorded, so
+an interrupted run picks up where it stopped. Files that failed are retried
+unless --skip-failed is given. A retried file gets a second line; the last
+line for a source wins.
+
+Each line looks like:
+    {"source": ..., "filename": ..., "status": "ok", "text": ..., "pages": [...], "seconds": ...}
+    {"source": ..., "filename": ..., "status": "failed", "error": ..., "seconds": ...}
+
+`source` is the file's absolute path, or "<archive path>::<member>" for
+files inside archives.
+
+Usage:
+    python bulk_ocr.py scans/ --output scans.jsonl
+    python bulk_ocr.py "archive/**/*.tif" batch1.zip batch2.tar.gz --output results.jsonl --workers 8
+    python bulk_ocr.py scans/ --output scans.jsonl --routing easyocr
+    python bulk_ocr.py scans_fr/ --output scans_fr.jsonl --routing easyocr --languages fr,en
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def expand_spec(spec):
+    """File paths named by one command-line argument: a file, a directory (recursively) or a glob"""
+    if os.path.isdir(spec):
+        for root, dirs, files in os.walk(spec):
+            dirs.sort()
+            for name in sorted(files):
+                yield os.path.join(root, name)
+    elif os.path.isfile(spec):
+        yield spec
+    else:
+        matches = sorted(glob.glob(spec, recursive=True))
+        if not matches:
+            print(f"⚠️  Nothing matches {spec}")
+        for match in matches:
+            if os.path.isdir(match):
+                yield from expand_spec(match)
+            else:
+                yield match
+
+
+def iter_archive(path):
+    """Yield (source, filename, load) for every file inside a zip or tar archive.
+
+    load(app) must be called before the generator is advanced: tar archives
+    (possibly compressed) can only be read front to back.
+    """
+    archive_path = os.path.abspath(path)
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for info in sorted(archive.infolist(), key=lambda info: info.filename):
+                if not info.is_dir():
+                    filename = os.path.basename(info.filename)
+                    yield (f"{archive_path}::{info.filename}", filename,
+                           lambda app, info=info, filename=filename: _spool_member(app, filename, archive.open(info)))
+    else:
+        with tarfile.open(path, 'r:*') as archive:
+            for member in archive:
+                if member.isfile():
+                    filename = os.path.basename(member.name)
+                    yield (f"{archive_path}::{member.name}", filename,
+                           lambda app, member=member, filename=filename:
+                               _spool_member(app, filename, archive.extractfile(member)))
+
+
+def iter_inputs(specs):
+    """Yield (source, filename, load) for every file named by `specs`, looking inside archives.
+
+    load(app) returns the file as an app.UploadedDocument. Files on disk are
+    read from where they are; archive members are copied to a spool file.
+    """
+    for spec in specs:
+        for path in expand_spec(spec):
+            if is_archive(path):
+                yield from iter_archive(path)
+            else:
+                yield (os.path.abspath(path), os.path.basename(path),
+                       lambda app, path=path: app.UploadedDocument(os.path.basename(path), path=path, owns_path=False))
+
+
+def _spool_member(app, filename, member):
+    """Copy an archive member to a spool file (deleted when the document is closed)"""
+    import shutil
+    import tempfile
+    fd, path = tempfile.mkstemp(prefix='bulk-', suffix=f"_{app.upload_filename(filename)}",
+                                dir=app.app.config['UPLOAD_FOLDER'])
+    try:
+        with os.fdopen(fd, 'wb') as spool, member:
+            shutil.copyfileobj(member, spool, 1024 * 1024)
+    except Exception:
+        os.remove(path)
+        raise
+    return app.UploadedDocument(filename, path=path)
+
+
+def load_done(path, skip_failed):
+    """Sources already recorded in the output file.
+
+    A partial last line (the process died mid-write) is cut off so appended
+    records start on a fresh line.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rb+') as f:
+        content = f.read()
+        end = content.rfind(b"\n") + 1
+        if end < len(content):
+            f.truncate(end)
+    for line in content[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get('status') == 'ok' or skip_failed:
+            done.add(record.get('source'))
+    return done
+
+
+def ocr_file(app, source, filename, document):
+    """OCR one document the way /api/ocr does, close it and return its output record"""
+    start = time.time()
+    record = {'source': source, 'filename': filename}
+    try:
+        sections = []
+        pages = []
+        for page_num, _, page_text, details in app.iter_document_text(document):
+            sections.append(app.format_page_section(page_num, page_text, document.is_pdf))
+            pages.append(dict(details, page=page_num + 1))
+        record.update(status='ok', text=app.join_page_sections(sections), pages=pages)
+    except Exception as e:
+        record.update(status='failed', error=str(e))
+    finally:
+        document.close()
+    record['seconds'] = round(time.time() - start, 2)
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='files, directories, globs (quote them) or zip/tar archives')
+    parser.add_argument('--output', required=True, help='JSONL file to append results to (and resume from)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='documents processed at once (their pages share inference batches)')
+    parser.add_argument('--routing', choices=('deepseek', 'easyocr', 'cascade'),
+                        help='engine routing (default: OCR_ROUTING from .env)')
+    parser.add_argument('--languages',
+                        help='comma-separated EasyOCR language codes (default: EASYOCR_LANGUAGES from .env)')
+    parser.add_argument('--skip-failed', action='store_true', help='do not retry files recorded as failed')
+    args = parser.parse_args()
+
+    if args.routing:
+        os.environ['OCR_ROUTING'] = args.routing
+    if args.languages:
+        os.environ['EASYOCR_LANGUAGES'] = args.languages
+    import app
+
+    done = load_done(args.output, args.skip_failed)
+    if done:
+        print(f"🔄 Resuming: {len(done)} file(s) already in {args.output}")
+
+    counts = {'ok': 0, 'failed': 0, 'already_done': 0, 'unsupported': 0}
+    start = time.time()
+
+    def write(futures):
+        for future in futures:
+            record = future.result()
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            counts[record['status']] += 1
+            if record['status'] == 'ok':
+                print(f"✓ {record['source']} ({len(record['pages'])} page(s), {record['seconds']}s)")
+            else:
+                print(f"❌ {record['source']}: {record['error']}")
+
+    with open(args.output, 'a', encoding='utf-8') as output, \
+            ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix='bulk-ocr') as pool:
+        in_flight = set()
+        try:
+            for source, filename, load in iter_inputs(args.inputs):
+                if source in done:
+                    counts['already_done'] += 1
+                    continue
+                if not app.allowed_file(filename):
+                    counts['unsupported'] += 1
+                    continue
+                # Only a couple of documents per worker are queued ahead. Documents
+                # are opened from disk (archive members from a spool file), so
+                # memory doesn't grow with file size
+                while len(in_flight) >= args.workers * 2:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    write(finished)
+                try:
+                    document = load(app)
+                except Exception as e:
+                    output.write(json.dumps({'source': source, 'filename': filename, 'status': 'failed',
+                                             'error': f"Could not read file: {e}", 'seconds': 0}) + "\n")
+                    output.flush()
+                    counts['failed'] += 1
+                    continue
+                future = pool.submit(ocr_file, app, source, filename, document)
+                # ocr_file() closes the document; one cancelled before it ran (Ctrl+C) is closed here
+                future.add_done_callback(lambda future, document=document: future.cancelled() and document.close())
+                in_flight.add(future)
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                write(finished)
+        except KeyboardInterrupt:
+            for future in in_flight:
+                future.cancel()
+            print(f"\n❌ Interrupted; rerun the same command to resume from {args.output}")
+            sys.exit(130)
+
+    elapsed = time.time() - start
+    processed = counts['ok'] + counts['failed']
+    print("\n" + "=" * 60)
+    print(f"✅ {counts['ok']} ok, {counts['failed']} failed, {counts['already_done']} already done, "
+          f"{counts['unsupported']} unsupported file(s) skipped")
+    if processed:
+        print(f"⏱️  {elapsed:.1f}s, {processed / elapsed:.2f} files/sec")
+    print(f"📄 Results in {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
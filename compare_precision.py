@@ -0,0 +1,146 @@
+"""
+Compare DeepSeek-OCR CPU precision modes (CPU_PRECISION) on a fixed sample set
+
+Each mode runs in its own Python process so model memory is measured in
+isolation. The script reports load time, per-image latency, peak RSS and the
+character error rate (CER) against the known ground truth, plus how closely
+each mode's output matches the float32 baseline. Samples and scoring are
+shared with benchmark.py.
+
+Usage:
+    python compare_precision.py
+    python compare_precision.py --modes fp32,int8 --samples 3 --output precision_report.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmark import cer, make_samples, peak_rss_mb
+
+
+def run_mode(mode, sample_count):
+    """Worker: load DeepSeek-OCR in this process with CPU_PRECISION=mode and OCR the samples"""
+    os.environ['CPU_PRECISION'] = mode
+    os.environ['OCR_CACHE_MAX_MB'] = '0'
+    os.environ['OCR_CACHE_DIR'] = ''
+
+    import app
+
+    load_start = time.time()
+    model, tokenizer = app.get_deepseek_model()
+    load_seconds = time.time() - load_start
+    if model is None or tokenizer is None:
+        return {'mode': mode, 'error': 'DeepSeek-OCR failed to load'}
+
+    results = []
+    for image, truth in make_samples(sample_count):
+        start = time.time()
+        text, stats = app._deepseek_infer(model, tokenizer, image)
+        results.append({'seconds': time.time() - start, 'text': text, 'cer': cer(text, truth),
+                        'tokens': stats['tokens'], 'decode_seconds': stats['seconds'], 'stop': stats['stop']})
+
+    return {
+        'mode': mode,
+        'load_seconds': round(load_seconds, 1),
+        'peak_rss_mb': peak_rss_mb(),
+        'bf16_autocast': app._cpu_bf16_autocast,
+        'results': results,
+    }
+
+
+def summarize(report, baseline):
+    results = report['results']
+    seconds = [r['seconds'] for r in results]
+    summary = {
+        'mode': report['mode'],
+        'load_seconds': report['load_seconds'],
+        'peak_rss_mb': report['peak_rss_mb'],
+        'bf16_autocast': report['bf16_autocast'],
+        'mean_seconds_per_image': round(sum(seconds) / len(seconds), 2),
+        'mean_cer': round(sum(r['cer'] for r in results) / len(results), 4),
+        'tokens_per_second': round(
+            sum(r['tokens'] for r in results) / max(sum(r['decode_seconds'] for r in results), 1e-9), 1
+        ),
+    }
+    if baseline is not None:
+        base_seconds = baseline['mean_seconds_per_image']
+        summary['speedup_vs_fp32'] = round(base_seconds / summary['mean_seconds_per_image'], 2)
+        summary['mean_cer_vs_fp32_output'] = round(sum(
+            cer(r['text'], b['text']) for r, b in zip(results, baseline['_results'])
+        ) / len(results), 4)
+    summary['_results'] = results
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='fp32,int8,bf16,int8-bf16',
+                        help='comma-separated CPU_PRECISION modes (fp32 is always run first as the baseline)')
+    parser.add_argument('--samples', type=int, default=5, help='number of synthetic sample pages')
+    parser.add_argument('--output', default='precision_report.json', help='where to write the JSON report')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print("__REPORT__" + json.dumps(run_mode(args.worker, args.samples)))
+        return
+
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    modes = ['fp32'] + [m for m in modes if m != 'fp32']
+
+    print("=" * 60)
+    print("DeepSeek-OCR CPU precision comparison")
+    print("=" * 60)
+
+    summaries = []
+    baseline = None
+    for mode in modes:
+        print(f"\n🔄 Running {mode} ({args.samples} samples)...")
+        completed = subprocess.run(
+            [sys.executable, __file__, '--worker', mode, '--samples', str(args.samples)],
+            capture_output=True, text=True, encoding='utf-8', errors='replace',
+            env=dict(os.environ, PYTHONIOENCODING='utf-8')
+        )
+        report_lines = [line for line in completed.stdout.splitlines() if line.startswith("__REPORT__")]
+        if completed.returncode != 0 or not report_lines:
+            print(f"❌ {mode} failed:\n{completed.stderr[-2000:]}")
+            continue
+
+        report = json.loads(report_lines[-1][len("__REPORT__"):])
+        if 'error' in report:
+            print(f"❌ {mode}: {report['error']}")
+            continue
+
+        summary = summarize(report, baseline)
+        if mode == 'fp32':
+            baseline = summary
+        summaries.append(summary)
+        print(f"✓ {mode}: {summary['mean_seconds_per_image']}s/image, {summary['tokens_per_second']} tokens/s, "
+              f"CER {summary['mean_cer']:.2%}, "
+              f"peak RSS {summary['peak_rss_mb']} MB")
+
+    print("\n" + "=" * 60)
+    print(f"{'mode':<10} {'s/image':>8} {'speedup':>8} {'CER':>8} {'Δ fp32':>8} {'RSS MB':>8}")
+    for summary in summaries:
+        print(f"{summary['mode']:<10} {summary['mean_seconds_per_image']:>8} "
+              f"{summary.get('speedup_vs_fp32', 1.0):>8} {summary['mean_cer']:>8.2%} "
+              f"{summary.get('mean_cer_vs_fp32_output', 0.0):>8.2%} {summary['peak_rss_mb'] or '-':>8}")
+    print("=" * 60)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'samples': args.samples,
+            'modes': [dict({k: v for k, v in s.items() if k != '_results'}, results=s['_results'])
+                      for s in summaries],
+        }, f, indent=2)
+    print(f"\n📄 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n❌ Cancelled by user.")
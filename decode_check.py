@@ -0,0 +1,102 @@
+"""
+Check that oversized images are decoded within IMAGE_DECODE_MAX_MPX the way app.py promises
+
+Writes one image per layout decode_image() has to handle, larger than the
+budget, and decodes each with app.decode_image():
+
+  - uncompressed files read band by band (BMP bottom-up, PPM, TIFF as Pillow
+    writes it in one strip and as libtiff writes it in many strips, RGB and
+    grayscale) must match a full decode reduced by the same factor exactly;
+  - JPEGs must come out within the budget (DCT scaling, so not bit-exact);
+  - formats that can only be decoded whole (PNG) must be refused.
+
+Exits non-zero if any case fails.
+
+Usage:
+    python decode_check.py
+    python decode_check.py --size 6000x4000 --max-mpx 4
+"""
+import argparse
+import io
+import math
+import os
+import sys
+
+
+def libtiff_bytes(image):
+    """An uncompressed TIFF written by libtiff (multi-strip, like scanners and ImageMagick write)"""
+    from PIL import TiffImagePlugin
+    buffer = io.BytesIO()
+    previous = TiffImagePlugin.WRITE_LIBTIFF
+    TiffImagePlugin.WRITE_LIBTIFF = True
+    try:
+        image.save(buffer, 'TIFF', compression='raw')
+    finally:
+        TiffImagePlugin.WRITE_LIBTIFF = previous
+    return buffer.getvalue()
+
+
+def saved_bytes(image, format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='3000x2000', help='WIDTHxHEIGHT of the test images')
+    parser.add_argument('--max-mpx', type=float, default=1.0, help='IMAGE_DECODE_MAX_MPX to decode under')
+    args = parser.parse_args()
+    width, height = (int(side) for side in args.size.lower().split('x'))
+
+    os.environ['IMAGE_DECODE_MAX_MPX'] = str(args.max_mpx)
+    os.environ.setdefault('MODEL_PRELOAD', '0')
+    import numpy as np
+    from PIL import Image
+    import app
+
+    rng = np.random.default_rng(1234)
+    rgb = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), 'RGB')
+    gray = rgb.convert('L')
+    factor = math.ceil(math.sqrt(width * height / (args.max_mpx * 1e6)))
+
+    exact = [
+        ('BMP (bottom-up)', saved_bytes(rgb, 'BMP')),
+        ('PPM', saved_bytes(rgb, 'PPM')),
+        ('TIFF, Pillow, one strip', saved_bytes(rgb, 'TIFF')),
+        ('TIFF, libtiff, RGB strips', libtiff_bytes(rgb)),
+        ('TIFF, libtiff, grayscale strips', libtiff_bytes(gray)),
+    ]
+    failures = 0
+    for name, data in exact:
+        strips = len(Image.open(io.BytesIO(data)).tile)
+        try:
+            decoded = app.decode_image(Image.open(io.BytesIO(data)))
+            expected = Image.open(io.BytesIO(data)).convert('RGB').reduce(factor)
+            ok = np.array_equal(np.asarray(decoded), np.asarray(expected))
+            detail = f"{decoded.size[0]}x{decoded.size[1]}, {strips} strip(s)"
+        except Exception as e:
+            ok, detail = False, str(e)
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<34} {detail}")
+
+    decoded = app.decode_image(Image.open(io.BytesIO(saved_bytes(rgb, 'JPEG', quality=90))))
+    ok = decoded.size[0] * decoded.size[1] <= args.max_mpx * 1e6
+    failures += not ok
+    print(f"{'ok  ' if ok else 'FAIL'} {'JPEG (draft mode)':<34} {decoded.size[0]}x{decoded.size[1]}")
+
+    try:
+        app.decode_image(Image.open(io.BytesIO(saved_bytes(rgb, 'PNG'))))
+        ok, detail = False, 'decoded whole instead of refused'
+    except ValueError:
+        ok, detail = True, 'refused'
+    failures += not ok
+    print(f"{'ok  ' if ok else 'FAIL'} {'PNG (whole-image formats)':<34} {detail}")
+
+    print(f"\n{width}x{height} under IMAGE_DECODE_MAX_MPX={args.max_mpx:g}: "
+          f"{'all cases passed' if not failures else f'{failures} case(s) failed'}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Load test for the OCR web app: requests/sec and latency under concurrency
+
+Sends --requests uploads to POST /api/ocr, --concurrency at a time, and
+reports requests/sec, p50/p95/p99 latency and the status codes seen (429s
+mean admission control pushed back).
+
+There are two ways to run it:
+- Against a server that is already running (--url).
+- With --compare, which starts the Flask debug server (python app.py) and
+  then the production server (python serve.py) on --port. It loads the same
+  requests against each and prints the two side by side.
+
+Uploads are synthetic pages from benchmark.py. Servers started by --compare
+run without the OCR result cache, so every request is real OCR. With
+--endpoint health only GET /api/health is hit, which measures the web server
+itself rather than the model.
+
+Usage:
+    python loadtest.py --url http://localhost:5000 --requests 40 --concurrency 8
+    python loadtest.py --compare --endpoint health --requests 2000 --concurrency 32
+    python loadtest.py --compare --requests 40 --concurrency 8 --output loadtest_report.json
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark import make_samples, percentile
+
+SERVERS = {
+    'debug': ['app.py'],
+    'production': ['serve.py'],
+}
+
+
+def encode_upload(image, filename):
+    """PNG-encode a PIL image as a multipart/form-data body with a single `file` field"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode() + buffer.getvalue() + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def make_requests(args):
+    """Build the (method, path, body, content type) list to replay"""
+    if args.endpoint == 'health':
+        return [('GET', '/api/health', None, None)]
+    uploads = []
+    for index, (image, _) in enumerate(make_samples(args.samples, dpi=args.dpi)):
+        body, content_type = encode_upload(image, f"loadtest_{index}.png")
+        uploads.append(('POST', '/api/ocr', body, content_type))
+    return uploads
+
+
+def send(base_url, method, path, body, content_type, timeout):
+    """Returns (status, seconds); status is 'error' when no HTTP response arrived"""
+    request = urllib.request.Request(base_url + path, data=body, method=method)
+    if content_type:
+        request.add_header('Content-Type', content_type)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 'error'
+    return status, time.perf_counter() - start
+
+
+def run_load(base_url, requests, args):
+    def one(index):
+        return send(base_url, *requests[index % len(requests)], timeout=args.timeout)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(one, range(args.requests)))
+    wall_seconds = time.perf_counter() - start
+
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [seconds for status, seconds in results if status == 200]
+    return {
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'wall_seconds': round(wall_seconds, 2),
+        'requests_per_sec': round(len(ok) / wall_seconds, 2) if wall_seconds else None,
+        'latency_p50': round(percentile(ok, 0.50), 3) if ok else None,
+        'latency_p95': round(percentile(ok, 0.95), 3) if ok else None,
+        'latency_p99': round(percentile(ok, 0.99), 3) if ok else None,
+        'statuses': statuses,
+    }
+
+
+def start_server(kind, args):
+    env = dict(os.environ, PORT=str(args.port), PYTHONIOENCODING='utf-8', MODEL_PRELOAD='1',
+               OCR_CACHE_MAX_MB='0', OCR_CACHE_DIR='')
+    options = {'start_new_session': True} if os.name == 'posix' else {}
+    log_file = open(f"loadtest_{kind}.log", 'w', encoding='utf-8')
+    process = subprocess.Popen([sys.executable] + SERVERS[kind], env=env, stdout=log_file,
+                               stderr=subprocess.STDOUT, **options)
+    return process, log_file
+
+
+def wait_until_ready(base_url, process, timeout):
+    """Poll /api/ready until the model is loaded and warmed up"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        status, _ = send(base_url, 'GET', '/api/ready', None, None, timeout=5)
+        if status == 200:
+            return True
+        time.sleep(2)
+    return False
+
+
+def stop_server(process, log_file):
+    # The debug server's reloader runs the app in a child process; signal the whole group
+    if os.name == 'posix':
+        os.killpg(process.pid, signal.SIGTERM)
+    else:
+        process.terminate()
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.wait()
+    log_file.close()
+
+
+def print_results(results):
+    print("\n" + "=" * 72)
+    print(f"{'server':<12} {'req/s':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}  statuses")
+    for name, result in results.items():
+        print(f"{name:<12} {result['requests_per_sec'] or '-':>8} {result['latency_p50'] or '-':>8} "
+              f"{result['latency_p95'] or '-':>8} {result['latency_p99'] or '-':>8}  {result['statuses']}")
+    if 'debug' in results and 'production' in results:
+        debug_rate = results['debug']['requests_per_sec']
+        production_rate = results['production']['requests_per_sec']
+        if debug_rate and production_rate:
+            print(f"\nproduction / debug throughput: {production_rate / debug_rate:.2f}x")
+    print("=" * 72)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running server (default: start servers with --compare)')
+    parser.add_argument('--compare', action='store_true', help='start and load-test the debug and production servers')
+    parser.add_argument('--endpoint', choices=('ocr', 'health'), default='ocr')
+    parser.add_argument('--requests', type=int, default=40, help='total requests per server')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--samples', type=int, default=8, help='distinct synthetic pages to cycle through')
+    parser.add_argument('--dpi', type=int, default=150, help='resolution of the synthetic pages')
+    parser.add_argument('--timeout', type=float, default=600, help='per-request timeout (seconds)')
+    parser.add_argument('--port', type=int, default=5055, help='port for servers started by --compare')
+    parser.add_argument('--startup-timeout', type=float, default=1800,
+                        help='how long to wait for a started server to load its model')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    if not args.url and not args.compare:
+        parser.error('pass --url for a running server or --compare to start them')
+
+    requests = make_requests(args)
+    print(f"🔄 {args.requests} x {args.endpoint} request(s), {args.concurrency} concurrent")
+    results = {}
+
+    if args.url:
+        results['server'] = run_load(args.url.rstrip('/'), requests, args)
+    else:
+        base_url = f"http://127.0.0.1:{args.port}"
+        for kind in SERVERS:
+            print(f"\n🚀 Starting {kind} server (log: loadtest_{kind}.log)...")
+            process, log_file = start_server(kind, args)
+            try:
+                if not wait_until_ready(base_url, process, args.startup_timeout):
+                    print(f"❌ {kind} server did not become ready")
+                    continue
+                # One request first so lazy setup (pools, kernels) isn't measured
+                send(base_url, *requests[0], timeout=args.timeout)
+                results[kind] = run_load(base_url, requests, args)
+                print(f"✓ {kind}: {results[kind]['requests_per_sec']} req/s")
+            finally:
+                stop_server(process, log_file)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'endpoint': args.endpoint, 'results': results}, f, indent=2)
+        print(f"\n📄 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n❌ Cancelled by user.")
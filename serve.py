@@ -0,0 +1,146 @@
+"""
+Production server for the OCR web app
+
+Runs app.py under gunicorn (Linux/macOS) or waitress (Windows) instead of
+the Flask debug server. There is no reloader, so app.py is imported and its
+torch/transformers patches are applied exactly once per worker process. With
+gunicorn that import happens in each worker after the fork, never in the
+master. Each worker loads the OCR engine itself: on first use, or at startup
+with MODEL_PRELOAD=1.
+
+On SIGTERM (or Ctrl+C) the server stops accepting connections. Uploads that
+still arrive get 503, and queued and running OCR work gets up to
+SHUTDOWN_DRAIN_SECONDS to finish before the worker exits.
+
+Every worker process holds its own model, result cache and admission queue,
+so the default is one process with many threads. Add processes only when
+there is RAM for one model per process. Background jobs and chunked uploads
+live in the process that created them too: with several gunicorn workers a
+client's follow-up requests can land on another worker and get 404.
+
+Usage:
+    python serve.py
+    python serve.py --threads 16 --port 8000
+    python serve.py --server waitress
+
+Settings come from .env or the environment (WEB_SERVER, WEB_WORKERS,
+WEB_THREADS, HOST, PORT, SHUTDOWN_DRAIN_SECONDS); flags override them.
+"""
+import argparse
+import importlib
+import importlib.util
+import os
+import signal
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _ocr_app():
+    """Import app.py; only ever called inside a worker process"""
+    return importlib.import_module('app')
+
+
+def _post_worker_init(worker):
+    ocr_app = _ocr_app()
+    # gunicorn's own SIGTERM handler stops the worker's accept loop; start
+    # draining OCR work at the same moment so the drain deadline starts then
+    stop_accepting = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        ocr_app.begin_drain()
+        stop_accepting(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+    if ocr_app.MODEL_PRELOAD:
+        ocr_app.start_model_preload()
+    worker.log.info(f"Worker {os.getpid()} ready (model preload: {'on' if ocr_app.MODEL_PRELOAD else 'off'})")
+
+
+def _worker_exit(server, worker):
+    _ocr_app().drain()
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    if args.workers > 1:
+        print(f"⚠️  {args.workers} workers: jobs and chunked uploads live in the worker that created them, and "
+              f"gunicorn spreads a client's requests over all workers, so /api/jobs/<id> and /api/uploads/<id> "
+              f"can get 404. Prefer --threads, or run one single-worker server per port behind sticky routing.")
+
+    class OCRApplication(BaseApplication):
+        def load_config(self):
+            settings = {
+                'bind': f"{args.host}:{args.port}",
+                'workers': args.workers,
+                'worker_class': 'gthread',  # Threads: SSE job streams hold a connection open
+                'threads': args.threads,
+                'timeout': 120,  # Worker heartbeat, not a per-request limit
+                # Leave the worker time to drain before the master kills it
+                'graceful_timeout': args.drain_seconds + 10,
+                'preload_app': False,  # Import app.py (and torch) after the fork, per worker
+                'post_worker_init': _post_worker_init,
+                'worker_exit': _worker_exit,
+                'accesslog': '-' if args.access_log else None,
+            }
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return _ocr_app().app
+
+    OCRApplication().run()
+
+
+def run_waitress(args):
+    import waitress
+
+    if args.workers > 1:
+        print(f"⚠️  waitress runs a single process; ignoring --workers {args.workers}")
+    ocr_app = _ocr_app()
+    server = waitress.create_server(ocr_app.app, host=args.host, port=args.port, threads=args.threads)
+
+    def handle_term(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_term)
+    if ocr_app.MODEL_PRELOAD:
+        ocr_app.start_model_preload()
+    print(f"🌐 Serving on http://{args.host}:{args.port} with {args.threads} threads (waitress)")
+    server.run()  # Returns on Ctrl+C / SIGTERM
+    ocr_app.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'waitress'), default=os.getenv('WEB_SERVER', 'auto'),
+                        help='auto = gunicorn where available (not on Windows), else waitress')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', '1')),
+                        help='worker processes (gunicorn only); each loads its own model')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', '8')),
+                        help='request threads per worker')
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '5000')))
+    parser.add_argument('--drain-seconds', type=float, default=float(os.getenv('SHUTDOWN_DRAIN_SECONDS', '120')),
+                        help='how long in-flight OCR work may run on shutdown')
+    parser.add_argument('--access-log', action='store_true', help='log every request (gunicorn)')
+    args = parser.parse_args()
+    # app.py reads the drain budget from the environment when the worker imports it
+    os.environ['SHUTDOWN_DRAIN_SECONDS'] = str(args.drain_seconds)
+
+    server = args.server
+    if server == 'auto':
+        server = 'waitress' if sys.platform == 'win32' else 'gunicorn'
+        if server == 'gunicorn' and importlib.util.find_spec('gunicorn') is None:
+            server = 'waitress'
+    if server == 'gunicorn':
+        run_gunicorn(args)
+    else:
+        run_waitress(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Measure how long `import app` takes, and which imports it spends that time on
+
+Runs `python -X importtime -c "import app"` in fresh processes. It reports
+the wall-clock time of the best run and the cumulative import time of app
+itself and of the heavy packages (torch, transformers, fitz, ...). A
+package shows as "-" when app no longer imports it at startup.
+
+--ref measures app.py as of a git revision as well, for before/after numbers.
+The old file is written to a temporary directory and imported from there.
+
+Usage:
+    python startup_time.py
+    python startup_time.py --ref HEAD~1 --runs 5
+    python startup_time.py --output startup_report.json
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PACKAGES = ('app', 'torch', 'transformers', 'fitz', 'easyocr', 'numpy', 'PIL', 'flask', 'flask_cors', 'dotenv')
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$")
+
+
+def measure_once(directory):
+    """Import app in a fresh interpreter; returns (wall seconds, {package: cumulative seconds})"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1', PYTHONIOENCODING='utf-8',
+               # Nothing should load at import time, but make sure no preload thread starts either
+               MODEL_PRELOAD='0')
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=directory,
+                               capture_output=True, text=True, encoding='utf-8', errors='replace', env=env)
+    wall_seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"`import app` failed in {directory}:\n{completed.stderr[-2000:]}")
+
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(4) in PACKAGES and match.group(4) not in cumulative:
+            cumulative[match.group(4)] = int(match.group(2)) / 1e6
+    return wall_seconds, cumulative
+
+
+def measure(directory, runs):
+    """Best of `runs` (the fastest run has the warmest OS file cache, so runs compare fairly)"""
+    results = [measure_once(directory) for _ in range(runs)]
+    wall_seconds, cumulative = min(results, key=lambda result: result[0])
+    return {'wall_seconds': round(wall_seconds, 3),
+            'imports': {name: round(seconds, 3) for name, seconds in cumulative.items()}}
+
+
+def checkout_app(ref, directory):
+    source = subprocess.run(['git', 'show', f"{ref}:app.py"], capture_output=True, text=True, encoding='utf-8',
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+    with open(os.path.join(directory, 'app.py'), 'w', encoding='utf-8') as f:
+        f.write(source)
+
+
+def print_table(reports):
+    labels = list(reports)
+    print("\n" + "=" * (14 + 12 * len(labels)))
+    print(f"{'seconds':<14}" + "".join(f"{label:>12}" for label in labels))
+    print(f"{'wall clock':<14}" + "".join(f"{reports[label]['wall_seconds']:>12}" for label in labels))
+    for name in PACKAGES:
+        values = [reports[label]['imports'].get(name) for label in labels]
+        if any(value is not None for value in values):
+            print(f"{name:<14}" + "".join(f"{'-' if value is None else value:>12}" for value in values))
+    print("=" * (14 + 12 * len(labels)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ref', help='also measure app.py at this git revision (e.g. HEAD~1)')
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters per measurement; the best is kept')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    reports = {}
+    if args.ref:
+        directory = tempfile.mkdtemp(prefix='startup-')
+        try:
+            checkout_app(args.ref, directory)
+            print(f"🔄 Importing app.py at {args.ref} ({args.runs} runs)...")
+            reports[args.ref] = measure(directory, args.runs)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    print(f"🔄 Importing the working tree's app.py ({args.runs} runs)...")
+    reports['current'] = measure(os.path.dirname(os.path.abspath(__file__)), args.runs)
+
+    print_table(reports)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n📄 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n❌ Cancelled by user.")
@@ -7,6 +7,7 @@ const fileName = document.getElementById('fileName');
 const scanBtn = document.getElementById('scanBtn');
 const changeFileBtn = document.getElementById('changeFileBtn');
 const loadingSection = document.getElementById('loadingSection');
+const loadingText = document.getElementById('loadingText');
 const resultSection = document.getElementById('resultSection');
 const ocrResult = document.getElementById('ocrResult');
 const errorSection = document.getElementById('errorSection');
@@ -19,6 +20,14 @@ const toast = document.getElementById('toast');
 
 let currentFile = null;
 
+// How the server wants uploads prepared (GET /api/upload-config); null if unavailable
+const uploadConfig = fetch('/api/upload-config')
+    .then((response) => (response.ok ? response.json() : null))
+    .catch(() => null);
+// Image types browsers can decode onto a canvas (TIFF mostly can't)
+const PREPARABLE_TYPES = ['image/png', 'image/jpeg', 'image/jpg', 'image/gif', 'image/bmp', 'image/webp'];
+const MAX_CHUNK_RETRIES = 5;
+
 // Event Listeners
 uploadArea.addEventListener('click', () => fileInput.click());
 uploadArea.addEventListener('dragover', handleDragOver);
@@ -69,9 +78,10 @@ function handleFile(file) {
         return;
     }
 
-    const maxSize = 16 * 1024 * 1024; // 16MB
+    // The server's MAX_UPLOAD_MB, rendered into the page
+    const maxSize = Number(document.body.dataset.maxUploadBytes) || 16 * 1024 * 1024;
     if (file.size > maxSize) {
-        showToast('File size must be less than 16MB', 'error');
+        showToast(`File size must be less than ${Math.round(maxSize / (1024 * 1024))}MB`, 'error');
         return;
     }
 
@@ -115,31 +125,309 @@ async function performOCR() {
     errorSection.style.display = 'none';
     
     // Show loading
+    loadingText.textContent = 'Processing your document...';
     loadingSection.style.display = 'block';
 
     try {
+        const config = await uploadConfig;
         const formData = new FormData();
-        formData.append('file', currentFile);
+        const upload = await prepareUpload(currentFile, config);
+        const chunked = config && upload.size > config.chunk_bytes;
+        if (chunked) {
+            formData.append('upload_id', await uploadInChunks(upload, config));
+        } else {
+            formData.append('file', upload, upload.name);
+        }
+        loadingText.textContent = 'Processing your document...';
 
-        const response = await fetch('/api/ocr', {
+        // Start a background job and stream its pages as they finish
+        const response = await fetch('/api/jobs', {
             method: 'POST',
             body: formData
         });
 
         const data = await response.json();
 
-        if (response.ok && data.success) {
-            displayResult(data.text);
-        } else {
+        if (!response.ok || !data.success) {
+            // A busy server (429) keeps the upload: retrying reuses it without sending it again
             throw new Error(data.error || 'OCR processing failed');
         }
+        if (chunked) {
+            writeStorage(resumeKeyFor(upload), null);  // The job owns the upload now
+        }
+
+        const result = await streamJob(data);
+        displayResult(result.text);
     } catch (error) {
+        resultSection.style.display = 'none';
         showError(error.message);
     } finally {
         loadingSection.style.display = 'none';
     }
 }
 
+// Crop, downscale and re-encode a photo to what the OCR engines can use.
+// Anything that can't be or needn't be prepared is returned as it is.
+async function prepareUpload(file, config) {
+    const maxSide = config ? config.image.max_side : 0;
+    if (!maxSide || !PREPARABLE_TYPES.includes(file.type) || typeof createImageBitmap !== 'function') {
+        return file;
+    }
+
+    let bitmap;
+    try {
+        bitmap = await createImageBitmap(file);
+    } catch (error) {
+        return file;  // Let the server decode what the browser can't
+    }
+    try {
+        const box = findContentBox(bitmap, config.image.margin_padding);
+        const scale = Math.min(1, maxSide / Math.max(box.width, box.height));
+        if (scale === 1 && box.width === bitmap.width && box.height === bitmap.height) {
+            return file;
+        }
+
+        loadingText.textContent = 'Preparing image...';
+        const canvas = document.createElement('canvas');
+        canvas.width = Math.max(1, Math.round(box.width * scale));
+        canvas.height = Math.max(1, Math.round(box.height * scale));
+        const context = canvas.getContext('2d');
+        context.imageSmoothingQuality = 'high';
+        context.drawImage(bitmap, box.x, box.y, box.width, box.height, 0, 0, canvas.width, canvas.height);
+
+        let blob = await canvasToBlob(canvas, config.image.type, config.image.quality);
+        if (!blob || blob.type !== config.image.type) {
+            // This browser can't encode the preferred type
+            blob = await canvasToBlob(canvas, 'image/jpeg', config.image.quality);
+        }
+        if (!blob || blob.size >= file.size) {
+            return file;
+        }
+        const extension = blob.type === 'image/webp' ? 'webp' : blob.type === 'image/png' ? 'png' : 'jpg';
+        const name = `${file.name.replace(/\.[^.]+$/, '')}.${extension}`;
+        return new File([blob], name, { type: blob.type });
+    } finally {
+        bitmap.close();
+    }
+}
+
+function canvasToBlob(canvas, type, quality) {
+    return new Promise((resolve) => canvas.toBlob(resolve, type, quality));
+}
+
+// The image's content, without empty margins: the browser's version of the
+// server's find_content_box(), on a copy at most 1024px on its longest side
+function findContentBox(bitmap, padding) {
+    const full = { x: 0, y: 0, width: bitmap.width, height: bitmap.height };
+    const step = Math.max(1, Math.floor(Math.max(bitmap.width, bitmap.height) / 1024));
+    const width = Math.ceil(bitmap.width / step);
+    const height = Math.ceil(bitmap.height / step);
+    const canvas = document.createElement('canvas');
+    canvas.width = width;
+    canvas.height = height;
+    const context = canvas.getContext('2d', { willReadFrequently: true });
+    context.drawImage(bitmap, 0, 0, width, height);
+    const pixels = context.getImageData(0, 0, width, height).data;
+
+    // Darkest channel per pixel; background is its 90th percentile
+    const gray = new Uint8Array(width * height);
+    const histogram = new Uint32Array(256);
+    for (let i = 0; i < gray.length; i++) {
+        const value = Math.min(pixels[i * 4], pixels[i * 4 + 1], pixels[i * 4 + 2]);
+        gray[i] = value;
+        histogram[value]++;
+    }
+    let background = 0;
+    for (let seen = 0; background < 255 && (seen += histogram[background]) < 0.9 * gray.length; background++);
+
+    const rowInk = new Uint32Array(height);
+    const colInk = new Uint32Array(width);
+    for (let y = 0; y < height; y++) {
+        for (let x = 0; x < width; x++) {
+            if (gray[y * width + x] < background - 48) {
+                rowInk[y]++;
+                colInk[x]++;
+            }
+        }
+    }
+    const rows = [...rowInk.keys()].filter((y) => rowInk[y] / width > 0.002);
+    const cols = [...colInk.keys()].filter((x) => colInk[x] / height > 0.002);
+    if (rows.length === 0 || cols.length === 0) {
+        return full;
+    }
+
+    const top = Math.max(0, rows[0] * step - padding);
+    const bottom = Math.min(bitmap.height, (rows[rows.length - 1] + 1) * step + padding);
+    const left = Math.max(0, cols[0] * step - padding);
+    const right = Math.min(bitmap.width, (cols[cols.length - 1] + 1) * step + padding);
+    // Not worth cropping a sliver of margin
+    if ((bottom - top) * (right - left) >= 0.95 * bitmap.width * bitmap.height) {
+        return full;
+    }
+    return { x: left, y: top, width: right - left, height: bottom - top };
+}
+
+// Send a large file in chunks, resuming after dropped connections (and,
+// for the same file, after a page reload); returns the upload_id. The
+// upload stays resumable until a job has accepted it.
+async function uploadInChunks(file, config) {
+    const resumeKey = resumeKeyFor(file);
+    let upload = null;
+    const savedId = readStorage(resumeKey);
+    if (savedId) {
+        const response = await fetch(`${config.uploads_url}/${savedId}`).catch(() => null);
+        if (response && response.ok) {
+            upload = await response.json();
+        }
+    }
+    if (!upload) {
+        const response = await fetch(config.uploads_url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        upload = await response.json();
+        if (!response.ok) {
+            throw new Error(upload.error || 'Upload failed');
+        }
+        writeStorage(resumeKey, upload.upload_id);
+    }
+
+    let failures = 0;
+    while (upload.received < upload.size) {
+        loadingText.textContent = `Uploading... ${Math.floor(100 * upload.received / upload.size)}%`;
+        const chunk = file.slice(upload.received, upload.received + upload.chunk_bytes);
+        let response;
+        try {
+            response = await fetch(`${upload.upload_url}?offset=${upload.received}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: chunk
+            });
+        } catch (error) {
+            response = null;  // Connection dropped; the server kept what it got
+        }
+
+        if (response && (response.ok || response.status === 409)) {
+            upload = await response.json();  // A 409 carries the offset to resume from
+            failures = 0;
+            // Retry-After: an earlier request of ours is still writing (say, a
+            // dropped connection the server hasn't noticed yet)
+            const retryAfter = Number(response.headers.get('Retry-After'));
+            if (retryAfter) {
+                await new Promise((resolve) => setTimeout(resolve, 1000 * retryAfter));
+            }
+            continue;
+        }
+        if (response && response.status === 404 && savedId) {
+            // The upload we were resuming has expired; start it over
+            writeStorage(resumeKey, null);
+            return uploadInChunks(file, config);
+        }
+        if (response && response.status < 500) {
+            const data = await response.json().catch(() => ({}));
+            writeStorage(resumeKey, null);
+            throw new Error(data.error || 'Upload failed');
+        }
+        if (++failures > MAX_CHUNK_RETRIES) {
+            throw new Error('Upload interrupted, please check your connection and try again');
+        }
+        loadingText.textContent = 'Connection lost, resuming upload...';
+        await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** failures));
+        // Ask where the upload stands; the interrupted chunk may have partly arrived
+        const status = await fetch(upload.upload_url).catch(() => null);
+        if (status && status.ok) {
+            upload = await status.json();
+        }
+    }
+
+    return upload.upload_id;
+}
+
+function resumeKeyFor(file) {
+    return `ocr-upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+function readStorage(key) {
+    try {
+        return localStorage.getItem(key);
+    } catch (error) {
+        return null;
+    }
+}
+
+function writeStorage(key, value) {
+    try {
+        if (value === null) {
+            localStorage.removeItem(key);
+        } else {
+            localStorage.setItem(key, value);
+        }
+    } catch (error) {
+        // Storage unavailable (private browsing); uploads just won't survive a reload
+    }
+}
+
+function streamJob(job) {
+    return new Promise((resolve, reject) => {
+        const sections = [];
+        const partials = [];  // Text decoded so far on pages still being read
+        const source = new EventSource(job.stream_url);
+
+        const render = () => {
+            const count = Math.max(sections.length, partials.length);
+            const shown = [];
+            for (let i = 0; i < count; i++) {
+                const section = sections[i] ?? partials[i];
+                if (section !== undefined) shown.push(section);
+            }
+            displayPartialResult(shown.join('\n\n'));
+        };
+
+        source.addEventListener('partial', (e) => {
+            const page = JSON.parse(e.data);
+            if (sections[page.page - 1] !== undefined) return;
+            partials[page.page - 1] = page.section;
+            render();
+            loadingText.textContent = `Reading page ${page.page} of ${page.page_count}...`;
+        });
+
+        source.addEventListener('page', (e) => {
+            const page = JSON.parse(e.data);
+            sections[page.page - 1] = page.section;
+            delete partials[page.page - 1];
+            render();
+            const via = page.path === 'text_layer' ? ' (embedded text)' : '';
+            loadingText.textContent = `Processed page ${page.page} of ${page.page_count}${via}...`;
+        });
+
+        source.addEventListener('done', (e) => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        });
+
+        source.addEventListener('failed', (e) => {
+            source.close();
+            reject(new Error(JSON.parse(e.data).error || 'OCR processing failed'));
+        });
+
+        source.addEventListener('cancelled', (e) => {
+            source.close();
+            reject(new Error(JSON.parse(e.data).error || 'OCR job was cancelled'));
+        });
+
+        source.onerror = () => {
+            source.close();
+            reject(new Error('Lost connection to the server while processing'));
+        };
+    });
+}
+
+function displayPartialResult(text) {
+    ocrResult.textContent = text;
+    resultSection.style.display = 'block';
+}
+
 function displayResult(text) {
     ocrResult.textContent = text;
     resultSection.style.display = 'block';